@@ -0,0 +1,79 @@
+import pandas as pd
+
+# Reglas de agregación admitidas para pasar una serie a otra frecuencia:
+# - 'mean': promedio del período.
+# - 'last': último valor observado en el período.
+# - 'pct_change': variación porcentual del último valor respecto del período anterior.
+REGLAS = ("mean", "last", "pct_change")
+
+
+class AlineadorSeries:
+    """
+    Alinea series con frecuencias distintas (diarias, mensuales) sin rellenar
+    huecos con valores futuros.
+
+    Las series se resumen una sola vez a una base mensual (promedio para las
+    reglas 'mean', último valor para 'last' y 'pct_change'); las ventanas
+    trimestrales, anuales o móviles de 12 meses se calculan a partir de esa
+    base sin volver a los datos crudos.
+    """
+
+    def __init__(self, datos, reglas: dict = None, regla_por_defecto: str = "mean"):
+        self.reglas = {col: (reglas or {}).get(col, regla_por_defecto) for col in datos.columns}
+        for col, regla in self.reglas.items():
+            if regla not in REGLAS:
+                raise ValueError(f"Regla de agregación no válida para {col}: {regla}")
+        self._mensual = self._base_mensual(datos)
+        self._ventanas = {}
+
+    def _base_mensual(self, datos):
+        columnas = {}
+        for col, regla in self.reglas.items():
+            serie = datos[col].dropna().resample("ME")
+            columnas[col] = serie.mean() if regla == "mean" else serie.last()
+        return pd.concat(columnas, axis=1)
+
+    @property
+    def mensual(self):
+        """Base mensual (niveles, sin aplicar 'pct_change')."""
+        return self._mensual
+
+    def a_frecuencia(self, frecuencia: str = "YE", desde=None):
+        """
+        Devuelve las series a la frecuencia indicada ('ME', 'QE', 'YE'),
+        aplicando la regla de cada una. `desde` recorta el resultado después
+        del cálculo, para que 'pct_change' pueda usar el período anterior.
+        """
+        if frecuencia not in self._ventanas:
+            columnas = {}
+            for col, regla in self.reglas.items():
+                serie = self._mensual[col].dropna().resample(frecuencia)
+                if regla == "mean":
+                    columnas[col] = serie.mean()
+                elif regla == "last":
+                    columnas[col] = serie.last()
+                else:
+                    columnas[col] = serie.last().pct_change(fill_method=None) * 100
+            self._ventanas[frecuencia] = pd.concat(columnas, axis=1)
+        return _recortar(self._ventanas[frecuencia], desde)
+
+    def movil_12m(self, desde=None):
+        """Ventana móvil de 12 meses calculada sobre la base mensual."""
+        if "12M" not in self._ventanas:
+            columnas = {}
+            for col, regla in self.reglas.items():
+                serie = self._mensual[col]
+                if regla == "mean":
+                    columnas[col] = serie.rolling(12, min_periods=12).mean()
+                elif regla == "last":
+                    columnas[col] = serie
+                else:
+                    columnas[col] = serie.pct_change(12, fill_method=None) * 100
+            self._ventanas["12M"] = pd.concat(columnas, axis=1)
+        return _recortar(self._ventanas["12M"], desde)
+
+
+def _recortar(df, desde):
+    if desde is None:
+        return df.dropna(how="all")
+    return df.loc[pd.Timestamp(desde):].dropna(how="all")
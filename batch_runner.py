@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from rich.console import Console
+from config import Config
+from cuotas import prioridad, PRIORIDAD_BAJA
+from gemini_ai import configurar, generar
+from opcion1_fundamental import preparar_prompt_inversion, cargar_universo
+from opcion2_sentimiento import preparar_prompt_sentimiento
+from opcion3_macro import preparar_prompt_macro
+from opcion4_imagen_FreepikAI import generar_imagen_freepik
+from utils import guardar_conversacion, activar_progreso
+
+console = Console()
+
+OPCIONES = ("fundamental", "sentimiento", "macro", "imagen")
+
+
+def cargar_trabajos(ruta: str) -> dict:
+    """
+    Lee la especificación de trabajos desde un archivo JSON o YAML.
+
+    Formato:
+        nombre: nocturno
+        max_workers: 4
+        trabajos:
+          - {opcion: fundamental, tickers: [MSFT, AAPL]}   # o tickers_archivo: sp500.csv
+          - {opcion: sentimiento, empresas: [Apple, Microsoft]}
+          - {opcion: macro}
+          - {opcion: imagen, prompts: ["logo minimalista"]}
+    """
+    with open(ruta, "r", encoding="utf-8") as f:
+        if ruta.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("Para leer archivos YAML instala PyYAML (pip install pyyaml) o usa JSON.")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    spec.setdefault("nombre", os.path.splitext(os.path.basename(ruta))[0])
+    return spec
+
+
+def expandir_unidades(spec: dict) -> list:
+    """Convierte cada trabajo en unidades independientes (una por empresa, prompt, etc.)."""
+    unidades = []
+    for trabajo in spec.get("trabajos", []):
+        opcion = trabajo.get("opcion")
+        if opcion not in OPCIONES:
+            raise ValueError(f"Opción no válida en el archivo de trabajos: {opcion}")
+        if opcion == "sentimiento":
+            unidades += [{"opcion": opcion, "empresa": e} for e in trabajo.get("empresas", [])]
+        elif opcion == "imagen":
+            unidades += [{"opcion": opcion, "prompt": p} for p in trabajo.get("prompts", [])]
+        elif opcion == "fundamental":
+            unidades.append({
+                "opcion": opcion,
+                "tickers": trabajo.get("tickers"),
+                "tickers_archivo": trabajo.get("tickers_archivo"),
+            })
+        else:
+            unidades.append({"opcion": opcion})
+    for unidad in unidades:
+        unidad["id"] = hashlib.sha1(json.dumps(unidad, sort_keys=True).encode()).hexdigest()[:12]
+    return unidades
+
+
+def _uso(response) -> dict:
+    uso = getattr(response, "usage_metadata", None)
+    return {
+        "tokens_entrada": getattr(uso, "prompt_token_count", 0) or 0,
+        "tokens_salida": getattr(uso, "candidates_token_count", 0) or 0,
+    }
+
+
+def ejecutar_unidad(unidad: dict) -> dict:
+    """Ejecuta una unidad de trabajo y devuelve su uso de tokens."""
+    opcion = unidad["opcion"]
+    if opcion == "imagen":
+        if not generar_imagen_freepik(unidad["prompt"], freepik_api_key=Config.FREEPIK_API_KEY):
+            raise RuntimeError("No se pudo generar la imagen (ver error_freepik.log).")
+        return {}
+
+    if opcion == "fundamental":
+        if unidad.get("tickers_archivo"):
+            empresas = cargar_universo(unidad["tickers_archivo"])
+        else:
+            empresas = {t: t for t in unidad.get("tickers") or []} or None
+        prompt, nombre = preparar_prompt_inversion(empresas), "Análisis Fundamental"
+    elif opcion == "sentimiento":
+        prompt, nombre = preparar_prompt_sentimiento(unidad["empresa"]), f"Análisis Sentimiento {unidad['empresa']}"
+        if not prompt:
+            raise RuntimeError("No se encontraron noticias para la empresa especificada.")
+    else:
+        prompt, nombre = preparar_prompt_macro(Config.FRED_API_KEY), "Análisis Macroeconómico"
+
+    response = generar(prompt, opcion=opcion)
+    guardar_conversacion(nombre, prompt, response.text, opcion=opcion, entidad=unidad.get("empresa"), response=response)
+    return _uso(response)
+
+
+class Checkpoint:
+    """Registro en disco (JSONL) de las unidades completadas de un lote."""
+
+    def __init__(self, nombre: str):
+        carpeta = os.path.join(Config.CACHE_DIR, "batch")
+        if not os.path.exists(carpeta):
+            os.makedirs(carpeta)
+        self.ruta = os.path.join(carpeta, f"{nombre}.jsonl")
+        self._lock = threading.Lock()
+
+    def completadas(self) -> dict:
+        if not os.path.exists(self.ruta):
+            return {}
+        completadas = {}
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    continue  # línea incompleta por una interrupción
+                completadas[registro["id"]] = registro
+        return completadas
+
+    def registrar(self, registro: dict):
+        with self._lock, open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+
+    def reiniciar(self):
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+def _cronometrar(unidad: dict) -> dict:
+    detalle = unidad.get("empresa") or unidad.get("prompt") or unidad.get("tickers_archivo") or ",".join(unidad.get("tickers") or [])
+    registro = {"id": unidad["id"], "opcion": unidad["opcion"], "detalle": detalle}
+    inicio = time.perf_counter()
+    try:
+        # Los trabajos programados ceden el turno a las solicitudes interactivas
+        with prioridad(PRIORIDAD_BAJA):
+            registro.update(ejecutar_unidad(unidad))
+        registro["estado"] = "ok"
+    except Exception as e:
+        registro.update({"estado": "error", "error": str(e)})
+    registro["segundos"] = round(time.perf_counter() - inicio, 3)
+    return registro
+
+
+def ejecutar_lote(spec: dict, max_workers: int = None, reiniciar: bool = False) -> dict:
+    """
+    Ejecuta todas las unidades pendientes con un pool de hilos. Cada unidad
+    terminada se guarda en el checkpoint, de modo que una nueva ejecución con
+    el mismo nombre continúa donde quedó. Cuando todas las unidades terminan
+    bien el checkpoint se elimina y la siguiente ejecución empieza de cero.
+
+    Returns:
+        dict: Resumen de la ejecución (también se guarda como JSON en 'outputs').
+    """
+    configurar(Config.GEMINI_API_KEY)
+    unidades = expandir_unidades(spec)
+    checkpoint = Checkpoint(spec["nombre"])
+    if reiniciar:
+        checkpoint.reiniciar()
+    previas = checkpoint.completadas()
+    pendientes = [u for u in unidades if u["id"] not in previas]
+    max_workers = max_workers or spec.get("max_workers") or Config.GEMINI_MAX_CONCURRENCIA
+
+    console.print(
+        f"[cyan]Lote '{spec['nombre']}': {len(unidades)} unidades, "
+        f"{len(unidades) - len(pendientes)} ya completadas, {len(pendientes)} pendientes.[/cyan]"
+    )
+
+    registros = []
+    inicio_lote = time.perf_counter()
+    activar_progreso(False)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futuros = {pool.submit(_cronometrar, u): u for u in pendientes}
+            for futuro in as_completed(futuros):
+                registro = futuro.result()
+                registros.append(registro)
+                if registro["estado"] == "ok":
+                    checkpoint.registrar(registro)
+                    console.print(f"[green]✔ {registro['opcion']} {registro['detalle']} ({registro['segundos']:.1f}s)[/green]")
+                else:
+                    console.print(f"[red]✘ {registro['opcion']} {registro['detalle']}: {registro['error']}[/red]")
+    finally:
+        activar_progreso(True)
+
+    fallidas = sum(r["estado"] == "error" for r in registros)
+    if not fallidas:
+        checkpoint.reiniciar()
+
+    resumen = {
+        "nombre": spec["nombre"],
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "segundos": round(time.perf_counter() - inicio_lote, 3),
+        "unidades": len(unidades),
+        "omitidas_por_checkpoint": len(unidades) - len(pendientes),
+        "completadas": sum(r["estado"] == "ok" for r in registros),
+        "fallidas": fallidas,
+        "tokens_entrada": sum(r.get("tokens_entrada", 0) for r in registros),
+        "tokens_salida": sum(r.get("tokens_salida", 0) for r in registros),
+        "trabajos": registros,
+    }
+    if not os.path.exists("outputs"):
+        os.makedirs("outputs")
+    ruta = f"outputs/batch_{spec['nombre']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    console.print(f"\n[green]Resumen guardado en:[/green] [bold]{ruta}[/bold]")
+    return resumen
+
+
+def main(argv=None):
+    """python batch_runner.py trabajos.json [--workers N] [--reiniciar]"""
+    parser = argparse.ArgumentParser(description="Ejecuta trabajos sin interacción a partir de un archivo JSON/YAML.")
+    parser.add_argument("trabajos", help="Archivo de trabajos (.json, .yaml).")
+    parser.add_argument("--workers", type=int, help="Unidades ejecutadas en paralelo.")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora el checkpoint y ejecuta todo de nuevo.")
+    args = parser.parse_args(argv)
+
+    resumen = ejecutar_lote(cargar_trabajos(args.trabajos), args.workers, args.reiniciar)
+    return 1 if resumen["fallidas"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
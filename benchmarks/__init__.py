@@ -0,0 +1 @@
+"""Benchmarks sin conexión (ver `benchmarks/ejecutar.py`)."""
@@ -0,0 +1,324 @@
+"""
+Benchmarks sin conexión de las opciones del asistente.
+
+    python -m benchmarks.ejecutar
+    python -m benchmarks.ejecutar --escenarios fundamental,imagen --escalas fundamental=3:50 --repeticiones 5
+    python -m benchmarks.ejecutar --latencia gemini=1.5 --error newsapi=0.2 --caliente
+
+Cada escenario llama a la función pública de la opción (`analizar_inversion`,
+`analizar_sentimiento_lote`, `analizar_macro`, `generar_imagenes_lote`,
+`analizar_costos_masivo`) contra los sustitutos de `benchmarks.fakes`, en un
+directorio temporal con sus propias cachés. Se informan p50/p95 de latencia,
+throughput, pico de memoria (tracemalloc, en una repetición aparte) y llamadas
+a cada API, y el resultado se guarda en `benchmarks/resultados/` para
+compararlo con la ejecución anterior.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from benchmarks.fakes import (  # noqa: E402
+    Contador, Servicio, ServidorFalso, YFinanceFalso, DataReaderFalso, GenAIFalso,
+)
+
+# Comportamiento por defecto de cada servicio: (latencia en s, tamaño de respuesta)
+SERVICIOS = {
+    "yahoo": (0.08, 20),       # claves de relleno en `info`
+    "fred": (0.15, 12),        # observaciones por año
+    "newsapi": (0.12, 20),     # artículos por respuesta
+    "gnews": (0.18, 20),
+    "gemini": (0.8, 1200),     # caracteres de la respuesta
+    "freepik": (0.6, 300_000), # bytes de la imagen
+}
+
+# Escenario -> (unidad de la escala, escalas por defecto)
+ESCENARIOS = {
+    "fundamental": ("tickers", [3, 20]),
+    "sentimiento": ("empresas", [1, 10]),
+    "macro": ("obs/año", [12, 252]),
+    "imagen": ("prompts", [1, 8]),
+    "costo_tokens": ("archivos", [10, 500]),
+}
+
+
+def _percentil(valores: list, p: float) -> float:
+    """Percentil por rango más cercano (suficiente para pocas repeticiones)."""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def _pares(texto: str, convertir=float) -> dict:
+    """'gemini=1.5,yahoo=0.1' -> {'gemini': 1.5, 'yahoo': 0.1}"""
+    resultado = {}
+    for par in filter(None, (texto or "").split(",")):
+        clave, _, valor = par.partition("=")
+        resultado[clave.strip()] = convertir(valor)
+    return resultado
+
+
+def _escalas(texto: str) -> dict:
+    """'fundamental=3:50,imagen=4' -> {'fundamental': [3, 50], 'imagen': [4]}"""
+    return {k: [int(x) for x in v.split(":")] for k, v in _pares(texto, str).items()}
+
+
+class Entorno:
+    """
+    Prepara el directorio de trabajo, la configuración (variables de entorno
+    antes de importar los módulos del proyecto), el servidor falso y los
+    reemplazos de los SDK.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.directorio = args.directorio or tempfile.mkdtemp(prefix="bench_")
+        self.contador = Contador()
+        latencias, errores, tamanos = _pares(args.latencia), _pares(args.error), _pares(args.tamano, int)
+        self.servicios = {
+            nombre: Servicio(
+                nombre, self.contador, latencia=latencias.get(nombre, latencia),
+                tasa_error=errores.get(nombre, 0.0), tamano=tamanos.get(nombre, tamano), semilla=args.semilla,
+            )
+            for nombre, (latencia, tamano) in SERVICIOS.items()
+        }
+        self.servidor = ServidorFalso(
+            self.servicios["newsapi"], self.servicios["gnews"], self.servicios["freepik"],
+            modo_freepik=args.freepik_modo,
+        ).iniciar()
+
+    def configurar(self):
+        """Fija la configuración e importa los módulos del proyecto con los sustitutos."""
+        os.chdir(self.directorio)
+        entorno = {
+            "CACHE_DIR": os.path.join(self.directorio, ".cache"),
+            "GEMINI_API_KEY": "falsa", "FRED_API_KEY": "falsa", "NEWSAPI_API_KEY": "falsa",
+            "GNEWS_API_KEY": "falsa", "FREEPIK_API_KEY": "falsa",
+            "NEWSAPI_BASE_URL": self.servidor.url, "GNEWS_BASE_URL": self.servidor.url,
+            "FREEPIK_BASE_URL": self.servidor.url, "FREEPIK_POLL_INTERVALO": "0.05",
+            "GEMINI_STREAMING": "1" if self.args.streaming else "0",
+        }
+        if not self.args.caliente:
+            entorno.update({"YAHOO_CACHE_FORZAR": "1", "GEMINI_CACHE_ACTIVA": "0", "FREEPIK_CACHE_ACTIVA": "0"})
+        if self.args.sin_limites:
+            entorno.update({"YAHOO_SOLICITUDES_POR_SEGUNDO": "0", "FRED_SOLICITUDES_POR_SEGUNDO": "0", "GNEWS_RPM": "0"})
+        os.environ.update(entorno)
+
+        import fred_store
+        import gemini_ai
+        import yahoo_data
+        import utils
+        from config import Config
+
+        yahoo_data.yf = YFinanceFalso(self.servicios["yahoo"])
+        fred_store.web = DataReaderFalso(self.servicios["fred"])
+        gemini_ai.genai = GenAIFalso(self.servicios["gemini"])
+        utils.activar_progreso(False)
+        self.Config = Config
+
+        import opcion1_fundamental
+        import opcion2_sentimiento
+        import opcion3_macro
+        import opcion4_imagen_FreepikAI
+        import opcion5_costo_tokens
+        self.modulos = {
+            "fundamental": opcion1_fundamental, "sentimiento": opcion2_sentimiento, "macro": opcion3_macro,
+            "imagen": opcion4_imagen_FreepikAI, "costo_tokens": opcion5_costo_tokens,
+        }
+        if not self.args.verboso:
+            self._silenciar()
+
+    def _silenciar(self):
+        from rich.console import Console
+        silenciosa = Console(file=open(os.devnull, "w", encoding="utf-8"))
+        for nombre, modulo in list(sys.modules.items()):
+            archivo = getattr(modulo, "__file__", None) or ""
+            if archivo.startswith(RAIZ) and hasattr(modulo, "console") and not nombre.startswith("benchmarks"):
+                modulo.console = silenciosa
+
+    def limpiar_cache(self):
+        """Elimina los datos locales que harían 'caliente' la siguiente repetición."""
+        if self.args.caliente:
+            return
+        for ruta in (os.path.join(self.Config.CACHE_DIR, "fred"),
+                     os.path.join(self.Config.CACHE_DIR, "costos_archivos.json")):
+            if os.path.isdir(ruta):
+                shutil.rmtree(ruta)
+            elif os.path.exists(ruta):
+                os.remove(ruta)
+
+    def detener(self):
+        self.servidor.detener()
+        os.chdir(RAIZ)
+        if not self.args.directorio and not self.args.conservar:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+
+
+def _preparar(entorno: Entorno, escenario: str, escala: int, repeticion: int):
+    """Prepara una repetición; devuelve la función que se mide."""
+    m = entorno.modulos[escenario]
+    clave = "falsa"
+
+    if escenario == "fundamental":
+        empresas = {f"T{i:04d}": f"Empresa {i}" for i in range(escala)}
+        return lambda: m.analizar_inversion(clave, empresas=empresas)
+    if escenario == "sentimiento":
+        empresas = [f"Empresa{i}" for i in range(escala)]
+        if escala == 1:
+            return lambda: m.analizar_sentimiento(empresas[0], clave)
+        return lambda: m.analizar_sentimiento_lote(empresas, clave)
+    if escenario == "macro":
+        entorno.servicios["fred"].tamano = escala
+        return lambda: m.analizar_macro(clave, clave)
+    if escenario == "imagen":
+        prompts = [f"logo minimalista {repeticion}-{i}" for i in range(escala)]
+        if escala == 1:
+            return lambda: m.generar_imagen_freepik(prompts[0], clave)
+        return lambda: m.generar_imagenes_lote(prompts, clave)
+    if escenario == "costo_tokens":
+        carpeta = os.path.join("outputs", "bench_costos")
+        if os.path.isdir(carpeta):
+            shutil.rmtree(carpeta)
+        os.makedirs(carpeta)
+        for i in range(escala):
+            ruta = os.path.join(carpeta, f"Bench_{20250101 + i % 28}_{i:06d}.txt")
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write(f"--- PROMPT ---\n{'Datos del análisis. ' * (50 + i % 200)}"
+                        f"\n\n--- RESPUESTA DE GEMINI ---\n{'Conclusión del informe. ' * (20 + i % 80)}")
+        return lambda: m.analizar_costos_masivo(os.path.join(carpeta, "*.txt"))
+    raise ValueError(f"Escenario desconocido: {escenario}")
+
+
+def medir(entorno: Entorno, escenario: str, escala: int, repeticiones: int) -> dict:
+    """Ejecuta un escenario `repeticiones` veces más una repetición con tracemalloc."""
+    tiempos = []
+    entorno.contador.reiniciar()
+    for repeticion in range(repeticiones):
+        entorno.limpiar_cache()
+        funcion = _preparar(entorno, escenario, escala, repeticion)
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    llamadas = entorno.contador.instantanea()
+
+    entorno.limpiar_cache()
+    funcion = _preparar(entorno, escenario, escala, repeticiones)
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50 = _percentil(tiempos, 50)
+    return {
+        "escenario": escenario,
+        "escala": escala,
+        "unidad": ESCENARIOS[escenario][0],
+        "repeticiones": repeticiones,
+        "p50": round(p50, 4),
+        "p95": round(_percentil(tiempos, 95), 4),
+        "throughput": round(escala / p50, 3) if p50 else None,
+        "memoria_pico_mb": round(pico / 1024 / 1024, 2),
+        "llamadas_por_repeticion": {k: v / repeticiones for k, v in llamadas["llamadas"].items()},
+        "errores_inyectados": llamadas["errores"],
+    }
+
+
+def _ultimo_resultado() -> dict:
+    if not os.path.isdir(CARPETA_RESULTADOS):
+        return {}
+    archivos = sorted(f for f in os.listdir(CARPETA_RESULTADOS) if f.endswith(".json"))
+    if not archivos:
+        return {}
+    with open(os.path.join(CARPETA_RESULTADOS, archivos[-1]), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def mostrar(resultados: list, anterior: dict):
+    from rich.console import Console
+    from rich.table import Table
+
+    previos = {(r["escenario"], r["escala"]): r for r in anterior.get("resultados", [])}
+    tabla = Table(title="Benchmarks sin conexión")
+    for columna in ("Escenario", "Escala", "p50 (s)", "p95 (s)", "Δ p50", "Throughput", "Memoria pico",
+                    "Llamadas por ejecución"):
+        tabla.add_column(columna)
+    for r in resultados:
+        previo = previos.get((r["escenario"], r["escala"]))
+        delta = f"{(r['p50'] / previo['p50'] - 1) * 100:+.0f}%" if previo and previo["p50"] else "-"
+        llamadas = ", ".join(f"{k}={v:g}" for k, v in sorted(r["llamadas_por_repeticion"].items()))
+        tabla.add_row(
+            r["escenario"], f"{r['escala']} {r['unidad']}", f"{r['p50']:.3f}", f"{r['p95']:.3f}", delta,
+            f"{r['throughput']:.2f} {r['unidad']}/s" if r["throughput"] else "-",
+            f"{r['memoria_pico_mb']:.1f} MB", llamadas,
+        )
+    Console().print(tabla)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks sin conexión con sustitutos locales de las APIs.")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS), help="Escenarios separados por comas.")
+    parser.add_argument("--escalas", help="Escalas por escenario, p. ej. fundamental=3:50,imagen=4:16.")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--latencia", help="Latencia por servicio en segundos, p. ej. gemini=1.5,yahoo=0.1.")
+    parser.add_argument("--error", help="Tasa de error por servicio, p. ej. newsapi=0.2.")
+    parser.add_argument("--tamano", help="Tamaño de respuesta por servicio, p. ej. freepik=1000000,newsapi=50.")
+    parser.add_argument("--freepik-modo", choices=("linea", "tarea"), default="linea",
+                        help="Imagen en la respuesta o tarea asíncrona con consultas.")
+    parser.add_argument("--caliente", action="store_true", help="Mantiene las cachés entre repeticiones.")
+    parser.add_argument("--sin-limites", action="store_true", help="Desactiva los límites de tasa de Yahoo, FRED y GNews.")
+    parser.add_argument("--streaming", action="store_true", help="Usa las respuestas de Gemini en streaming.")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--directorio", help="Directorio de trabajo (por defecto uno temporal).")
+    parser.add_argument("--conservar", action="store_true", help="No borra el directorio temporal.")
+    parser.add_argument("--verboso", action="store_true", help="Muestra la salida de las opciones.")
+    parser.add_argument("--no-guardar", action="store_true", help="No guarda el resultado.")
+    args = parser.parse_args(argv)
+
+    escenarios = [e.strip() for e in args.escenarios.split(",") if e.strip()]
+    invalidos = [e for e in escenarios if e not in ESCENARIOS]
+    if invalidos:
+        parser.error(f"Escenarios no válidos: {', '.join(invalidos)}")
+    escalas = _escalas(args.escalas)
+
+    entorno = Entorno(args)
+    try:
+        entorno.configurar()
+        resultados = []
+        for escenario in escenarios:
+            for escala in escalas.get(escenario, ESCENARIOS[escenario][1]):
+                print(f"Midiendo {escenario} con {escala} {ESCENARIOS[escenario][0]}...", file=sys.stderr)
+                resultados.append(medir(entorno, escenario, escala, args.repeticiones))
+    finally:
+        entorno.detener()
+
+    anterior = _ultimo_resultado()
+    mostrar(resultados, anterior)
+
+    if not args.no_guardar:
+        if not os.path.exists(CARPETA_RESULTADOS):
+            os.makedirs(CARPETA_RESULTADOS)
+        ruta = os.path.join(CARPETA_RESULTADOS, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "parametros": {k: v for k, v in vars(args).items() if k not in ("directorio",)},
+                "resultados": resultados,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {ruta}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,379 @@
+"""
+Sustitutos locales de las APIs externas para medir el rendimiento sin claves
+ni red: un servidor HTTP para NewsAPI, GNews y Freepik, y objetos con la misma
+interfaz que `yfinance`, `pandas_datareader` y `google.generativeai`.
+
+Cada servicio tiene latencia, tasa de error y tamaño de respuesta configurables
+y cuenta sus llamadas en un `Contador` compartido.
+"""
+import asyncio
+import base64
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+
+class Contador:
+    """Cuenta llamadas y errores inyectados por servicio (seguro entre hilos)."""
+
+    def __init__(self):
+        self.llamadas = Counter()
+        self.errores = Counter()
+        self._lock = threading.Lock()
+
+    def registrar(self, servicio: str, error: bool = False):
+        with self._lock:
+            self.llamadas[servicio] += 1
+            if error:
+                self.errores[servicio] += 1
+
+    def instantanea(self) -> dict:
+        with self._lock:
+            return {"llamadas": dict(self.llamadas), "errores": dict(self.errores)}
+
+    def reiniciar(self):
+        with self._lock:
+            self.llamadas.clear()
+            self.errores.clear()
+
+
+class Servicio:
+    """
+    Comportamiento simulado de un servicio.
+
+    Args:
+        latencia (float): Segundos por llamada.
+        jitter (float): Variación relativa de la latencia (0.2 = ±20 %).
+        tasa_error (float): Probabilidad de que una llamada falle.
+        tamano (int): Tamaño de la respuesta (artículos, bytes, puntos o tokens, según el servicio).
+    """
+
+    def __init__(self, nombre: str, contador: Contador, latencia: float = 0.05, jitter: float = 0.2,
+                 tasa_error: float = 0.0, tamano: int = 0, semilla: int = 0):
+        self.nombre = nombre
+        self.contador = contador
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_error = tasa_error
+        self.tamano = tamano
+        self._random = random.Random(f"{semilla}-{nombre}")
+        self._lock = threading.Lock()
+
+    def _sortear(self) -> tuple:
+        with self._lock:
+            espera = self.latencia * (1 + self._random.uniform(-self.jitter, self.jitter))
+            falla = self._random.random() < self.tasa_error
+        return max(0.0, espera), falla
+
+    def llamar(self) -> bool:
+        """Espera la latencia simulada; devuelve True si la llamada debe fallar."""
+        espera, falla = self._sortear()
+        time.sleep(espera)
+        self.contador.registrar(self.nombre, falla)
+        return falla
+
+    async def llamar_async(self) -> bool:
+        espera, falla = self._sortear()
+        await asyncio.sleep(espera)
+        self.contador.registrar(self.nombre, falla)
+        return falla
+
+
+# --- Servidor HTTP: NewsAPI, GNews y Freepik ---------------------------------
+
+def _articulos(empresa: str, cantidad: int, proveedor: str) -> list:
+    temas = ("resultados trimestrales", "nuevo producto", "demanda regulatoria", "acuerdo comercial",
+             "cambio en la dirección", "recompra de acciones", "previsiones de ingresos")
+    return [
+        {
+            "title": f"{empresa}: {temas[i % len(temas)]} ({proveedor} {i})",
+            "description": f"{empresa} informa sobre {temas[(i * 3) % len(temas)]}. " * 3,
+            "url": f"https://ejemplo.com/{proveedor}/{i}",
+            "source": {"name": f"Fuente {i % 5}"},
+            "publishedAt": "2025-01-01T00:00:00Z",
+        }
+        for i in range(cantidad)
+    ]
+
+def imagen_falsa(tamano: int) -> bytes:
+    """Bytes con cabecera PNG y el tamaño pedido."""
+    cabecera = b"\x89PNG\r\n\x1a\n"
+    return cabecera + bytes(max(0, tamano - len(cabecera)))
+
+
+class ServidorFalso:
+    """
+    Servidor HTTP local que imita los endpoints usados por `news_data` y
+    `opcion4_imagen_FreepikAI`. Freepik puede responder con la imagen en línea
+    (`modo_freepik="linea"`) o con una tarea que se completa tras
+    `consultas_tarea` consultas (`modo_freepik="tarea"`).
+    """
+
+    def __init__(self, newsapi: Servicio, gnews: Servicio, freepik: Servicio,
+                 modo_freepik: str = "linea", consultas_tarea: int = 2):
+        self.servicios = {"newsapi": newsapi, "gnews": gnews, "freepik": freepik}
+        self.modo_freepik = modo_freepik
+        self.consultas_tarea = consultas_tarea
+        self._tareas = {}
+        self._lock = threading.Lock()
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                servidor._atender(self, "GET")
+
+            def do_POST(self):
+                servidor._atender(self, "POST")
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self._http.daemon_threads = True
+        self._hilo = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._http.server_address[1]}"
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def _responder(self, manejador, estado: int, cuerpo, tipo: str = "application/json"):
+        datos = cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo).encode("utf-8")
+        manejador.send_response(estado)
+        manejador.send_header("Content-Type", tipo)
+        manejador.send_header("Content-Length", str(len(datos)))
+        manejador.end_headers()
+        manejador.wfile.write(datos)
+
+    def _atender(self, manejador, metodo: str):
+        url = urlparse(manejador.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if metodo == "POST":
+            # Se consume el cuerpo para mantener viva la conexión
+            manejador.rfile.read(int(manejador.headers.get("Content-Length") or 0))
+
+        if url.path.startswith("/v2/"):
+            servicio = self.servicios["newsapi"]
+            if servicio.llamar():
+                return self._responder(manejador, 503, {"status": "error"})
+            cantidad = min(servicio.tamano, int(params.get("pageSize", servicio.tamano)))
+            return self._responder(manejador, 200, {"articles": _articulos(params.get("q", ""), cantidad, "newsapi")})
+
+        if url.path == "/api/v4/search":
+            servicio = self.servicios["gnews"]
+            if servicio.llamar():
+                return self._responder(manejador, 503, {"errors": ["error simulado"]})
+            cantidad = min(servicio.tamano, int(params.get("max", servicio.tamano)))
+            return self._responder(manejador, 200, {"articles": _articulos(params.get("q", ""), cantidad, "gnews")})
+
+        servicio = self.servicios["freepik"]
+        if url.path == "/v1/ai/text-to-image" and metodo == "POST":
+            if servicio.llamar():
+                return self._responder(manejador, 503, {"message": "error simulado"})
+            if self.modo_freepik == "linea":
+                valor = base64.b64encode(imagen_falsa(servicio.tamano)).decode("ascii")
+                return self._responder(manejador, 200, {"data": [{"base64": valor}]})
+            with self._lock:
+                task_id = f"tarea{len(self._tareas)}"
+                self._tareas[task_id] = 0
+            return self._responder(manejador, 200, {"data": {"task_id": task_id, "status": "IN_PROGRESS"}})
+
+        coincidencia = re.match(r"^/v1/ai/text-to-image/(\w+)$", url.path)
+        if coincidencia:
+            task_id = coincidencia.group(1)
+            self.servicios["freepik"].contador.registrar("freepik_consultas")
+            with self._lock:
+                self._tareas[task_id] = self._tareas.get(task_id, 0) + 1
+                terminada = self._tareas[task_id] >= self.consultas_tarea
+            datos = {"task_id": task_id, "status": "COMPLETED" if terminada else "IN_PROGRESS"}
+            if terminada:
+                datos["generated"] = [f"{self.url}/imagenes/{task_id}.png"]
+            return self._responder(manejador, 200, {"data": datos})
+
+        if url.path.startswith("/imagenes/"):
+            self.servicios["freepik"].contador.registrar("freepik_descargas")
+            return self._responder(manejador, 200, imagen_falsa(servicio.tamano), "image/png")
+
+        self._responder(manejador, 404, {"message": "ruta desconocida"})
+
+
+# --- yfinance -----------------------------------------------------------------
+
+class YFinanceFalso:
+    """Reemplazo de `yfinance` con `Ticker(ticker)` y sus estados financieros."""
+
+    def __init__(self, servicio: Servicio, anios: int = 4):
+        self.servicio = servicio
+        self.anios = anios
+
+    def Ticker(self, ticker: str):
+        return _TickerFalso(ticker, self.servicio, self.anios)
+
+
+class _TickerFalso:
+    def __init__(self, ticker: str, servicio: Servicio, anios: int):
+        self.ticker = ticker
+        self.servicio = servicio
+        self.fechas = pd.to_datetime([f"{2024 - i}-12-31" for i in range(anios)])
+        self._rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+
+    def _llamar(self):
+        if self.servicio.llamar():
+            raise ConnectionError(f"Error simulado de Yahoo para {self.ticker}")
+
+    def _estado(self, filas: dict):
+        return pd.DataFrame(
+            {fila: self._rng.uniform(bajo, alto, len(self.fechas)) for fila, (bajo, alto) in filas.items()},
+            index=self.fechas,
+        ).T
+
+    @property
+    def financials(self):
+        self._llamar()
+        return self._estado({"Total Revenue": (1e9, 4e11), "Net Income": (1e8, 9e10)})
+
+    @property
+    def quarterly_financials(self):
+        self._llamar()
+        return self._estado({"Total Revenue": (2e8, 1e11), "Net Income": (2e7, 2e10)})
+
+    @property
+    def balance_sheet(self):
+        self._llamar()
+        return self._estado({
+            "Total Assets": (1e9, 5e11),
+            "Total Liabilities Net Minority Interest": (5e8, 3e11),
+            "Common Stock Equity": (5e8, 2e11),
+            "Current Ratio": (0.5, 3.0),
+        })
+
+    @property
+    def info(self):
+        self._llamar()
+        # `tamano` agrega claves de relleno para simular respuestas grandes
+        info = {"returnOnEquity": float(self._rng.uniform(-0.1, 0.6)), "shortName": self.ticker}
+        info.update({f"campo_{i}": i for i in range(self.servicio.tamano)})
+        return info
+
+
+# --- pandas_datareader (FRED) ---------------------------------------------------
+
+class DataReaderFalso:
+    """Reemplazo de `pandas_datareader.data` con `DataReader(symbol, 'fred', ...)`."""
+
+    def __init__(self, servicio: Servicio):
+        self.servicio = servicio
+
+    def DataReader(self, symbol, fuente, start=None, end=None, api_key=None):
+        if self.servicio.llamar():
+            raise ConnectionError(f"Error simulado de FRED para {symbol}")
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        # `tamano` = observaciones por año (12 mensual, 52 semanal, 252 diaria)
+        puntos = max(2, int((end - start).days / 365.25 * max(1, self.servicio.tamano)))
+        indice = pd.date_range(start, end, periods=puntos).normalize()
+        rng = np.random.default_rng(zlib.crc32(str(symbol).encode()))
+        valores = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.01, puntos)))
+        df = pd.DataFrame({symbol: valores}, index=indice)
+        df.index.name = "DATE"
+        return df[~df.index.duplicated()]
+
+
+# --- google.generativeai ----------------------------------------------------------
+
+class GenAIFalso:
+    """Reemplazo de `google.generativeai` con `configure` y `GenerativeModel`."""
+
+    def __init__(self, servicio: Servicio, fragmentos: int = 8):
+        self.servicio = servicio
+        self.fragmentos = fragmentos
+
+    def configure(self, **kwargs):
+        pass
+
+    def GenerativeModel(self, nombre, generation_config=None, safety_settings=None):
+        return _ModeloFalso(self, generation_config or {})
+
+
+def _tokens(texto: str) -> int:
+    return max(1, len(texto) // 4)
+
+
+class _RespuestaFalsa:
+    def __init__(self, texto: str, prompt: str):
+        self.text = texto
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=_tokens(prompt),
+            candidates_token_count=_tokens(texto),
+            total_token_count=_tokens(prompt) + _tokens(texto),
+        )
+
+
+class _StreamFalso:
+    def __init__(self, texto: str, prompt: str, servicio: Servicio, fragmentos: int):
+        self._texto = texto
+        self._prompt = prompt
+        self._servicio = servicio
+        self._fragmentos = max(1, fragmentos)
+        self.usage_metadata = None
+
+    def __iter__(self):
+        if self._servicio.llamar():
+            raise RuntimeError("429 Error simulado de Gemini")
+        paso = max(1, len(self._texto) // self._fragmentos)
+        for i in range(0, len(self._texto), paso):
+            # La latencia del servicio es el TTFT; cada fragmento agrega una fracción
+            time.sleep(self._servicio.latencia / self._fragmentos)
+            yield SimpleNamespace(text=self._texto[i:i + paso])
+        self.usage_metadata = _RespuestaFalsa(self._texto, self._prompt).usage_metadata
+
+
+class _ModeloFalso:
+    def __init__(self, genai: GenAIFalso, generation_config: dict):
+        self.genai = genai
+        self.generation_config = generation_config
+
+    def _texto(self, prompt: str) -> str:
+        if self.generation_config.get("response_mime_type") == "application/json":
+            # Modo por lotes de sentimiento: una fila por encabezado "### Empresa"
+            empresas = re.findall(r"^### (.+)$", prompt, flags=re.MULTILINE)
+            return json.dumps([
+                {"empresa": e, "sentimiento": "neutral", "puntuacion": 0.0, "resumen": "Sin cambios relevantes.",
+                 "riesgos": "-", "oportunidades": "-"}
+                for e in empresas
+            ])
+        return "Análisis simulado. " * max(1, self.genai.servicio.tamano // 4)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return _StreamFalso(self._texto(prompt), prompt, self.genai.servicio, self.genai.fragmentos)
+        if self.genai.servicio.llamar():
+            raise RuntimeError("429 Error simulado de Gemini")
+        return _RespuestaFalsa(self._texto(prompt), prompt)
+
+    async def generate_content_async(self, prompt: str):
+        if await self.genai.servicio.llamar_async():
+            raise RuntimeError("429 Error simulado de Gemini")
+        return _RespuestaFalsa(self._texto(prompt), prompt)
+
+    def count_tokens(self, texto: str):
+        self.genai.servicio.contador.registrar("gemini_count_tokens")
+        return SimpleNamespace(total_tokens=_tokens(texto))
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from config import Config
+
+
+def normalizar_prompt(prompt: str) -> str:
+    """Minúsculas, sin espacios repetidos ni puntuación final, para detectar prompts equivalentes."""
+    texto = unicodedata.normalize("NFKC", prompt or "").lower()
+    texto = re.sub(r"\s+", " ", texto).strip()
+    return texto.rstrip(" .,;:!")
+
+
+def clave_imagen(prompt: str, aspect_ratio: str, parametros: dict = None) -> str:
+    """Hash del prompt normalizado, la relación de aspecto y los parámetros del modelo."""
+    contenido = json.dumps(
+        {"prompt": normalizar_prompt(prompt), "aspect_ratio": aspect_ratio, "parametros": parametros or {}},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheImagenes:
+    """
+    Caché en SQLite de imágenes generadas con Freepik: un prompt equivalente
+    (misma relación de aspecto y parámetros) devuelve el archivo ya generado
+    sin una nueva solicitud. Las imágenes cacheadas se limitan por tamaño
+    total; al superarlo se eliminan (archivo incluido) las usadas hace más tiempo.
+    """
+
+    def __init__(self, ruta: str = None, max_mb: float = None):
+        self.ruta = ruta or os.path.join(Config.CACHE_DIR, "imagenes.sqlite")
+        self.max_bytes = (max_mb if max_mb is not None else Config.FREEPIK_CACHE_MAX_MB) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.bytes_ahorrados = 0
+        self.segundos_ahorrados = 0.0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        if self._conn is None:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta and not os.path.exists(carpeta):
+                os.makedirs(carpeta)
+            self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS imagenes (
+                    clave TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL,
+                    archivo TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    segundos REAL NOT NULL,
+                    creado REAL NOT NULL,
+                    ultimo_acceso REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def obtener(self, clave: str):
+        """Devuelve la ruta de la imagen cacheada o None (también si el archivo ya no existe)."""
+        with self._lock:
+            conn = self._conexion()
+            fila = conn.execute(
+                "SELECT archivo, bytes, segundos FROM imagenes WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila and not os.path.exists(fila[0]):
+                conn.execute("DELETE FROM imagenes WHERE clave = ?", (clave,))
+                conn.commit()
+                fila = None
+            if not fila:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE imagenes SET ultimo_acceso = ? WHERE clave = ?", (time.time(), clave))
+            conn.commit()
+            self.hits += 1
+            self.bytes_ahorrados += fila[1]
+            self.segundos_ahorrados += fila[2]
+        return fila[0]
+
+    def guardar(self, clave: str, prompt: str, archivo: str, segundos: float = 0.0):
+        """Registra una imagen generada y aplica el límite de tamaño."""
+        ahora = time.time()
+        with self._lock:
+            conn = self._conexion()
+            conn.execute(
+                "INSERT OR REPLACE INTO imagenes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (clave, prompt, archivo, os.path.getsize(archivo), segundos, ahora, ahora),
+            )
+            conn.commit()
+            self._evictar(conn)
+
+    def _evictar(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM imagenes").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for clave, archivo, tamano in conn.execute(
+            "SELECT clave, archivo, bytes FROM imagenes ORDER BY ultimo_acceso ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            for ruta in (archivo, os.path.splitext(archivo)[0] + "_mini.jpg"):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            conn.execute("DELETE FROM imagenes WHERE clave = ?", (clave,))
+            total -= tamano
+        conn.commit()
+
+    def estadisticas(self) -> dict:
+        """Aciertos, fallos, tasa de aciertos, solicitudes/bytes/segundos ahorrados y entradas."""
+        with self._lock:
+            entradas, total = self._conexion().execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM imagenes"
+            ).fetchone()
+        consultas = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tasa_aciertos": self.hits / consultas if consultas else 0.0,
+            "solicitudes_ahorradas": self.hits,
+            "bytes_ahorrados": self.bytes_ahorrados,
+            "segundos_ahorrados": round(self.segundos_ahorrados, 3),
+            "entradas": entradas,
+            "bytes_en_cache": total,
+        }
+
+    def registrar_estadisticas(self, filename: str = "estadisticas_freepik.log"):
+        """Agrega las estadísticas actuales a un log junto a `error_freepik.log`."""
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write(f"[{datetime.now()}] {json.dumps(self.estadisticas())}\n")
+
+
+# Instancia compartida usada por opcion4_imagen_FreepikAI
+cache_imagenes = CacheImagenes()
@@ -0,0 +1,156 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from config import Config
+
+SEPARADOR_PROMPT = "--- PROMPT ---\n"
+SEPARADOR_RESPUESTA = "\n\n--- RESPUESTA DE GEMINI ---\n"
+
+
+class RespuestaCacheada:
+    """Respuesta de Gemini recuperada de la caché (misma interfaz que usan las opciones)."""
+
+    def __init__(self, text: str, prompt_tokens: int = 0, output_tokens: int = 0):
+        self.text = text
+        self.desde_cache = True
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+
+
+def clave_respuesta(modelo: str, prompt: str, generation_config: dict = None) -> str:
+    """Hash del contenido (modelo, prompt, configuración de generación)."""
+    contenido = json.dumps(
+        {"modelo": modelo, "prompt": prompt, "config": generation_config or {}},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheRespuestas:
+    """
+    Caché persistente en SQLite de respuestas de Gemini, direccionada por el
+    contenido del prompt. Respeta un TTL y un número máximo de entradas
+    (se eliminan las usadas hace más tiempo).
+    """
+
+    def __init__(self, ruta: str = None, ttl_segundos: float = None, max_entradas: int = None):
+        self.ruta = ruta or os.path.join(Config.CACHE_DIR, "gemini.sqlite")
+        self.ttl = ttl_segundos if ttl_segundos is not None else Config.GEMINI_CACHE_TTL_HORAS * 3600
+        self.max_entradas = max_entradas if max_entradas is not None else Config.GEMINI_CACHE_MAX_ENTRADAS
+        self.hits = 0
+        self.misses = 0
+        self.tokens_ahorrados = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        if self._conn is None:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta and not os.path.exists(carpeta):
+                os.makedirs(carpeta)
+            self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS respuestas (
+                    clave TEXT PRIMARY KEY,
+                    modelo TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    ultimo_acceso REAL NOT NULL,
+                    texto TEXT NOT NULL,
+                    tokens_entrada INTEGER NOT NULL,
+                    tokens_salida INTEGER NOT NULL
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def obtener(self, clave: str):
+        """Devuelve una `RespuestaCacheada` vigente o None."""
+        ahora = time.time()
+        with self._lock:
+            conn = self._conexion()
+            fila = conn.execute(
+                "SELECT creado, texto, tokens_entrada, tokens_salida FROM respuestas WHERE clave = ?",
+                (clave,),
+            ).fetchone()
+            if not fila or ahora - fila[0] >= self.ttl:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE respuestas SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave))
+            conn.commit()
+            self.hits += 1
+            self.tokens_ahorrados += fila[2] + fila[3]
+        return RespuestaCacheada(fila[1], fila[2], fila[3])
+
+    def guardar(self, clave: str, modelo: str, texto: str, tokens_entrada: int = 0,
+                tokens_salida: int = 0, creado: float = None):
+        """Guarda una respuesta y elimina las entradas sobrantes (LRU)."""
+        if not texto:
+            return
+        creado = creado or time.time()
+        with self._lock:
+            conn = self._conexion()
+            conn.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (clave, modelo, creado, creado, texto, tokens_entrada or 0, tokens_salida or 0),
+            )
+            conn.execute(
+                """DELETE FROM respuestas WHERE clave NOT IN (
+                    SELECT clave FROM respuestas ORDER BY ultimo_acceso DESC LIMIT ?
+                )""",
+                (self.max_entradas,),
+            )
+            conn.commit()
+
+    def sembrar_desde_outputs(self, modelo: str, carpeta: str = "outputs") -> int:
+        """
+        Carga en la caché las conversaciones guardadas por `guardar_conversacion`
+        que todavía están dentro del TTL. Devuelve cuántas se agregaron.
+        """
+        agregadas = 0
+        limite = time.time() - self.ttl
+        for ruta in glob.glob(os.path.join(carpeta, "*.txt")):
+            creado = os.path.getmtime(ruta)
+            if creado < limite:
+                continue
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    contenido = f.read()
+            except OSError:
+                continue
+            if not contenido.startswith(SEPARADOR_PROMPT) or SEPARADOR_RESPUESTA not in contenido:
+                continue
+            prompt, respuesta = contenido[len(SEPARADOR_PROMPT):].split(SEPARADOR_RESPUESTA, 1)
+            if not respuesta.strip():
+                continue  # conversación sin respuesta (p. ej. un stream interrumpido)
+            clave = clave_respuesta(modelo, prompt)
+            with self._lock:
+                existe = self._conexion().execute(
+                    "SELECT 1 FROM respuestas WHERE clave = ?", (clave,)
+                ).fetchone()
+            if not existe:
+                self.guardar(clave, modelo, respuesta, creado=creado)
+                agregadas += 1
+        return agregadas
+
+    def estadisticas(self) -> dict:
+        """Devuelve aciertos, fallos, tokens ahorrados y número de entradas."""
+        with self._lock:
+            entradas = self._conexion().execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tokens_ahorrados": self.tokens_ahorrados,
+            "entradas": entradas,
+        }
+
+
+# Instancia compartida usada por gemini_ai
+cache_respuestas = CacheRespuestas()
@@ -0,0 +1,146 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from config import Config
+
+# Tiempo de vida (en segundos) de cada tipo de estado descargado de Yahoo.
+# Los estados anuales cambian pocas veces al año; `info` incluye precios y se
+# refresca más seguido.
+TTL_POR_ESTADO = {
+    "balance_sheet": 7 * 24 * 3600,
+    "financials": 7 * 24 * 3600,
+    "quarterly_financials": 24 * 3600,
+    "info": 6 * 3600,
+}
+TTL_POR_DEFECTO = 24 * 3600
+
+
+class CacheYahoo:
+    """
+    Caché persistente en SQLite para los estados financieros de yfinance.
+
+    Cada entrada se indexa por ticker + tipo de estado y guarda la fecha de
+    descarga, de modo que se respeta un TTL distinto por estado. Cuando el
+    tamaño total supera `max_bytes` se eliminan las entradas usadas hace más
+    tiempo (LRU).
+    """
+
+    def __init__(self, ruta: str = None, max_bytes: int = None, ttls: dict = None):
+        self.ruta = ruta or os.path.join(Config.CACHE_DIR, "yahoo.sqlite")
+        self.max_bytes = max_bytes if max_bytes is not None else int(Config.YAHOO_CACHE_MAX_MB * 1024 * 1024)
+        self.ttls = {**TTL_POR_ESTADO, **(ttls or {})}
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        """Abre la base de datos la primera vez que se necesita."""
+        if self._conn is None:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta and not os.path.exists(carpeta):
+                os.makedirs(carpeta)
+            self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS estados (
+                    ticker TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    fecha_descarga REAL NOT NULL,
+                    ultimo_acceso REAL NOT NULL,
+                    tamano INTEGER NOT NULL,
+                    datos BLOB NOT NULL,
+                    PRIMARY KEY (ticker, tipo)
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def obtener(self, ticker: str, tipo: str, cargador, forzar: bool = False):
+        """
+        Devuelve el estado `tipo` de `ticker` desde la caché si sigue vigente;
+        si no, lo descarga con `cargador()` y lo guarda.
+        """
+        ticker = ticker.upper()
+        forzar = forzar or Config.YAHOO_CACHE_FORZAR
+        ahora = time.time()
+
+        if not forzar:
+            with self._lock:
+                conn = self._conexion()
+                fila = conn.execute(
+                    "SELECT fecha_descarga, datos FROM estados WHERE ticker = ? AND tipo = ?",
+                    (ticker, tipo),
+                ).fetchone()
+                if fila and ahora - fila[0] < self.ttls.get(tipo, TTL_POR_DEFECTO):
+                    conn.execute(
+                        "UPDATE estados SET ultimo_acceso = ? WHERE ticker = ? AND tipo = ?",
+                        (ahora, ticker, tipo),
+                    )
+                    conn.commit()
+                    self.hits += 1
+                    return pickle.loads(fila[1])
+
+        # La descarga se hace fuera del lock para no bloquear otros tickers
+        datos = cargador()
+        with self._lock:
+            self.misses += 1
+            if not _es_vacio(datos):
+                blob = pickle.dumps(datos, protocol=pickle.HIGHEST_PROTOCOL)
+                conn = self._conexion()
+                conn.execute(
+                    "INSERT OR REPLACE INTO estados VALUES (?, ?, ?, ?, ?, ?)",
+                    (ticker, tipo, ahora, ahora, len(blob), blob),
+                )
+                conn.commit()
+                self._evictar()
+        return datos
+
+    def _evictar(self):
+        """Elimina las entradas menos usadas hasta respetar `max_bytes`."""
+        conn = self._conexion()
+        total = conn.execute("SELECT COALESCE(SUM(tamano), 0) FROM estados").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        filas = conn.execute(
+            "SELECT ticker, tipo, tamano FROM estados ORDER BY ultimo_acceso ASC"
+        ).fetchall()
+        for ticker, tipo, tamano in filas:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM estados WHERE ticker = ? AND tipo = ?", (ticker, tipo))
+            total -= tamano
+        conn.commit()
+
+    def invalidar(self, ticker: str = None):
+        """Borra las entradas de un ticker, o toda la caché si no se indica."""
+        with self._lock:
+            conn = self._conexion()
+            if ticker:
+                conn.execute("DELETE FROM estados WHERE ticker = ?", (ticker.upper(),))
+            else:
+                conn.execute("DELETE FROM estados")
+            conn.commit()
+
+    def estadisticas(self) -> dict:
+        """Devuelve los contadores de aciertos/fallos y el tamaño de la caché."""
+        with self._lock:
+            conn = self._conexion()
+            entradas, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM estados"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entradas": entradas, "bytes": total}
+
+
+def _es_vacio(datos) -> bool:
+    """No se cachean descargas fallidas (None, DataFrame o dict vacíos)."""
+    if datos is None:
+        return True
+    if hasattr(datos, "empty"):
+        return datos.empty
+    return len(datos) == 0 if hasattr(datos, "__len__") else False
+
+
+# Instancia compartida por yahoo_data y opcion1_fundamental
+cache_yahoo = CacheYahoo()
@@ -0,0 +1,135 @@
+import math
+import numbers
+from rich.console import Console
+from config import Config
+from utils import estimar_tokens
+
+console = Console()
+
+# Sufijos para abreviar importes grandes (ingresos, capitalización...)
+_ESCALAS = ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K"))
+
+
+def _numero(valor):
+    """Convierte valores numéricos (incluidos los de numpy) a float; None si no hay dato."""
+    if valor is None or isinstance(valor, (str, bool)) or not isinstance(valor, numbers.Number):
+        return None
+    valor = float(valor)
+    return None if math.isnan(valor) or math.isinf(valor) else valor
+
+
+def formatear_valor(valor, formato: str = "numero", decimales: int = None) -> str:
+    """
+    Formatea un valor para el prompt sin unidades (las unidades van en el encabezado).
+
+    Formatos: 'numero', 'fraccion' (0.153 -> 15.3, para columnas en %),
+    'importe' (245120000000 -> 245.1B) y 'texto'. Sin dato devuelve '-'.
+    """
+    decimales = Config.PROMPT_DECIMALES if decimales is None else decimales
+    if formato == "texto":
+        return str(valor) if valor not in (None, "") else "-"
+    numero = _numero(valor)
+    if numero is None:
+        return "-"
+    sufijo = ""
+    if formato == "fraccion":
+        numero *= 100
+    elif formato == "importe":
+        # La escala se elige con el valor ya redondeado: 999999 -> 1M y no 1000K
+        for escala, sufijo_escala in _ESCALAS:
+            if abs(round(numero / escala, decimales)) >= 1:
+                numero, sufijo = numero / escala, sufijo_escala
+                break
+    texto = f"{numero:.{decimales}f}"
+    # 12.50 -> 12.5, 3.00 -> 3: los ceros finales no aportan información
+    if "." in texto:
+        texto = texto.rstrip("0").rstrip(".")
+    return texto + sufijo
+
+
+def codificar_filas(filas: list, columnas: list, separador: str = "|") -> tuple:
+    """
+    Convierte filas (dicts) en líneas compactas separadas por `separador`.
+
+    Args:
+        columnas: Lista de (clave, título con unidad, formato).
+
+    Returns:
+        tuple: (encabezado, [línea por fila])
+    """
+    encabezado = separador.join(titulo for _, titulo, _ in columnas)
+    lineas = [
+        separador.join(formatear_valor(fila.get(clave), formato) for clave, _, formato in columnas)
+        for fila in filas
+    ]
+    return encabezado, lineas
+
+
+def _fila_resumen(omitidas: list, columnas: list, etiqueta: str) -> dict:
+    """Media de cada columna numérica de las filas omitidas."""
+    resumen = {}
+    for clave, _, formato in columnas:
+        valores = [v for v in (_numero(f.get(clave)) for f in omitidas) if v is not None]
+        if formato != "texto" and valores:
+            resumen[clave] = sum(valores) / len(valores)
+    resumen[columnas[0][0]] = etiqueta
+    return resumen
+
+
+def tabla_compacta(filas: list, columnas: list, max_tokens: int = None, prioridad=None,
+                   etiqueta_resumen=None, separador: str = "|") -> tuple:
+    """
+    Tabla compacta (una línea por fila) que respeta un presupuesto de tokens.
+
+    Si no cabe, se descartan las filas de menor `prioridad(fila)` y se
+    reemplazan por una fila con la media de las omitidas, etiquetada con
+    `etiqueta_resumen(omitidas)`. Las filas incluidas conservan su orden.
+
+    Returns:
+        tuple: (texto de la tabla, informe con filas, incluidas, omitidas y tokens)
+    """
+    encabezado, lineas = codificar_filas(filas, columnas, separador)
+    orden = list(range(len(filas)))
+    if prioridad:
+        orden.sort(key=lambda i: prioridad(filas[i]), reverse=True)
+
+    def construir(cantidad: int) -> str:
+        """Tabla con las `cantidad` filas más prioritarias y el resumen del resto."""
+        incluidas, omitidas = sorted(orden[:cantidad]), orden[cantidad:]
+        partes = [encabezado] + [lineas[i] for i in incluidas]
+        if omitidas:
+            filas_omitidas = [filas[i] for i in omitidas]
+            etiqueta = etiqueta_resumen(filas_omitidas) if etiqueta_resumen else f"media de {len(omitidas)} omitidas"
+            partes += codificar_filas([_fila_resumen(filas_omitidas, columnas, etiqueta)], columnas, separador)[1]
+        return "\n".join(partes)
+
+    cantidad = len(filas)
+    texto = construir(cantidad)
+    if max_tokens and estimar_tokens(texto) > max_tokens:
+        # Estimación inicial acumulando filas por prioridad; luego se ajusta con la tabla real
+        disponible, cantidad = max_tokens - estimar_tokens(encabezado), 0
+        for i in orden:
+            disponible -= estimar_tokens(lineas[i]) + 1
+            if disponible < 0:
+                break
+            cantidad += 1
+        texto = construir(cantidad)
+        while cantidad > 0 and estimar_tokens(texto) > max_tokens:
+            cantidad -= 1
+            texto = construir(cantidad)
+
+    informe = {
+        "filas": len(filas),
+        "incluidas": cantidad,
+        "omitidas": len(filas) - cantidad,
+        "tokens": estimar_tokens(texto),
+    }
+    return texto, informe
+
+
+def reportar_tokens(prompt: str, etiqueta: str, presupuesto: int = None) -> int:
+    """Muestra los tokens estimados de un prompt antes de enviarlo y los devuelve."""
+    tokens = estimar_tokens(prompt)
+    limite = f" (presupuesto de datos: {presupuesto})" if presupuesto else ""
+    console.print(f"[dim]{etiqueta}: ~{tokens} tokens de entrada{limite}.[/dim]")
+    return tokens
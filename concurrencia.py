@@ -0,0 +1,127 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from trazas import con_contexto
+
+
+class LimitadorTasa:
+    """
+    Limitador de tasa tipo token bucket, seguro entre hilos.
+
+    Permite `tasa` unidades por segundo (solicitudes o tokens) con ráfagas de
+    hasta `rafaga`. Cuando hay varios hilos esperando, el de menor `prioridad`
+    (y, a igualdad, el que llegó antes) obtiene el siguiente turno.
+    """
+
+    def __init__(self, tasa: float, rafaga: int = 1):
+        self.tasa = tasa
+        self.rafaga = max(1, rafaga)
+        self._tokens = float(self.rafaga)
+        self._ultimo = time.monotonic()
+        self._cola = []
+        self._orden = itertools.count()
+        self._cond = threading.Condition()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.rafaga, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def esperar(self, unidades: float = 1, prioridad: int = 1):
+        """Bloquea hasta que haya `unidades` disponibles (respetando la prioridad) y las consume."""
+        if not self.tasa or self.tasa <= 0:
+            return
+        # Una solicitud mayor que la ráfaga nunca cabría: se limita a la ráfaga
+        unidades = min(unidades, self.rafaga)
+        turno = (prioridad, next(self._orden))
+        with self._cond:
+            heapq.heappush(self._cola, turno)
+            try:
+                while True:
+                    self._recargar()
+                    if self._cola[0] == turno:
+                        if self._tokens >= unidades:
+                            self._tokens -= unidades
+                            return
+                        self._cond.wait((unidades - self._tokens) / self.tasa)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._cola.remove(turno)
+                heapq.heapify(self._cola)
+                self._cond.notify_all()
+
+    def ajustar(self, unidades: float):
+        """Descuenta (o devuelve, si es negativo) unidades ya consumidas, p. ej. tokens reales vs. estimados."""
+        if not self.tasa or self.tasa <= 0:
+            return
+        with self._cond:
+            self._recargar()
+            self._tokens = min(self.rafaga, self._tokens - unidades)
+            self._cond.notify_all()
+
+
+_limitadores = {}
+_limitadores_lock = threading.Lock()
+
+
+def limitador_para(host: str, tasa: float = 5.0, rafaga: int = 1) -> LimitadorTasa:
+    """Devuelve el limitador compartido para un host (lo crea la primera vez)."""
+    with _limitadores_lock:
+        if host not in _limitadores:
+            _limitadores[host] = LimitadorTasa(tasa, rafaga)
+        return _limitadores[host]
+
+
+def reintentar(func, intentos: int = 3, espera_base: float = 0.5, espera_max: float = 8.0, reintentable=None):
+    """
+    Ejecuta `func()` reintentando ante excepciones con backoff exponencial
+    y jitter completo. Relanza la última excepción si se agotan los intentos
+    o si `reintentable(error)` indica que el error no es transitorio.
+    """
+    for intento in range(1, intentos + 1):
+        try:
+            return func()
+        except Exception as e:
+            if intento == intentos or (reintentable and not reintentable(e)):
+                raise
+            time.sleep(random.uniform(0, min(espera_max, espera_base * 2 ** (intento - 1))))
+
+
+def ejecutar_concurrente(elementos, func, max_workers: int = 8, intentos: int = 3, al_completar=None,
+                         reintentable=None):
+    """
+    Aplica `func(elemento)` sobre `elementos` con un pool de hilos acotado
+    (con los reintentos de `reintentar`).
+
+    Los resultados se entregan en orden de finalización: `al_completar(elemento,
+    resultado, error)` se llama en cuanto termina cada uno.
+
+    Returns:
+        tuple: (resultados, errores), dos diccionarios indexados por elemento.
+    """
+    resultados, errores = {}, {}
+    elementos = list(elementos)
+    if not elementos:
+        return resultados, errores
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(elementos)))) as pool:
+        futuros = {
+            pool.submit(con_contexto(reintentar), lambda e=elemento: func(e), intentos,
+                        reintentable=reintentable): elemento
+            for elemento in elementos
+        }
+        for futuro in as_completed(futuros):
+            elemento = futuros[futuro]
+            try:
+                resultados[elemento] = futuro.result()
+                error = None
+            except Exception as e:
+                errores[elemento] = e
+                error = e
+            if al_completar:
+                al_completar(elemento, resultados.get(elemento), error)
+    return resultados, errores
@@ -11,4 +11,84 @@ class Config:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     EMAIL = os.getenv("EMAIL")
     FREEPIK_API_KEY = os.getenv("FREEPIK_API_KEY")
-    HEADERS_SEC = {"User-Agent": EMAIL}
\ No newline at end of file
+    HEADERS_SEC = {"User-Agent": EMAIL}
+
+    # Caché local de estados financieros de Yahoo Finance
+    CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+    YAHOO_CACHE_MAX_MB = float(os.getenv("YAHOO_CACHE_MAX_MB", "50"))
+    YAHOO_CACHE_FORZAR = os.getenv("YAHOO_CACHE_FORZAR", "0") == "1"
+
+    # Descarga concurrente de tickers
+    YAHOO_MAX_CONCURRENCIA = int(os.getenv("YAHOO_MAX_CONCURRENCIA", "8"))
+    YAHOO_SOLICITUDES_POR_SEGUNDO = float(os.getenv("YAHOO_SOLICITUDES_POR_SEGUNDO", "5"))
+    YAHOO_REINTENTOS = int(os.getenv("YAHOO_REINTENTOS", "3"))
+
+    # Análisis fundamental por lotes
+    GEMINI_MAX_CONCURRENCIA = int(os.getenv("GEMINI_MAX_CONCURRENCIA", "4"))
+    FUNDAMENTAL_TOKENS_POR_LOTE = int(os.getenv("FUNDAMENTAL_TOKENS_POR_LOTE", "6000"))
+
+    # Agregador de noticias
+    NEWS_TIMEOUT_PROVEEDOR = float(os.getenv("NEWS_TIMEOUT_PROVEEDOR", "5"))
+    NEWS_DEADLINE = float(os.getenv("NEWS_DEADLINE", "8"))
+    NEWS_TOP_K = int(os.getenv("NEWS_TOP_K", "8"))
+    NEWS_MAX_TOKENS = int(os.getenv("NEWS_MAX_TOKENS", "1500"))
+    NEWSAPI_BASE_URL = os.getenv("NEWSAPI_BASE_URL", "https://newsapi.org").rstrip("/")
+    GNEWS_BASE_URL = os.getenv("GNEWS_BASE_URL", "https://gnews.io").rstrip("/")
+    SENTIMIENTO_TOKENS_POR_LOTE = int(os.getenv("SENTIMIENTO_TOKENS_POR_LOTE", "6000"))
+
+    # Almacén local de series de FRED
+    FRED_MAX_CONCURRENCIA = int(os.getenv("FRED_MAX_CONCURRENCIA", "5"))
+    FRED_SOLICITUDES_POR_SEGUNDO = float(os.getenv("FRED_SOLICITUDES_POR_SEGUNDO", "2"))
+
+    # Cliente compartido de Gemini
+    GEMINI_MODELO = os.getenv("GEMINI_MODELO", "gemini-2.5-flash")
+    GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT")  # "grpc" o "rest"; vacío usa el del SDK
+
+    # Caché de respuestas de Gemini
+    GEMINI_CACHE_ACTIVA = os.getenv("GEMINI_CACHE_ACTIVA", "1") == "1"
+    GEMINI_CACHE_TTL_HORAS = float(os.getenv("GEMINI_CACHE_TTL_HORAS", "24"))
+    GEMINI_CACHE_MAX_ENTRADAS = int(os.getenv("GEMINI_CACHE_MAX_ENTRADAS", "500"))
+    GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "1") == "1"
+
+    # Registro de métricas de las llamadas a Gemini
+    METRICAS_ACTIVAS = os.getenv("METRICAS_ACTIVAS", "1") == "1"
+
+    # Historial de análisis (outputs/historial.sqlite); los .txt son opcionales
+    GUARDAR_TXT = os.getenv("GUARDAR_TXT", "1") == "1"
+
+    # Generación de imágenes con Freepik
+    FREEPIK_BASE_URL = os.getenv("FREEPIK_BASE_URL", "https://api.freepik.com").rstrip("/")
+    FREEPIK_TIMEOUT = float(os.getenv("FREEPIK_TIMEOUT", "60"))
+    FREEPIK_MAX_CONCURRENCIA = int(os.getenv("FREEPIK_MAX_CONCURRENCIA", "3"))
+    FREEPIK_REINTENTOS = int(os.getenv("FREEPIK_REINTENTOS", "3"))
+    FREEPIK_POLL_INTERVALO = float(os.getenv("FREEPIK_POLL_INTERVALO", "2"))
+    FREEPIK_POLL_TIMEOUT = float(os.getenv("FREEPIK_POLL_TIMEOUT", "120"))
+    FREEPIK_MINIATURAS = os.getenv("FREEPIK_MINIATURAS", "0") == "1"  # requiere Pillow
+
+    # Caché de imágenes de Freepik por prompt normalizado
+    FREEPIK_CACHE_ACTIVA = os.getenv("FREEPIK_CACHE_ACTIVA", "1") == "1"
+    FREEPIK_CACHE_MAX_MB = float(os.getenv("FREEPIK_CACHE_MAX_MB", "500"))
+
+    # Arranque: opciones a importar en segundo plano ("1,3" o "auto" para la última usada)
+    PRECARGAR = os.getenv("PRECARGAR", "")
+
+    # Trazas por etapa (.cache/trazas/, formato Chrome Trace) y perfil de cProfile
+    TRAZAS = os.getenv("TRAZAS", "0") == "1"
+    PERFILAR = os.getenv("PERFILAR", "0") == "1"
+
+    # Planificador de cuotas: solicitudes por minuto, tokens por minuto y cuota diaria (0 = sin límite)
+    NEWSAPI_RPM = float(os.getenv("NEWSAPI_RPM", "0"))
+    NEWSAPI_CUOTA_DIARIA = int(os.getenv("NEWSAPI_CUOTA_DIARIA", "0"))
+    GNEWS_RPM = float(os.getenv("GNEWS_RPM", "0"))
+    GNEWS_CUOTA_DIARIA = int(os.getenv("GNEWS_CUOTA_DIARIA", "0"))
+    GEMINI_RPM = float(os.getenv("GEMINI_RPM", "0"))
+    GEMINI_TPM = int(os.getenv("GEMINI_TPM", "0"))
+    GEMINI_CUOTA_DIARIA = int(os.getenv("GEMINI_CUOTA_DIARIA", "0"))
+    FREEPIK_RPM = float(os.getenv("FREEPIK_RPM", "0"))
+    FREEPIK_CUOTA_DIARIA = int(os.getenv("FREEPIK_CUOTA_DIARIA", "0"))
+    CUOTAS_REINTENTOS = int(os.getenv("CUOTAS_REINTENTOS", "5"))  # reintentos ante un 429
+    CUOTAS_ESPERA_MAX = float(os.getenv("CUOTAS_ESPERA_MAX", "60"))
+
+    # Codificación compacta de los datos en los prompts
+    PROMPT_DECIMALES = int(os.getenv("PROMPT_DECIMALES", "2"))
+    MACRO_MAX_TOKENS_DATOS = int(os.getenv("MACRO_MAX_TOKENS_DATOS", "400"))
\ No newline at end of file
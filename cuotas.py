@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import contextvars
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from rich.console import Console
+from rich.table import Table
+from config import Config
+from concurrencia import limitador_para
+from trazas import span
+
+console = Console()
+
+# Prioridades de la cola: un número menor pasa antes
+PRIORIDAD_ALTA = 0     # interacción directa del usuario
+PRIORIDAD_NORMAL = 1
+PRIORIDAD_BAJA = 2     # lotes sin interacción, precargas
+
+_prioridad = contextvars.ContextVar("prioridad_cuotas", default=PRIORIDAD_NORMAL)
+
+
+@contextmanager
+def prioridad(nivel: int):
+    """Fija la prioridad de las solicitudes hechas dentro del bloque (y en sus hilos de trabajo)."""
+    token = _prioridad.set(nivel)
+    try:
+        yield
+    finally:
+        _prioridad.reset(token)
+
+
+class CuotaAgotada(RuntimeError):
+    """Se alcanzó la cuota diaria configurada de un proveedor."""
+
+
+def limites() -> dict:
+    """
+    Límites de cada proveedor según Config: {proveedor: (solicitudes por
+    minuto, tokens por minuto, solicitudes por día)}. 0 significa sin límite.
+    """
+    return {
+        "newsapi": (Config.NEWSAPI_RPM, 0, Config.NEWSAPI_CUOTA_DIARIA),
+        "gnews": (Config.GNEWS_RPM, 0, Config.GNEWS_CUOTA_DIARIA),
+        "fred": (Config.FRED_SOLICITUDES_POR_SEGUNDO * 60, 0, 0),
+        "yahoo": (Config.YAHOO_SOLICITUDES_POR_SEGUNDO * 60, 0, 0),
+        "gemini": (Config.GEMINI_RPM, Config.GEMINI_TPM, Config.GEMINI_CUOTA_DIARIA),
+        "freepik": (Config.FREEPIK_RPM, 0, Config.FREEPIK_CUOTA_DIARIA),
+    }
+
+
+def _segundos_retry_after(valor) -> float:
+    """Interpreta una cabecera Retry-After (segundos o fecha HTTP)."""
+    if valor is None:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def espera_por_limite(resultado=None, error: Exception = None):
+    """
+    Si la respuesta o la excepción indican un límite de tasa (HTTP 429,
+    ResourceExhausted de Gemini, YFRateLimitError...), devuelve los segundos a
+    esperar (0 si el proveedor no lo indica); si no, None.
+    """
+    respuesta = resultado if error is None else getattr(error, "response", None)
+    if getattr(respuesta, "status_code", None) == 429:
+        cabeceras = getattr(respuesta, "headers", None) or {}
+        return _segundos_retry_after(cabeceras.get("Retry-After")) or 0.0
+    if error is None:
+        return None
+
+    nombre = type(error).__name__
+    if getattr(error, "code", None) == 429 or nombre in ("ResourceExhausted", "TooManyRequests", "YFRateLimitError"):
+        # Gemini informa la espera sugerida en RetryInfo.retry_delay
+        for detalle in getattr(error, "details", None) or []:
+            retraso = getattr(detalle, "retry_delay", None)
+            if retraso is not None:
+                return getattr(retraso, "seconds", 0) + getattr(retraso, "nanos", 0) / 1e9
+        return 0.0
+    if "429" in str(error) and "Too Many Requests" in str(error):
+        return 0.0
+    return None
+
+
+class PlanificadorCuotas:
+    """
+    Punto único por el que pasan las solicitudes a las APIs externas.
+
+    Cada proveedor tiene un token bucket de solicitudes por minuto (y, para
+    Gemini, otro de tokens por minuto) compartido por todos los hilos; los
+    hilos en espera salen por orden de prioridad. Un 429 no se trata como
+    error: se pausa al proveedor durante el `Retry-After` (o con backoff
+    exponencial) y se reintenta. El uso diario se guarda en SQLite para
+    respetar las cuotas entre ejecuciones.
+    """
+
+    def __init__(self, ruta: str = None):
+        self.ruta = ruta or os.path.join(Config.CACHE_DIR, "cuotas.sqlite")
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pausas = {}
+
+    def _conexion(self):
+        if self._conn is None:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta and not os.path.exists(carpeta):
+                os.makedirs(carpeta)
+            self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS uso (
+                    proveedor TEXT NOT NULL,
+                    dia TEXT NOT NULL,
+                    solicitudes INTEGER NOT NULL DEFAULT 0,
+                    tokens INTEGER NOT NULL DEFAULT 0,
+                    limitadas INTEGER NOT NULL DEFAULT 0,
+                    segundos_espera REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (proveedor, dia)
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _registrar(self, proveedor: str, solicitudes: int = 0, tokens: int = 0, limitadas: int = 0,
+                   segundos_espera: float = 0.0):
+        try:
+            with self._lock:
+                conn = self._conexion()
+                conn.execute(
+                    """INSERT INTO uso (proveedor, dia, solicitudes, tokens, limitadas, segundos_espera)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (proveedor, dia) DO UPDATE SET
+                           solicitudes = solicitudes + excluded.solicitudes,
+                           tokens = tokens + excluded.tokens,
+                           limitadas = limitadas + excluded.limitadas,
+                           segundos_espera = segundos_espera + excluded.segundos_espera""",
+                    (proveedor, datetime.now().strftime("%Y-%m-%d"), solicitudes, tokens, limitadas, segundos_espera),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            console.print(f"[yellow]No se pudo registrar el uso de {proveedor}: {e}[/yellow]")
+
+    def uso(self, proveedor: str = None, dia: str = None) -> list:
+        """Uso registrado de un día (hoy por defecto), de un proveedor o de todos."""
+        consulta = "SELECT proveedor, dia, solicitudes, tokens, limitadas, segundos_espera FROM uso WHERE dia = ?"
+        parametros = [dia or datetime.now().strftime("%Y-%m-%d")]
+        if proveedor:
+            consulta += " AND proveedor = ?"
+            parametros.append(proveedor)
+        with self._lock:
+            filas = self._conexion().execute(consulta + " ORDER BY proveedor", parametros).fetchall()
+        columnas = ("proveedor", "dia", "solicitudes", "tokens", "limitadas", "segundos_espera")
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def _limitadores(self, proveedor: str) -> tuple:
+        rpm, tpm, _ = limites()[proveedor]
+        return (
+            limitador_para(proveedor, rpm / 60),
+            limitador_para(f"{proveedor}:tokens", tpm / 60, rafaga=max(1, int(tpm))) if tpm else None,
+        )
+
+    def _pausar(self, proveedor: str, segundos: float):
+        with self._lock:
+            self._pausas[proveedor] = max(self._pausas.get(proveedor, 0), time.monotonic() + segundos)
+
+    def _pausa_restante(self, proveedor: str) -> float:
+        with self._lock:
+            return max(0.0, self._pausas.get(proveedor, 0) - time.monotonic())
+
+    def adquirir(self, proveedor: str, tokens: int = 0, prioridad: int = None, limite: float = None) -> float:
+        """
+        Bloquea hasta que el proveedor admita una solicitud más (y `tokens`, si
+        tiene límite por minuto). Devuelve los segundos esperados.
+
+        Args:
+            limite: Instante (`time.monotonic()`) tras el cual la respuesta ya no
+                sirve; si el proveedor está en pausa más allá, lanza TimeoutError.
+        """
+        _, _, diario = limites()[proveedor]
+        if diario:
+            hoy = self.uso(proveedor)
+            if hoy and hoy[0]["solicitudes"] >= diario:
+                raise CuotaAgotada(f"Se alcanzó la cuota diaria de {proveedor} ({diario} solicitudes).")
+
+        inicio = time.monotonic()
+        prioridad = _prioridad.get() if prioridad is None else prioridad
+        solicitudes, por_tokens = self._limitadores(proveedor)
+        while True:
+            pausa = self._pausa_restante(proveedor)
+            if not pausa:
+                break
+            if limite is not None and time.monotonic() + pausa > limite:
+                raise TimeoutError(f"{proveedor} está en pausa por límite de solicitudes más allá del plazo.")
+            time.sleep(pausa)
+        solicitudes.esperar(prioridad=prioridad)
+        if por_tokens and tokens:
+            por_tokens.esperar(tokens, prioridad=prioridad)
+        return time.monotonic() - inicio
+
+    def _espera_reintento(self, proveedor: str, espera: float, intento: int, limite: float = None) -> float:
+        """
+        Pausa al proveedor tras un 429 y devuelve cuánto esperar, o None si la
+        espera terminaría después de `limite` y no tiene sentido reintentar.
+        """
+        if not espera:
+            # Sin indicación del proveedor: backoff exponencial con la mitad aleatoria
+            base = min(Config.CUOTAS_ESPERA_MAX, 2 ** (intento + 1))
+            espera = base / 2 + random.uniform(0, base / 2)
+        espera = min(espera, Config.CUOTAS_ESPERA_MAX)
+        self._pausar(proveedor, espera)
+        if limite is not None and time.monotonic() + espera > limite:
+            return None
+        console.print(f"[yellow]{proveedor}: límite de solicitudes alcanzado, reintentando en {espera:.1f}s...[/yellow]")
+        return espera
+
+    def ajustar_tokens(self, proveedor: str, estimados: int, reales: int):
+        """Corrige el bucket de tokens y el uso con los tokens reales de una respuesta."""
+        _, por_tokens = self._limitadores(proveedor)
+        if por_tokens:
+            por_tokens.ajustar(reales - estimados)
+        self._registrar(proveedor, tokens=reales)
+
+    def ejecutar(self, proveedor: str, func, tokens: int = 0, prioridad: int = None, tokens_reales=None,
+                 limite: float = None):
+        """
+        Ejecuta `func()` respetando los límites del proveedor. Los 429 (como
+        respuesta o como excepción) se reintentan hasta `CUOTAS_REINTENTOS`
+        veces o mientras la espera no pase de `limite`; cualquier otro error se
+        propaga sin reintentar.
+
+        Args:
+            tokens: Tokens estimados de la solicitud (límite por minuto de Gemini).
+            tokens_reales: Función opcional `resultado -> tokens` para corregir la estimación.
+            limite: Instante (`time.monotonic()`) tras el cual el llamador ya no espera la respuesta.
+        """
+        for intento in range(Config.CUOTAS_REINTENTOS + 1):
+            with span("cuota.espera", proveedor=proveedor) as s:
+                esperado = self.adquirir(proveedor, tokens, prioridad, limite)
+                s.agregar(segundos=round(esperado, 3))
+            error = None
+            try:
+                resultado = func()
+            except Exception as e:
+                espera, error = espera_por_limite(error=e), e
+                if espera is None:
+                    self._registrar(proveedor, 1, segundos_espera=esperado)
+                    raise
+            else:
+                espera = espera_por_limite(resultado)
+                if espera is None:
+                    self._registrar(proveedor, 1, segundos_espera=esperado)
+                    if tokens_reales is not None:
+                        self.ajustar_tokens(proveedor, tokens, tokens_reales(resultado))
+                    return resultado
+            self._registrar(proveedor, 1, limitadas=1, segundos_espera=esperado)
+            if intento == Config.CUOTAS_REINTENTOS or self._espera_reintento(proveedor, espera, intento, limite) is None:
+                # Sin más reintentos: el 429 llega al llamador como error o como respuesta
+                if error is not None:
+                    raise error
+                return resultado
+
+    async def ejecutar_async(self, proveedor: str, corrutina, tokens: int = 0, prioridad: int = None,
+                             tokens_reales=None):
+        """Versión asíncrona de `ejecutar`: `corrutina()` crea la corrutina a esperar."""
+        loop = asyncio.get_running_loop()
+        prioridad = _prioridad.get() if prioridad is None else prioridad
+        for intento in range(Config.CUOTAS_REINTENTOS + 1):
+            # La espera en los buckets es bloqueante: se hace fuera del event loop
+            esperado = await loop.run_in_executor(None, self.adquirir, proveedor, tokens, prioridad)
+            try:
+                resultado = await corrutina()
+            except Exception as e:
+                espera = espera_por_limite(error=e)
+                if espera is None or intento == Config.CUOTAS_REINTENTOS:
+                    self._registrar(proveedor, 1, limitadas=int(espera is not None), segundos_espera=esperado)
+                    raise
+            else:
+                self._registrar(proveedor, 1, segundos_espera=esperado)
+                if tokens_reales is not None:
+                    self.ajustar_tokens(proveedor, tokens, tokens_reales(resultado))
+                return resultado
+            self._registrar(proveedor, 1, limitadas=1, segundos_espera=esperado)
+            await asyncio.sleep(self._espera_reintento(proveedor, espera, intento))
+
+    def mostrar_uso(self, dia: str = None):
+        """Tabla con el uso del día de cada proveedor frente a su cuota diaria."""
+        filas = self.uso(dia=dia)
+        if not filas:
+            console.print("[yellow]No hay uso registrado para ese día.[/yellow]")
+            return
+        tabla = Table(title=f"Uso de APIs externas ({filas[0]['dia']})")
+        for columna in ("Proveedor", "Solicitudes", "Cuota diaria", "Tokens", "Limitadas (429)", "Espera (s)"):
+            tabla.add_column(columna)
+        configurados = limites()
+        for f in filas:
+            diario = configurados.get(f["proveedor"], (0, 0, 0))[2]
+            tabla.add_row(
+                f["proveedor"], str(f["solicitudes"]), str(diario or "-"), str(f["tokens"]),
+                str(f["limitadas"]), f"{f['segundos_espera']:.1f}",
+            )
+        console.print(tabla)
+
+
+# Planificador compartido por todos los módulos
+planificador = PlanificadorCuotas()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Uso diario de las APIs externas.")
+    parser.add_argument("--dia", help="Día a consultar (YYYY-MM-DD); por defecto, hoy.")
+    args = parser.parse_args(argv)
+    planificador.mostrar_uso(args.dia)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from datetime import timedelta
+import pandas as pd
+import pandas_datareader.data as web
+from rich.console import Console
+from concurrencia import ejecutar_concurrente
+from cuotas import planificador, CuotaAgotada
+from config import Config
+from trazas import span
+
+console = Console()
+
+# Si una serie se actualizó hace menos de esto, no se consulta a FRED
+FRED_MIN_SEGUNDOS_ENTRE_ACTUALIZACIONES = 12 * 3600
+
+
+class FredStore:
+    """
+    Almacén local de series de FRED: un archivo Parquet por serie más un
+    pequeño JSON con la última observación y la hora de la última consulta.
+    Cada ejecución sólo descarga las observaciones posteriores a la última
+    guardada y las agrega al archivo.
+    """
+
+    def __init__(self, carpeta: str = None):
+        self.carpeta = carpeta or os.path.join(Config.CACHE_DIR, "fred")
+
+    def _ruta(self, symbol: str, extension: str) -> str:
+        return os.path.join(self.carpeta, f"{symbol}.{extension}")
+
+    def leer(self, symbol: str):
+        """Devuelve la serie guardada (DataFrame de una columna) o None."""
+        ruta = self._ruta(symbol, "parquet")
+        if not os.path.exists(ruta):
+            return None
+        return pd.read_parquet(ruta)
+
+    def metadatos(self, symbol: str) -> dict:
+        ruta = self._ruta(symbol, "json")
+        if not os.path.exists(ruta):
+            return {}
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def guardar(self, symbol: str, df):
+        """Escribe la serie completa y actualiza sus metadatos."""
+        if not os.path.exists(self.carpeta):
+            os.makedirs(self.carpeta)
+        df.to_parquet(self._ruta(symbol, "parquet"))
+        meta = {
+            "ultima_observacion": df.index.max().strftime("%Y-%m-%d") if not df.empty else None,
+            "consultado": time.time(),
+        }
+        with open(self._ruta(symbol, "json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _marcar_consultado(self, symbol: str):
+        """Registra una consulta fallida para no reintentarla en cada ejecución."""
+        meta = self.metadatos(symbol)
+        meta["consultado"] = time.time()
+        with open(self._ruta(symbol, "json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def actualizar(self, symbol: str, start_date, end_date, fred_api_key: str, forzar: bool = False):
+        """
+        Devuelve la serie `symbol` entre `start_date` y `end_date`, descargando de
+        FRED sólo el tramo que falta en el almacén local.
+        """
+        guardado = self.leer(symbol)
+        meta = self.metadatos(symbol)
+        reciente = time.time() - meta.get("consultado", 0) < FRED_MIN_SEGUNDOS_ENTRE_ACTUALIZACIONES
+
+        if guardado is None or guardado.empty or guardado.index.min() > pd.Timestamp(start_date) + timedelta(days=31):
+            # Sin datos (o el rango pedido empieza antes): descarga completa
+            guardado = self._descargar(symbol, start_date, end_date, fred_api_key)
+            self.guardar(symbol, guardado)
+        elif forzar or not reciente:
+            desde = guardado.index.max() + timedelta(days=1)
+            try:
+                if desde <= pd.Timestamp(end_date):
+                    delta = self._descargar(symbol, desde, end_date, fred_api_key)
+                    guardado = pd.concat([guardado, delta])
+                    guardado = guardado[~guardado.index.duplicated(keep="last")].sort_index()
+                self.guardar(symbol, guardado)
+            except (OSError, ValueError, KeyError, CuotaAgotada) as e:
+                # Sin conexión (RemoteDataError y los errores de requests son OSError),
+                # sin observaciones nuevas o sin cuota: se usa la copia local
+                console.print(f"[yellow]FRED: no se pudo actualizar {symbol} ({e}); se usa la copia local.[/yellow]")
+                self._marcar_consultado(symbol)
+
+        return guardado.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+
+    def _descargar(self, symbol: str, start_date, end_date, fred_api_key: str):
+        with span("fred.descarga", serie=symbol) as s:
+            df = planificador.ejecutar(
+                "fred", lambda: web.DataReader(symbol, 'fred', start_date, end_date, api_key=fred_api_key)
+            )
+            s.agregar(filas=len(df))
+        df.columns = [symbol]
+        return df
+
+    def cargar(self, symbols, start_date, end_date, fred_api_key: str, max_concurrencia: int = None, al_completar=None):
+        """
+        Actualiza varias series en paralelo.
+
+        Returns:
+            tuple: (series, errores), diccionarios indexados por símbolo.
+        """
+        return ejecutar_concurrente(
+            symbols,
+            lambda symbol: self.actualizar(symbol, start_date, end_date, fred_api_key),
+            max_workers=max_concurrencia or Config.FRED_MAX_CONCURRENCIA,
+            intentos=2,
+            al_completar=al_completar,
+        )
+
+
+# Instancia compartida
+fred_store = FredStore()
@@ -1,9 +1,211 @@
+import json
+import threading
+import time
 import google.generativeai as genai
+from google.generativeai.types import HarmBlockThreshold, HarmCategory
 from config import Config
+from cache_respuestas import cache_respuestas, clave_respuesta
+from metricas import metricas
+from trazas import registrar_span
+from cuotas import planificador
+from utils import estimar_tokens
+
+# Modelo usado por cada opción; todas usan el modelo por defecto salvo que se
+# indique otro aquí.
+MODELOS_POR_OPCION = {
+    "fundamental": Config.GEMINI_MODELO,
+    "sentimiento": Config.GEMINI_MODELO,
+    "macro": Config.GEMINI_MODELO,
+    "costo_tokens": Config.GEMINI_MODELO,
+}
+
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+}
+
+_api_key_configurada = None
+_modelos = {}
+_lock = threading.Lock()
+
+def configurar(api_key: str = None):
+    """Configura el SDK de Gemini una sola vez (o de nuevo si cambia la clave)."""
+    global _api_key_configurada
+    api_key = api_key or _api_key_configurada or Config.GEMINI_API_KEY
+    with _lock:
+        if api_key != _api_key_configurada:
+            opciones = {"api_key": api_key}
+            if Config.GEMINI_TRANSPORT:
+                opciones["transport"] = Config.GEMINI_TRANSPORT
+            genai.configure(**opciones)
+            _api_key_configurada = api_key
+            _modelos.clear()
+
+def nombre_modelo(opcion: str = None, modelo: str = None) -> str:
+    """Resuelve el nombre del modelo a usar para una opción."""
+    return modelo or MODELOS_POR_OPCION.get(opcion, Config.GEMINI_MODELO)
+
+def obtener_modelo(opcion: str = None, modelo: str = None, generation_config: dict = None):
+    """Devuelve un `GenerativeModel` reutilizable para el modelo y la configuración dados."""
+    configurar()
+    nombre = nombre_modelo(opcion, modelo)
+    clave = (nombre, json.dumps(generation_config or {}, sort_keys=True))
+    with _lock:
+        if clave not in _modelos:
+            _modelos[clave] = genai.GenerativeModel(
+                nombre, generation_config=generation_config, safety_settings=SAFETY_SETTINGS
+            )
+        return _modelos[clave]
+
+def _tokens(response) -> tuple:
+    """(tokens de entrada, tokens de salida) según `usage_metadata`."""
+    uso = getattr(response, "usage_metadata", None)
+    return (getattr(uso, "prompt_token_count", 0) or 0, getattr(uso, "candidates_token_count", 0) or 0)
+
+def _registrar(opcion: str, nombre: str, modo: str, inicio: float, response=None, desde_cache: bool = False,
+               ttft: float = None, error: str = None):
+    """Guarda en el registro de métricas (y en la traza en curso) los tokens y la latencia de una llamada."""
+    tokens_entrada, tokens_salida = _tokens(response)
+    metricas.registrar(
+        opcion, nombre, modo, tokens_entrada, tokens_salida, segundos=time.perf_counter() - inicio,
+        ttft=ttft, desde_cache=desde_cache, error=error,
+    )
+    registrar_span(
+        f"gemini.{modo}", inicio, opcion=opcion, modelo=nombre, tokens_entrada=tokens_entrada,
+        tokens_salida=tokens_salida, ttft=ttft, desde_cache=desde_cache, error=error,
+    )
+
+def _guardar_en_cache(clave: str, nombre: str, response):
+    try:
+        texto = response.text
+    except (ValueError, AttributeError):
+        # Respuestas bloqueadas o sin texto no se cachean
+        return
+    cache_respuestas.guardar(clave, nombre, texto, *_tokens(response))
+
+def generar(prompt: str, opcion: str = None, modelo: str = None, generation_config: dict = None,
+            usar_cache: bool = True):
+    """
+    Envía el prompt a Gemini con el modelo compartido y devuelve la respuesta completa.
+    Si el mismo prompt (con el mismo modelo y configuración) ya se respondió
+    dentro del TTL, devuelve la respuesta guardada; `usar_cache=False` la omite.
+    """
+    inicio = time.perf_counter()
+    nombre = nombre_modelo(opcion, modelo)
+    clave = clave_respuesta(nombre, prompt, generation_config)
+    if usar_cache and Config.GEMINI_CACHE_ACTIVA:
+        cacheada = cache_respuestas.obtener(clave)
+        if cacheada is not None:
+            _registrar(opcion, nombre, "sync", inicio, cacheada, desde_cache=True)
+            return cacheada
+    try:
+        modelo_gemini = obtener_modelo(opcion, modelo, generation_config)
+        response = planificador.ejecutar(
+            "gemini", lambda: modelo_gemini.generate_content(prompt),
+            tokens=estimar_tokens(prompt), tokens_reales=lambda r: sum(_tokens(r)),
+        )
+    except Exception as e:
+        _registrar(opcion, nombre, "sync", inicio, error=str(e))
+        raise
+    _registrar(opcion, nombre, "sync", inicio, response)
+    if Config.GEMINI_CACHE_ACTIVA:
+        _guardar_en_cache(clave, nombre, response)
+    return response
+
+async def generar_async(prompt: str, opcion: str = None, modelo: str = None, generation_config: dict = None,
+                        usar_cache: bool = True):
+    """Versión asíncrona de `generar`."""
+    inicio = time.perf_counter()
+    nombre = nombre_modelo(opcion, modelo)
+    clave = clave_respuesta(nombre, prompt, generation_config)
+    if usar_cache and Config.GEMINI_CACHE_ACTIVA:
+        cacheada = cache_respuestas.obtener(clave)
+        if cacheada is not None:
+            _registrar(opcion, nombre, "async", inicio, cacheada, desde_cache=True)
+            return cacheada
+    try:
+        modelo_gemini = obtener_modelo(opcion, modelo, generation_config)
+        response = await planificador.ejecutar_async(
+            "gemini", lambda: modelo_gemini.generate_content_async(prompt),
+            tokens=estimar_tokens(prompt), tokens_reales=lambda r: sum(_tokens(r)),
+        )
+    except Exception as e:
+        _registrar(opcion, nombre, "async", inicio, error=str(e))
+        raise
+    _registrar(opcion, nombre, "async", inicio, response)
+    if Config.GEMINI_CACHE_ACTIVA:
+        _guardar_en_cache(clave, nombre, response)
+    return response
+
+class RespuestaStream:
+    """
+    Respuesta de Gemini en modo streaming. Al iterarla devuelve los fragmentos
+    de texto a medida que llegan; registra el tiempo hasta el primer fragmento
+    (`ttft`, en segundos) y al terminar expone `text` y `usage_metadata`.
+    """
+
+    def __init__(self, prompt: str, opcion: str = None, modelo: str = None,
+                 generation_config: dict = None, usar_cache: bool = True):
+        self.prompt = prompt
+        self.opcion = opcion
+        self.modelo = nombre_modelo(opcion, modelo)
+        self.generation_config = generation_config
+        self.usar_cache = usar_cache
+        self.ttft = None
+        self.text = ""
+        self.usage_metadata = None
+        self.desde_cache = False
+
+    def __iter__(self):
+        inicio = time.perf_counter()
+        clave = clave_respuesta(self.modelo, self.prompt, self.generation_config)
+        if self.usar_cache and Config.GEMINI_CACHE_ACTIVA:
+            cacheada = cache_respuestas.obtener(clave)
+            if cacheada is not None:
+                self.desde_cache = True
+                self.ttft = time.perf_counter() - inicio
+                self.text = cacheada.text
+                self.usage_metadata = cacheada.usage_metadata
+                _registrar(self.opcion, self.modelo, "stream", inicio, cacheada, desde_cache=True, ttft=self.ttft)
+                yield cacheada.text
+                return
+
+        partes = []
+        try:
+            modelo = obtener_modelo(self.opcion, self.modelo, self.generation_config)
+            estimados = estimar_tokens(self.prompt)
+            response = planificador.ejecutar(
+                "gemini", lambda: modelo.generate_content(self.prompt, stream=True), tokens=estimados
+            )
+            for chunk in response:
+                try:
+                    texto = chunk.text
+                except ValueError:
+                    # Fragmentos sin texto (p. ej. sólo metadatos)
+                    continue
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - inicio
+                partes.append(texto)
+                yield texto
+        except Exception as e:
+            _registrar(self.opcion, self.modelo, "stream", inicio, ttft=self.ttft, error=str(e))
+            raise
+
+        self.text = "".join(partes)
+        self.usage_metadata = getattr(response, "usage_metadata", None)
+        planificador.ajustar_tokens("gemini", estimados, sum(_tokens(response)))
+        _registrar(self.opcion, self.modelo, "stream", inicio, response, ttft=self.ttft)
+        if Config.GEMINI_CACHE_ACTIVA:
+            _guardar_en_cache(clave, self.modelo, response)
+
+def generar_stream(prompt: str, opcion: str = None, modelo: str = None, generation_config: dict = None,
+                   usar_cache: bool = True) -> RespuestaStream:
+    """Como `generar`, pero devuelve una `RespuestaStream` que se consume por fragmentos."""
+    return RespuestaStream(prompt, opcion, modelo, generation_config, usar_cache)
 
 def ask_gemini_with_prompt(prompt: str) -> str:
     """Envía el prompt a Gemini y devuelve el texto de respuesta."""
-    genai.configure(api_key=Config.GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    resp = model.generate_content(prompt)
+    resp = generar(prompt)
     return getattr(resp, "text", "") or ""
@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+COLUMNAS = ("id", "fecha", "opcion", "entidad", "modelo", "prompt_hash", "tokens_entrada",
+            "tokens_salida", "archivo")
+
+
+class HistorialAnalisis:
+    """
+    Almacén estructurado (SQLite) de los análisis generados. Cada registro
+    guarda opción, entidad (empresa, universo, etc.), modelo, hash del prompt,
+    tokens y fecha, con índices para las consultas habituales y búsqueda de
+    texto completo (FTS5) sobre el prompt y la respuesta cuando está disponible.
+    """
+
+    def __init__(self, ruta: str = None):
+        self.ruta = ruta or os.path.join("outputs", "historial.sqlite")
+        self.fts = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        if self._conn is None:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta and not os.path.exists(carpeta):
+                os.makedirs(carpeta)
+            self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conn.executescript(
+                """CREATE TABLE IF NOT EXISTS analisis (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha REAL NOT NULL,
+                    opcion TEXT NOT NULL,
+                    entidad TEXT,
+                    modelo TEXT,
+                    prompt_hash TEXT NOT NULL,
+                    tokens_entrada INTEGER NOT NULL,
+                    tokens_salida INTEGER NOT NULL,
+                    archivo TEXT,
+                    prompt TEXT NOT NULL,
+                    respuesta TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_analisis_opcion_fecha ON analisis (opcion, fecha);
+                CREATE INDEX IF NOT EXISTS idx_analisis_entidad_fecha ON analisis (entidad, fecha);
+                CREATE INDEX IF NOT EXISTS idx_analisis_prompt_hash ON analisis (prompt_hash);"""
+            )
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS analisis_fts USING fts5("
+                    "prompt, respuesta, content='analisis', content_rowid='id')"
+                )
+                self.fts = True
+            except sqlite3.OperationalError:
+                # SQLite compilado sin FTS5: la búsqueda de texto usa LIKE
+                self.fts = False
+            self._conn.commit()
+        return self._conn
+
+    def guardar(self, opcion: str, prompt: str, respuesta: str, entidad: str = None, modelo: str = None,
+                tokens_entrada: int = 0, tokens_salida: int = 0, archivo: str = None) -> int:
+        """Registra un análisis y devuelve su id."""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            conn = self._conexion()
+            cursor = conn.execute(
+                """INSERT INTO analisis (fecha, opcion, entidad, modelo, prompt_hash, tokens_entrada,
+                                         tokens_salida, archivo, prompt, respuesta)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (time.time(), opcion, entidad, modelo, prompt_hash, tokens_entrada or 0,
+                 tokens_salida or 0, archivo, prompt, respuesta),
+            )
+            if self.fts:
+                conn.execute(
+                    "INSERT INTO analisis_fts (rowid, prompt, respuesta) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, prompt, respuesta),
+                )
+            conn.commit()
+            return cursor.lastrowid
+
+    def buscar(self, opcion: str = None, entidad: str = None, desde: str = None, hasta: str = None,
+               texto: str = None, limite: int = 20, con_contenido: bool = False) -> list:
+        """
+        Busca análisis, del más reciente al más antiguo.
+
+        Args:
+            opcion (str): Opción ('fundamental', 'sentimiento', 'macro', ...).
+            entidad (str): Empresa o entidad analizada (sin distinguir mayúsculas).
+            desde, hasta (str): Fechas 'YYYY-MM-DD' (ambas inclusive).
+            texto (str): Búsqueda de texto completo en prompt y respuesta.
+            limite (int): Máximo de resultados.
+            con_contenido (bool): Incluye el prompt y la respuesta.
+
+        Returns:
+            list: Diccionarios con los metadatos (y el contenido si se pidió).
+        """
+        columnas = [f"a.{c}" for c in COLUMNAS] + (["a.prompt", "a.respuesta"] if con_contenido else [])
+        condiciones, parametros = [], []
+        if opcion:
+            condiciones.append("a.opcion = ?")
+            parametros.append(opcion)
+        if entidad:
+            condiciones.append("a.entidad = ? COLLATE NOCASE")
+            parametros.append(entidad)
+        if desde:
+            condiciones.append("a.fecha >= ?")
+            parametros.append(datetime.strptime(desde, "%Y-%m-%d").timestamp())
+        if hasta:
+            condiciones.append("a.fecha < ?")
+            parametros.append(datetime.strptime(hasta, "%Y-%m-%d").timestamp() + 86400)
+
+        with self._lock:
+            conn = self._conexion()
+            origen = "analisis a"
+            if texto and self.fts:
+                origen = "analisis a JOIN analisis_fts f ON f.rowid = a.id"
+                condiciones.append("analisis_fts MATCH ?")
+                parametros.append(texto)
+            elif texto:
+                condiciones.append("(a.prompt LIKE ? OR a.respuesta LIKE ?)")
+                parametros += [f"%{texto}%"] * 2
+            where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+            filas = conn.execute(
+                f"SELECT {', '.join(columnas)} FROM {origen} {where} ORDER BY a.fecha DESC LIMIT ?",
+                (*parametros, limite),
+            ).fetchall()
+        nombres = list(COLUMNAS) + (["prompt", "respuesta"] if con_contenido else [])
+        return [dict(zip(nombres, fila)) for fila in filas]
+
+    def por_archivo(self) -> dict:
+        """{ruta del .txt: (opción, modelo)} de los análisis que también se guardaron como texto."""
+        with self._lock:
+            filas = self._conexion().execute(
+                "SELECT archivo, opcion, modelo FROM analisis WHERE archivo IS NOT NULL"
+            ).fetchall()
+        return {os.path.normpath(archivo): (opcion, modelo) for archivo, opcion, modelo in filas}
+
+    def ultimo(self, opcion: str, entidad: str = None):
+        """Devuelve el análisis más reciente (con contenido) de una opción, o None."""
+        resultados = self.buscar(opcion=opcion, entidad=entidad, limite=1, con_contenido=True)
+        return resultados[0] if resultados else None
+
+
+# Instancia compartida usada por utils.guardar_conversacion
+historial = HistorialAnalisis()
+
+
+def main(argv=None):
+    """python historial.py [--opcion macro] [--entidad Apple] [--desde 2025-06-01] [--texto inflación] [--ultimo]"""
+    parser = argparse.ArgumentParser(description="Consulta el historial de análisis generados.")
+    parser.add_argument("--opcion", help="fundamental, sentimiento, macro, informe...")
+    parser.add_argument("--entidad", help="Empresa o entidad analizada.")
+    parser.add_argument("--desde", help="Fecha inicial (YYYY-MM-DD).")
+    parser.add_argument("--hasta", help="Fecha final (YYYY-MM-DD).")
+    parser.add_argument("--texto", help="Búsqueda de texto completo en prompt y respuesta.")
+    parser.add_argument("--limite", type=int, default=20)
+    parser.add_argument("--ultimo", action="store_true", help="Muestra la respuesta del análisis más reciente.")
+    args = parser.parse_args(argv)
+
+    resultados = historial.buscar(args.opcion, args.entidad, args.desde, args.hasta, args.texto,
+                                  1 if args.ultimo else args.limite, con_contenido=args.ultimo)
+    if not resultados:
+        console.print("[yellow]No hay análisis que coincidan con la búsqueda.[/yellow]")
+        return 1
+    if args.ultimo:
+        r = resultados[0]
+        fecha = datetime.fromtimestamp(r["fecha"]).strftime("%Y-%m-%d %H:%M:%S")
+        console.print(f"[bold cyan]{r['opcion']} {r['entidad'] or ''} ({fecha})[/bold cyan]")
+        console.print(r["respuesta"])
+        return 0
+
+    tabla = Table(title="Historial de análisis")
+    for columna in ("Id", "Fecha", "Opción", "Entidad", "Modelo", "Tokens entrada", "Tokens salida", "Archivo"):
+        tabla.add_column(columna)
+    for r in resultados:
+        tabla.add_row(
+            str(r["id"]), datetime.fromtimestamp(r["fecha"]).strftime("%Y-%m-%d %H:%M"), r["opcion"],
+            r["entidad"] or "", r["modelo"] or "", str(r["tokens_entrada"]), str(r["tokens_salida"]),
+            r["archivo"] or "",
+        )
+    console.print(tabla)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,20 +1,135 @@
+import argparse
+import importlib
+import json
 import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
 from rich.console import Console
 from rich.table import Table
 
 # Importa la clase de configuración
 from config import Config
 
-# Importa las funciones de cada módulo
-from opcion1_fundamental import analizar_inversion
-from opcion2_sentimiento import analizar_sentimiento
-from opcion3_macro import analizar_macro
-from opcion4_imagen_FreepikAI import generar_imagen_freepik
-from opcion5_costo_tokens import analizar_costo_tokens
+# Los módulos de cada opción (yfinance, pandas, Gemini, requests...) se importan
+# sólo cuando se elige la opción; así el menú aparece de inmediato.
+MODULOS_POR_OPCION = {
+    "1": "opcion1_fundamental",
+    "2": "opcion2_sentimiento",
+    "3": "opcion3_macro",
+    "4": "opcion4_imagen_FreepikAI",
+    "5": "opcion5_costo_tokens",
+    "6": "orquestador",
+}
+
+RUTA_ULTIMA_OPCION = os.path.join(Config.CACHE_DIR, "ultima_opcion.txt")
+RUTA_TIEMPOS = os.path.join(Config.CACHE_DIR, "tiempos_arranque.jsonl")
 
 # Configura la consola para una visualización mejorada
 console = Console()
 
+_tiempos_importacion = {}
+
+def cargar_opcion(opcion: str):
+    """Importa (una sola vez) el módulo de una opción y registra cuánto tardó."""
+    nombre = MODULOS_POR_OPCION[opcion]
+    ya_cargado = nombre in sys.modules
+    inicio = time.perf_counter()
+    # Siempre se pasa por import_module: si la precarga todavía está importando
+    # el módulo, espera a que termine en lugar de devolverlo a medio inicializar
+    modulo = importlib.import_module(nombre)
+    if not ya_cargado:
+        _tiempos_importacion.setdefault(nombre, time.perf_counter() - inicio)
+    return modulo
+
+def precargar(opciones) -> threading.Thread:
+    """Importa en segundo plano los módulos de las opciones indicadas."""
+    def tarea():
+        for opcion in opciones:
+            try:
+                cargar_opcion(opcion)
+            except Exception:
+                # El error se mostrará cuando el usuario elija la opción
+                pass
+
+    hilo = threading.Thread(target=tarea, name="precarga", daemon=True)
+    hilo.start()
+    return hilo
+
+def _opciones_a_precargar() -> list:
+    """Opciones de `PRECARGAR` ("1,3") o, con "auto", la última usada."""
+    valor = Config.PRECARGAR.strip().lower()
+    if valor == "auto":
+        if not os.path.exists(RUTA_ULTIMA_OPCION):
+            return []
+        with open(RUTA_ULTIMA_OPCION, "r", encoding="utf-8") as f:
+            valor = f.read().strip()
+    return [o.strip() for o in valor.split(",") if o.strip() in MODULOS_POR_OPCION]
+
+def _recordar_opcion(opcion: str):
+    try:
+        if not os.path.exists(Config.CACHE_DIR):
+            os.makedirs(Config.CACHE_DIR)
+        with open(RUTA_ULTIMA_OPCION, "w", encoding="utf-8") as f:
+            f.write(opcion)
+    except OSError:
+        pass
+
+def _tiempo_importacion(modulo: str) -> tuple:
+    """
+    Importa `modulo` en un intérprete nuevo con `-X importtime`. Devuelve
+    (segundos totales, [(paquete, segundos acumulados)] de mayor a menor).
+    """
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.strip().splitlines()[-1])
+    total, paquetes = 0.0, {}
+    for linea in resultado.stderr.splitlines():
+        coincidencia = re.match(r"import time:\s+\d+ \|\s+(\d+) \| *(\S+)", linea)
+        if not coincidencia:
+            continue
+        acumulado, nombre = int(coincidencia.group(1)) / 1e6, coincidencia.group(2)
+        if nombre == modulo:
+            total = acumulado
+        elif "." not in nombre:
+            paquetes[nombre] = acumulado
+    return total, sorted(paquetes.items(), key=lambda p: p[1], reverse=True)
+
+def medir_arranque(detalle: int = 5) -> dict:
+    """
+    Mide el tiempo de importación del menú y de cada opción (cada uno en un
+    proceso nuevo), muestra los paquetes más lentos y agrega el resultado a
+    `.cache/tiempos_arranque.jsonl` para seguir su evolución.
+    """
+    tabla = Table(title="Tiempo de importación")
+    tabla.add_column("Módulo", style="bold")
+    tabla.add_column("Segundos")
+    tabla.add_column(f"Paquetes más lentos (top {detalle})")
+
+    registro = {"fecha": datetime.now().isoformat(timespec="seconds"), "modulos": {}}
+    for modulo in ["main"] + list(MODULOS_POR_OPCION.values()):
+        try:
+            total, paquetes = _tiempo_importacion(modulo)
+        except RuntimeError as e:
+            tabla.add_row(modulo, "-", f"[red]{e}[/red]")
+            continue
+        registro["modulos"][modulo] = round(total, 4)
+        tabla.add_row(modulo, f"{total:.3f}", ", ".join(f"{n} {s:.2f}s" for n, s in paquetes[:detalle]))
+    console.print(tabla)
+
+    if not os.path.exists(Config.CACHE_DIR):
+        os.makedirs(Config.CACHE_DIR)
+    with open(RUTA_TIEMPOS, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro) + "\n")
+    console.print(f"[dim]Resultados agregados a {RUTA_TIEMPOS}[/dim]")
+    return registro
+
 def mostrar_menu():
     """Muestra el menú de opciones al usuario."""
     console.print("\n[bold cyan]Bienvenido al Asistente Unificado de IA[/bold cyan]")
@@ -27,46 +142,103 @@ def mostrar_menu():
     table.add_row("3", "Análisis Macroeconómico y de Riesgos")
     table.add_row("4", "Generación Visual con IA ")
     table.add_row("5", "Analizar Costo de Tokens de Gemini")
-    table.add_row("6", "Salir")
+    table.add_row("6", "Informe Completo (opciones 1, 2 y 3 en paralelo)")
+    table.add_row("7", "Salir")
 
     console.print(table)
 
-def main():
+def main(argv=None):
     """Función principal que maneja el flujo del programa."""
+    parser = argparse.ArgumentParser(description="Asistente Unificado de IA.")
+    parser.add_argument("--tiempos", action="store_true", help="Mide el tiempo de importación de cada opción y sale.")
+    parser.add_argument("--precargar", help="Opciones a importar en segundo plano (ej. 1,3 o auto).")
+    args = parser.parse_args(argv)
+
+    if args.tiempos:
+        medir_arranque()
+        return
+
+    if args.precargar is not None:
+        Config.PRECARGAR = args.precargar
+    opciones = _opciones_a_precargar()
+    if opciones:
+        precargar(opciones)
+
+    # Las conversaciones guardadas recientemente sirven como caché de respuestas
+    # (se cargan en segundo plano para no demorar el menú)
+    cache_respuestas = None
+    if Config.GEMINI_CACHE_ACTIVA:
+        from cache_respuestas import cache_respuestas
+        threading.Thread(
+            target=cache_respuestas.sembrar_desde_outputs, args=(Config.GEMINI_MODELO,), daemon=True
+        ).start()
+
     while True:
         mostrar_menu()
-        eleccion = console.input("[bold yellow]Ingresa tu opción:[/bold yellow] ")
+        eleccion = console.input("[bold yellow]Ingresa tu opción:[/bold yellow] ").strip()
+        if eleccion in MODULOS_POR_OPCION:
+            _recordar_opcion(eleccion)
 
         if eleccion == '1':
             console.print("\n[bold green]Iniciando Análisis Fundamental...[/bold green]")
+            ruta = console.input("Archivo de tickers (.txt/.csv) o Enter para Microsoft, Apple y Google: ").strip()
+            opcion1 = cargar_opcion("1")
+            empresas = None
+            if ruta:
+                try:
+                    empresas = opcion1.cargar_universo(ruta)
+                except OSError as e:
+                    console.print(f"[red]No se pudo leer el archivo de tickers: {e}[/red]")
+                    continue
             # Pasa la clave de Gemini desde la clase Config
-            analizar_inversion(gemini_api_key=Config.GEMINI_API_KEY)
+            opcion1.analizar_inversion(gemini_api_key=Config.GEMINI_API_KEY, empresas=empresas)
         elif eleccion == '2':
             console.print("\n[bold green]Iniciando Análisis de Sentimiento...[/bold green]")
-            empresa = console.input("Ingresa el nombre de la empresa tecnológica (ej. Apple, Microsoft): ")
-            # Pasa las claves de Gemini y NewsAPI desde la clase Config
-            analizar_sentimiento(
-                empresa,
-                gemini_api_key=Config.GEMINI_API_KEY,
-                newsapi_key=Config.NEWSAPI_API_KEY
-            )
+            entrada = console.input("Ingresa el nombre de la empresa tecnológica (ej. Apple) o varias separadas por comas: ")
+            opcion2 = cargar_opcion("2")
+            empresas = [e.strip() for e in entrada.split(",") if e.strip()]
+            # Las claves de NewsAPI y GNews se leen desde la clase Config
+            if len(empresas) > 1:
+                opcion2.analizar_sentimiento_lote(empresas, gemini_api_key=Config.GEMINI_API_KEY)
+            else:
+                opcion2.analizar_sentimiento(entrada.strip(), gemini_api_key=Config.GEMINI_API_KEY)
         elif eleccion == '3':
             console.print("\n[bold green]Iniciando Análisis Macroeconómico...[/bold green]")
-            analizar_macro(
+            cargar_opcion("3").analizar_macro(
                 fred_api_key=Config.FRED_API_KEY,
                 gemini_api_key=Config.GEMINI_API_KEY
             )
         elif eleccion == '4':
             console.print("\n[bold green]Iniciando Generación de Imágenes con Freepik AI...[/bold green]")
-            prompt = console.input("Ingresa una descripción para la imagen: ")
-            generar_imagen_freepik(
-                prompt,
-                freepik_api_key=Config.FREEPIK_API_KEY
-            )
+            prompt = console.input("Ingresa una descripción para la imagen (varias separadas por '|'): ")
+            opcion4 = cargar_opcion("4")
+            if "|" in prompt:
+                opcion4.generar_imagenes_lote(prompt.split("|"), freepik_api_key=Config.FREEPIK_API_KEY)
+            else:
+                opcion4.generar_imagen_freepik(
+                    prompt,
+                    freepik_api_key=Config.FREEPIK_API_KEY
+                )
         elif eleccion == '5':
             console.print("\n[bold green]Iniciando Análisis de Costo de Tokens...[/bold green]")
-            analizar_costo_tokens()
-        elif eleccion == '6' or eleccion == '0':
+            cargar_opcion("5").analizar_costo_tokens()
+        elif eleccion == '6':
+            console.print("\n[bold green]Iniciando Informe Completo...[/bold green]")
+            empresa = console.input("Empresa para el análisis de sentimiento (ej. Apple): ").strip() or "Apple"
+            cargar_opcion("6").generar_informe_completo(empresa, gemini_api_key=Config.GEMINI_API_KEY)
+        elif eleccion == '7' or eleccion == '0':
+            if cache_respuestas is not None:
+                stats = cache_respuestas.estadisticas()
+                if stats["hits"] or stats["misses"]:
+                    console.print(
+                        f"[dim]Caché Gemini: {stats['hits']} aciertos, {stats['misses']} fallos, "
+                        f"{stats['tokens_ahorrados']} tokens ahorrados.[/dim]"
+                    )
+            if _tiempos_importacion:
+                console.print(
+                    "[dim]Tiempo de carga: "
+                    + ", ".join(f"{m} {s:.2f}s" for m, s in _tiempos_importacion.items()) + "[/dim]"
+                )
             console.print("\n[bold magenta]¡Gracias por usar el asistente! Hasta luego.[/bold magenta]")
             break
         else:
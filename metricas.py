@@ -0,0 +1,154 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+from config import Config
+
+console = Console()
+
+# Dimensiones por las que se puede agrupar el resumen
+AGRUPACIONES = {
+    "opcion": "opcion",
+    "modelo": "modelo",
+    "dia": "date(fecha, 'unixepoch', 'localtime')",
+    "modo": "modo",
+}
+
+
+class MetricasGemini:
+    """
+    Registro local (SQLite, sólo inserciones) de cada llamada a Gemini:
+    tokens reales de `usage_metadata`, modelo, latencia, tiempo hasta el
+    primer fragmento y si la respuesta salió de la caché.
+    """
+
+    def __init__(self, ruta: str = None):
+        self.ruta = ruta or os.path.join(Config.CACHE_DIR, "metricas.sqlite")
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        if self._conn is None:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta and not os.path.exists(carpeta):
+                os.makedirs(carpeta)
+            self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llamadas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha REAL NOT NULL,
+                    opcion TEXT,
+                    modelo TEXT NOT NULL,
+                    modo TEXT NOT NULL,
+                    tokens_entrada INTEGER NOT NULL,
+                    tokens_salida INTEGER NOT NULL,
+                    segundos REAL NOT NULL,
+                    ttft REAL,
+                    desde_cache INTEGER NOT NULL,
+                    error TEXT
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llamadas_fecha ON llamadas (fecha)")
+            self._conn.commit()
+        return self._conn
+
+    def registrar(self, opcion: str, modelo: str, modo: str, tokens_entrada: int = 0, tokens_salida: int = 0,
+                  segundos: float = 0.0, ttft: float = None, desde_cache: bool = False, error: str = None):
+        """Agrega una llamada al registro. Nunca interrumpe al llamador si falla."""
+        if not Config.METRICAS_ACTIVAS:
+            return
+        try:
+            with self._lock:
+                conn = self._conexion()
+                conn.execute(
+                    """INSERT INTO llamadas (fecha, opcion, modelo, modo, tokens_entrada, tokens_salida,
+                                             segundos, ttft, desde_cache, error)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (time.time(), opcion, modelo, modo, tokens_entrada or 0, tokens_salida or 0,
+                     segundos, ttft, int(bool(desde_cache)), error),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            console.print(f"[yellow]No se pudo registrar la métrica de Gemini: {e}[/yellow]")
+
+    def resumen(self, agrupar_por: str = "opcion", desde: str = None) -> list:
+        """
+        Totales agrupados por 'opcion', 'modelo', 'dia' o 'modo'. `desde` es una
+        fecha 'YYYY-MM-DD' opcional.
+
+        Returns:
+            list: Diccionarios con grupo, modelo, llamadas, aciertos de caché,
+            errores, tokens y latencias (media y máxima).
+        """
+        if agrupar_por not in AGRUPACIONES:
+            raise ValueError(f"Agrupación no válida: {agrupar_por}")
+        expresion = AGRUPACIONES[agrupar_por]
+        condicion, parametros = "", ()
+        if desde:
+            condicion, parametros = "WHERE fecha >= ?", (datetime.strptime(desde, "%Y-%m-%d").timestamp(),)
+        with self._lock:
+            filas = self._conexion().execute(
+                f"""SELECT {expresion}, modelo, COUNT(*), SUM(desde_cache), SUM(error IS NOT NULL),
+                           SUM(tokens_entrada), SUM(tokens_salida),
+                           SUM(CASE WHEN desde_cache = 0 THEN tokens_entrada ELSE 0 END),
+                           SUM(CASE WHEN desde_cache = 0 THEN tokens_salida ELSE 0 END),
+                           AVG(segundos), MAX(segundos), AVG(ttft)
+                    FROM llamadas {condicion}
+                    GROUP BY {expresion}, modelo ORDER BY {expresion}""",
+                parametros,
+            ).fetchall()
+        columnas = ("grupo", "modelo", "llamadas", "desde_cache", "errores", "tokens_entrada",
+                    "tokens_salida", "tokens_entrada_facturados", "tokens_salida_facturados",
+                    "segundos_medio", "segundos_max", "ttft_medio")
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+
+def mostrar_resumen(agrupar_por: str = "opcion", desde: str = None) -> list:
+    """Muestra el resumen de llamadas registradas con su costo exacto."""
+    from opcion5_costo_tokens import calcular_costo
+
+    filas = metricas.resumen(agrupar_por, desde)
+    if not filas:
+        console.print("[yellow]No hay llamadas a Gemini registradas.[/yellow]")
+        return filas
+
+    tabla = Table(title=f"Llamadas a Gemini por {agrupar_por}" + (f" desde {desde}" if desde else ""))
+    for columna in (agrupar_por.capitalize(), "Modelo", "Llamadas", "Caché", "Errores", "Tokens entrada",
+                    "Tokens salida", "Latencia media", "Latencia máx.", "TTFT medio", "Costo (USD)"):
+        tabla.add_column(columna)
+    costo_total = 0.0
+    for f in filas:
+        # Las respuestas de la caché no generan costo nuevo: sólo se cobran los tokens de las llamadas reales
+        costo = sum(calcular_costo(f["tokens_entrada_facturados"], f["tokens_salida_facturados"], f["modelo"]))
+        costo_total += costo
+        tabla.add_row(
+            str(f["grupo"]), f["modelo"], str(f["llamadas"]), str(f["desde_cache"]), str(f["errores"]),
+            str(f["tokens_entrada"]), str(f["tokens_salida"]), f"{f['segundos_medio']:.2f}s",
+            f"{f['segundos_max']:.2f}s", f"{f['ttft_medio']:.2f}s" if f["ttft_medio"] is not None else "-",
+            f"${costo:.6f}",
+        )
+    console.print(tabla)
+    console.print(f"Costo total: [bold magenta]${costo_total:.6f} USD[/bold magenta]")
+    return filas
+
+
+# Instancia compartida usada por gemini_ai
+metricas = MetricasGemini()
+
+
+def main(argv=None):
+    """python metricas.py [--por opcion|modelo|dia|modo] [--desde YYYY-MM-DD]"""
+    parser = argparse.ArgumentParser(description="Resumen de tokens, latencia y costo de las llamadas a Gemini.")
+    parser.add_argument("--por", default="opcion", choices=list(AGRUPACIONES), help="Dimensión de agrupación.")
+    parser.add_argument("--desde", help="Fecha inicial (YYYY-MM-DD).")
+    args = parser.parse_args(argv)
+    mostrar_resumen(args.por, args.desde)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
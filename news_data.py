@@ -1,21 +1,147 @@
+import asyncio
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 from config import Config
+from trazas import span, con_contexto
+from cuotas import planificador
 
-def get_recent_news_titles(ticker: str, days: int = 30, limit: int = 5):
-    """Devuelve una lista de títulos recientes (últimos `days` días) para el ticker usando NewsAPI."""
+_sesion = None
+_sesion_lock = threading.Lock()
+
+# Pool propio (no el executor por defecto de asyncio) para que `asyncio.run`
+# no espere a los proveedores que siguen corriendo tras vencer el deadline.
+MAX_HILOS = 8
+_pool = ThreadPoolExecutor(max_workers=MAX_HILOS, thread_name_prefix="noticias")
+
+def obtener_sesion() -> requests.Session:
+    """Devuelve una sesión HTTP compartida con pool de conexiones (keep-alive)."""
+    global _sesion
+    with _sesion_lock:
+        if _sesion is None:
+            _sesion = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+            _sesion.mount("https://", adaptador)
+            _sesion.mount("http://", adaptador)
+        return _sesion
+
+def _articulo(proveedor: str, a: dict) -> dict:
+    """Normaliza un artículo de cualquier proveedor a un diccionario común."""
+    fuente = a.get("source") or {}
+    return {
+        "proveedor": proveedor,
+        "title": a.get("title") or "",
+        "description": a.get("description") or "",
+        "url": a.get("url") or "",
+        "source": fuente.get("name", "") if isinstance(fuente, dict) else str(fuente),
+        "publishedAt": a.get("publishedAt") or "",
+    }
+
+def _consultar(proveedor: str, empresa: str, url: str, limit: int, limite: float = None, **kwargs) -> list:
+    """
+    GET a un proveedor de noticias; devuelve los artículos normalizados. Con
+    `limite` (instante de `time.monotonic()`) no se espera por un 429 más allá
+    del deadline del agregador.
+    """
+    with span("noticias.proveedor", proveedor=proveedor, empresa=empresa) as s:
+        # "newsapi_everything" comparte la cuota de NewsAPI
+        cuota = "gnews" if proveedor == "gnews" else "newsapi"
+        r = planificador.ejecutar(cuota, lambda: obtener_sesion().get(url, **kwargs), limite=limite)
+        r.raise_for_status()
+        articulos = [_articulo(proveedor, a) for a in (r.json().get("articles", []) or [])[:limit]]
+        s.agregar(bytes=len(r.content), articulos=len(articulos))
+        return articulos
+
+def buscar_newsapi_top(empresa: str, limit: int = 5, timeout: float = None, limite: float = None):
+    """Titulares principales de NewsAPI (endpoint top-headlines)."""
+    return _consultar(
+        "newsapi", empresa, f"{Config.NEWSAPI_BASE_URL}/v2/top-headlines", limit, limite,
+        params={"q": empresa, "language": "en", "pageSize": limit},
+        headers={"X-Api-Key": Config.NEWSAPI_API_KEY or ""},
+        timeout=timeout or Config.NEWS_TIMEOUT_PROVEEDOR,
+    )
+
+def buscar_newsapi_everything(empresa: str, limit: int = 5, timeout: float = None, days: int = 30,
+                              limite: float = None):
+    """Noticias más populares de los últimos `days` días en NewsAPI (endpoint everything)."""
     since = (datetime.today() - timedelta(days=days)).date()
-    url = (
-        "https://newsapi.org/v2/everything?"
-        f"q={ticker}&from={since}&sortBy=popularity&apiKey={Config.NEWSAPI_API_KEY}"
+    return _consultar(
+        "newsapi_everything", empresa, f"{Config.NEWSAPI_BASE_URL}/v2/everything", limit, limite,
+        params={"q": empresa, "from": str(since), "sortBy": "popularity", "pageSize": limit},
+        headers={"X-Api-Key": Config.NEWSAPI_API_KEY or ""},
+        timeout=timeout or Config.NEWS_TIMEOUT_PROVEEDOR,
+    )
+
+def buscar_gnews(empresa: str, limit: int = 5, timeout: float = None, limite: float = None):
+    """Búsqueda de noticias en GNews."""
+    return _consultar(
+        "gnews", empresa, f"{Config.GNEWS_BASE_URL}/api/v4/search", limit, limite,
+        params={"q": empresa, "lang": "en", "token": Config.GNEWS_API_KEY or "", "max": limit},
+        timeout=timeout or Config.NEWS_TIMEOUT_PROVEEDOR,
     )
-    r = requests.get(url)
-    if r.status_code != 200:
+
+# Proveedores disponibles para el agregador: nombre -> función de búsqueda
+PROVEEDORES = {
+    "newsapi": buscar_newsapi_top,
+    "gnews": buscar_gnews,
+    "newsapi_everything": buscar_newsapi_everything,
+}
+PROVEEDORES_POR_DEFECTO = ("newsapi", "gnews")
+
+async def agregar_noticias_async(empresa: str, proveedores=None, limit: int = 5,
+                                 timeout_proveedor: float = None, deadline: float = None):
+    """
+    Consulta todos los proveedores en paralelo y devuelve lo que haya llegado
+    cuando vence `deadline` (segundos). Los proveedores lentos o con error se
+    informan en `errores` sin bloquear al resto.
+
+    Returns:
+        tuple: (noticias, errores) donde `noticias` es {proveedor: [artículo, ...]}
+        y `errores` es {proveedor: mensaje}.
+    """
+    proveedores = list(proveedores or PROVEEDORES_POR_DEFECTO)
+    timeout_proveedor = timeout_proveedor or Config.NEWS_TIMEOUT_PROVEEDOR
+    deadline = deadline or Config.NEWS_DEADLINE
+    loop = asyncio.get_running_loop()
+    limite = time.monotonic() + deadline
+
+    tareas = {
+        asyncio.ensure_future(loop.run_in_executor(
+            _pool, con_contexto(lambda f=PROVEEDORES[nombre]: f(empresa, limit, timeout_proveedor, limite=limite))
+        )): nombre
+        for nombre in proveedores
+    }
+    hechas, pendientes = await asyncio.wait(list(tareas), timeout=deadline)
+
+    noticias, errores = {}, {}
+    for tarea in hechas:
+        nombre = tareas[tarea]
+        try:
+            noticias[nombre] = tarea.result()
+        except Exception as e:
+            errores[nombre] = str(e)
+    for tarea in pendientes:
+        tarea.cancel()
+        errores[tareas[tarea]] = f"sin respuesta antes del límite de {deadline}s"
+    return noticias, errores
+
+def agregar_noticias(empresa: str, proveedores=None, limit: int = 5,
+                     timeout_proveedor: float = None, deadline: float = None):
+    """Versión síncrona de `agregar_noticias_async`."""
+    return asyncio.run(agregar_noticias_async(empresa, proveedores, limit, timeout_proveedor, deadline))
+
+def get_recent_news_titles(ticker: str, days: int = 30, limit: int = 5):
+    """Devuelve una lista de títulos recientes (últimos `days` días) para el ticker usando NewsAPI."""
+    try:
+        articles = buscar_newsapi_everything(ticker, limit=limit, days=days)
+    except requests.RequestException:
         return []
-    articles = r.json().get("articles", []) or []
-    titles = [a.get("title", "") for a in articles if a.get("title")]
+    titles = [a["title"] for a in articles if a["title"]]
     return titles[:limit]
-    
+
 
 # titles = get_recent_news_titles("TSLA")
-# print(titles)
\ No newline at end of file
+# print(titles)
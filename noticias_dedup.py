@@ -0,0 +1,140 @@
+import hashlib
+import re
+import unicodedata
+from datetime import datetime, timezone
+from utils import estimar_tokens
+
+# Parámetros de MinHash / LSH para detectar titulares casi idénticos
+NUM_PERMUTACIONES = 64
+BANDAS = 16
+FILAS_POR_BANDA = NUM_PERMUTACIONES // BANDAS
+UMBRAL_SIMILITUD = 0.6
+
+def normalizar_titulo(titulo: str) -> str:
+    """
+    Minúsculas, sin acentos, sin puntuación y sin el sufijo ' - Fuente'. Las
+    letras de otros alfabetos (cirílico, CJK...) se conservan.
+    """
+    titulo = re.sub(r"\s[-|–—]\s[^-|–—]{1,40}$", "", titulo or "")
+    titulo = "".join(c for c in unicodedata.normalize("NFKD", titulo) if not unicodedata.combining(c))
+    titulo = re.sub(r"[\W_]+", " ", titulo.lower(), flags=re.UNICODE)
+    return " ".join(titulo.split())
+
+def _shingles(texto: str, k: int = 5) -> set:
+    """Shingles de `k` caracteres; para textos cortos devuelve el texto completo."""
+    if len(texto) <= k:
+        return {texto}
+    return {texto[i:i + k] for i in range(len(texto) - k + 1)}
+
+def _hash(semilla: int, valor: str) -> int:
+    digest = hashlib.blake2b(valor.encode(), digest_size=8, salt=semilla.to_bytes(8, "little")).digest()
+    return int.from_bytes(digest, "little")
+
+def firma_minhash(texto: str) -> tuple:
+    """Firma MinHash de los shingles del texto."""
+    shingles = _shingles(texto)
+    return tuple(min(_hash(semilla, s) for s in shingles) for semilla in range(NUM_PERMUTACIONES))
+
+def similitud(firma_a: tuple, firma_b: tuple) -> float:
+    """Estimación de la similitud de Jaccard a partir de dos firmas."""
+    return sum(a == b for a, b in zip(firma_a, firma_b)) / len(firma_a)
+
+def deduplicar(articulos: list) -> list:
+    """
+    Elimina artículos repetidos entre proveedores.
+
+    Primero descarta los títulos normalizados idénticos (hash) y después los casi
+    duplicados usando MinHash con LSH por bandas. Cada artículo conservado
+    incluye `cobertura`: cuántas veces apareció la misma historia.
+    """
+    vistos = {}
+    for indice, articulo in enumerate(articulos):
+        normalizado = normalizar_titulo(articulo.get("title", ""))
+        # Un título vacío tras normalizar no se agrupa con ningún otro
+        clave = hashlib.sha1(normalizado.encode()).hexdigest() if normalizado else indice
+        if clave in vistos:
+            vistos[clave]["cobertura"] += 1
+        else:
+            vistos[clave] = {**articulo, "cobertura": 1}
+
+    unicos, firmas, cubetas = [], [], {}
+    for articulo in vistos.values():
+        normalizado = normalizar_titulo(articulo.get("title", ""))
+        if not normalizado:
+            unicos.append(articulo)
+            firmas.append(None)
+            continue
+        firma = firma_minhash(normalizado)
+        candidatos = set()
+        for banda in range(BANDAS):
+            clave = (banda, firma[banda * FILAS_POR_BANDA:(banda + 1) * FILAS_POR_BANDA])
+            candidatos.update(cubetas.get(clave, ()))
+        duplicado = next(
+            (i for i in sorted(candidatos) if similitud(firma, firmas[i]) >= UMBRAL_SIMILITUD), None
+        )
+        if duplicado is not None:
+            unicos[duplicado]["cobertura"] += articulo["cobertura"]
+            continue
+        indice = len(unicos)
+        unicos.append(articulo)
+        firmas.append(firma)
+        for banda in range(BANDAS):
+            cubetas.setdefault((banda, firma[banda * FILAS_POR_BANDA:(banda + 1) * FILAS_POR_BANDA]), []).append(indice)
+    return unicos
+
+def puntuar(articulo: dict, consulta: str, ahora: datetime = None) -> float:
+    """
+    Relevancia de un artículo para la consulta: menciones en título y
+    descripción, cobertura entre proveedores y antigüedad.
+    """
+    terminos = set(normalizar_titulo(consulta).split())
+    titulo = set(normalizar_titulo(articulo.get("title", "")).split())
+    descripcion = set(normalizar_titulo(articulo.get("description", "")).split())
+    puntaje = 2.0 * len(terminos & titulo) + 1.0 * len(terminos & descripcion)
+    puntaje += 0.5 * (articulo.get("cobertura", 1) - 1)
+
+    try:
+        publicado = datetime.fromisoformat(articulo.get("publishedAt", "").replace("Z", "+00:00"))
+        ahora = ahora or datetime.now(timezone.utc)
+        dias = max(0.0, (ahora - publicado).total_seconds() / 86400)
+        puntaje += 1.0 / (1.0 + dias)
+    except (ValueError, TypeError):
+        pass
+    return puntaje
+
+def texto_articulo(articulo: dict) -> str:
+    """Texto del artículo tal como se incluye en el prompt."""
+    return f"{articulo.get('title', '')} {articulo.get('description', '')}".strip()
+
+def seleccionar_noticias(articulos: list, consulta: str, top_k: int = 8, max_tokens: int = 1500):
+    """
+    Deduplica, ordena por relevancia y se queda con los `top_k` mejores
+    artículos que entran en `max_tokens`.
+
+    Returns:
+        tuple: (seleccionados, informe) donde `informe` resume duplicados
+        eliminados y tokens ahorrados respecto de enviar todo.
+    """
+    tokens_entrada = sum(estimar_tokens(texto_articulo(a)) for a in articulos)
+    unicos = deduplicar(articulos)
+    ordenados = sorted(unicos, key=lambda a: puntuar(a, consulta), reverse=True)
+
+    seleccionados, tokens = [], 0
+    for articulo in ordenados:
+        if len(seleccionados) >= top_k:
+            break
+        coste = estimar_tokens(texto_articulo(articulo))
+        if seleccionados and tokens + coste > max_tokens:
+            continue
+        seleccionados.append(articulo)
+        tokens += coste
+
+    informe = {
+        "articulos": len(articulos),
+        "duplicados": len(articulos) - len(unicos),
+        "seleccionados": len(seleccionados),
+        "tokens_entrada": tokens_entrada,
+        "tokens_salida": tokens,
+        "tokens_ahorrados": tokens_entrada - tokens,
+    }
+    return seleccionados, informe
@@ -1,101 +1,257 @@
 import os
-import yfinance as yf
+import csv
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from google.generativeai import GenerativeModel, configure
-from google.generativeai.types import HarmBlockThreshold, HarmCategory
-from utils import guardar_conversacion
-from dotenv import load_dotenv
-
-# Carga las variables de entorno del archivo .env
-load_dotenv()
+from rich.progress import SpinnerColumn, TextColumn, BarColumn, MofNCompleteColumn
+from gemini_ai import configurar, generar, generar_stream, nombre_modelo
+from utils import guardar_conversacion, dividir_en_lotes, mostrar_y_guardar_stream, crear_progreso
+from yahoo_data import TickerSnapshot
+from cache_yahoo import cache_yahoo
+from concurrencia import ejecutar_concurrente
+from config import Config
+from trazas import span, ejecucion
+from codificacion_prompt import codificar_filas, formatear_valor, reportar_tokens
 
 # Configura la consola
 console = Console()
 
-def obtener_datos_financieros(tickers):
-    """Obtiene datos financieros de Yahoo Finance."""
-    data = {}
-    with Progress(
+def _datos_ticker(snapshot: TickerSnapshot) -> dict:
+    """Extrae las métricas clave de un ticker a partir de su snapshot."""
+    balance_sheet = snapshot.balance_sheet
+    income_statement = snapshot.financials
+    market_info = snapshot.info
+
+    # Extrae métricas clave
+    current_ratio = balance_sheet.loc['Current Ratio'].iloc[0] if 'Current Ratio' in balance_sheet.index else "N/A"
+    revenue = income_statement.loc['Total Revenue'].iloc[0] if 'Total Revenue' in income_statement.index else "N/A"
+    roe = market_info.get('returnOnEquity', "N/A")
+
+    return {
+        "Current Ratio": current_ratio,
+        "Revenue": revenue,
+        "ROE": roe
+    }
+
+def obtener_datos_financieros(tickers, forzar_refresco: bool = False, max_concurrencia: int = None, snapshots: dict = None):
+    """
+    Obtiene datos financieros de Yahoo Finance (a través de la caché local)
+    descargando varios tickers en paralelo. Los tickers que fallan tras los
+    reintentos se informan al final sin interrumpir el resto.
+
+    Si se pasa `snapshots` ({ticker: TickerSnapshot}) se reutilizan los estados
+    ya cargados, y los snapshots creados aquí se agregan a ese diccionario para
+    que otras funciones de `yahoo_data` no vuelvan a descargarlos.
+    """
+    tickers = list(tickers)
+    snapshots = snapshots if snapshots is not None else {}
+    for ticker in tickers:
+        if ticker not in snapshots:
+            snapshots[ticker] = TickerSnapshot(ticker, forzar_refresco)
+    max_concurrencia = max_concurrencia or Config.YAHOO_MAX_CONCURRENCIA
+    with crear_progreso(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
-        transient=True,
+        BarColumn(),
+        MofNCompleteColumn(),
     ) as progress:
         task = progress.add_task("[cyan]Descargando datos financieros...", total=len(tickers))
-        for ticker in tickers:
-            try:
-                empresa = yf.Ticker(ticker)
-                balance_sheet = empresa.balance_sheet
-                income_statement = empresa.financials
-                market_info = empresa.info
-
-                # Extrae métricas clave
-                current_ratio = balance_sheet.loc['Current Ratio'].iloc[0] if 'Current Ratio' in balance_sheet.index else "N/A"
-                revenue = income_statement.loc['Total Revenue'].iloc[0] if 'Total Revenue' in income_statement.index else "N/A"
-                roe = market_info.get('returnOnEquity', "N/A")
-
-                data[ticker] = {
-                    "Current Ratio": current_ratio,
-                    "Revenue": revenue,
-                    "ROE": roe
-                }
-            except Exception as e:
-                console.print(f"[red]Error al obtener datos para {ticker}: {e}[/red]")
-            progress.update(task, advance=1)
-    return data
-
-def analizar_inversion(gemini_api_key: str):
-    """Función principal para el análisis de inversión."""
+
+        def al_completar(ticker, resultado, error):
+            progress.update(task, advance=1, description=f"[cyan]Descargando datos financieros... {ticker}")
+
+        data, errores = ejecutar_concurrente(
+            tickers,
+            lambda ticker: _datos_ticker(snapshots[ticker]),
+            max_workers=max_concurrencia,
+            intentos=Config.YAHOO_REINTENTOS,
+            al_completar=al_completar,
+        )
+
+    for ticker, e in errores.items():
+        console.print(f"[red]Error al obtener datos para {ticker}: {e}[/red]")
+    if errores:
+        console.print(f"[yellow]{len(data)} de {len(tickers)} tickers descargados correctamente.[/yellow]")
+
+    stats = cache_yahoo.estadisticas()
+    console.print(f"[dim]Caché Yahoo: {stats['hits']} aciertos, {stats['misses']} descargas.[/dim]")
+    # Conserva el orden original de los tickers
+    return {ticker: data[ticker] for ticker in tickers if ticker in data}
+
+# Universo por defecto cuando no se indica un archivo de tickers
+EMPRESAS_POR_DEFECTO = {
+    "MSFT": "Microsoft",
+    "AAPL": "Apple",
+    "GOOG": "Google"
+}
+
+def cargar_universo(ruta: str) -> dict:
+    """
+    Carga un universo de tickers desde un archivo.
+
+    Acepta un .txt con un ticker por línea (opcionalmente "TICKER,Nombre") o un
+    CSV de componentes de un índice con columna 'Symbol'/'Ticker' y, si existe,
+    'Name'/'Security'/'Nombre'.
+
+    Returns:
+        dict: {ticker: nombre}
+    """
+    with open(ruta, "r", encoding="utf-8-sig") as f:
+        lineas = [linea.strip() for linea in f if linea.strip() and not linea.startswith("#")]
+    if not lineas:
+        return {}
+
+    empresas = {}
+    cabecera = [c.strip().lower() for c in next(csv.reader([lineas[0]]))]
+    col_ticker = next((cabecera.index(c) for c in ("symbol", "ticker") if c in cabecera), None)
+    if col_ticker is not None:
+        col_nombre = next((cabecera.index(c) for c in ("name", "security", "nombre") if c in cabecera), None)
+        for fila in csv.reader(lineas[1:]):
+            if len(fila) > col_ticker and fila[col_ticker].strip():
+                ticker = fila[col_ticker].strip().upper()
+                nombre = fila[col_nombre].strip() if col_nombre is not None and len(fila) > col_nombre else ticker
+                empresas[ticker] = nombre or ticker
+    else:
+        for fila in csv.reader(lineas):
+            ticker = fila[0].strip().upper()
+            empresas[ticker] = fila[1].strip() if len(fila) > 1 and fila[1].strip() else ticker
+    return empresas
+
+# Tabla de datos enviada a Gemini: (clave, encabezado con unidad, formato)
+COLUMNAS_PROMPT = [
+    ("ticker", "Ticker", "texto"),
+    ("nombre", "Empresa", "texto"),
+    ("ROE", "ROE %", "fraccion"),
+    ("Current Ratio", "Current Ratio", "numero"),
+    ("Revenue", "Ingresos USD", "importe"),
+]
+
+def _sin_datos(fila: dict) -> bool:
+    """True si la empresa no tiene ninguna métrica disponible."""
+    return all(formatear_valor(fila.get(clave), formato) == "-" for clave, _, formato in COLUMNAS_PROMPT[2:])
+
+def _entidad(empresas: dict = None) -> str:
+    """Descripción del universo analizado para el historial."""
+    tickers = sorted(empresas or EMPRESAS_POR_DEFECTO)
+    return ",".join(tickers) if len(tickers) <= 10 else f"{len(tickers)} empresas"
+
+def _generar(prompt: str):
+    """Envía un prompt a Gemini y devuelve la respuesta (texto en `.text`, tokens en `usage_metadata`)."""
+    return generar(prompt, opcion="fundamental")
+
+def _prompt_lote(analysis_input: str, top: int) -> str:
+    return f"""Actúa como un analista financiero. Compara las siguientes empresas según sus indicadores de rentabilidad (ROE), liquidez (Current Ratio) e ingresos. Datos disponibles (una fila por empresa, '-' sin dato):
+{analysis_input}
+Devuelve un ranking de las {top} empresas con mejor oportunidad de inversión a largo plazo, una por línea con el formato "TICKER - Nombre: justificación breve (máximo 30 palabras)"."""
+
+def _prompt_final(rankings: str) -> str:
+    return f"""Actúa como un analista financiero. Los siguientes rankings parciales se obtuvieron comparando grupos de empresas por rentabilidad (ROE), liquidez (Current Ratio) e ingresos: {rankings}. Unifica los rankings en una clasificación final, destaca los puntos fuertes y débiles de las mejores candidatas y genera un resumen de 300 palabras sobre cuál presenta una mejor oportunidad de inversión a largo plazo, justificando tu respuesta."""
+
+def preparar_prompt_inversion(empresas: dict = None, top_por_lote: int = 5) -> str:
+    """
+    Etapa de datos del análisis de inversión: descarga los datos financieros y
+    construye el prompt final.
+
+    Con pocas empresas se arma un único prompt. Con un universo grande los datos
+    se dividen en lotes según un presupuesto de tokens, cada lote se analiza en
+    paralelo y los rankings parciales se combinan en el prompt final.
+    """
+    # Define los tickers de las empresas
+    empresas = empresas or EMPRESAS_POR_DEFECTO
+
+    with span("yahoo.datos", tickers=len(empresas)):
+        datos_financieros = obtener_datos_financieros(empresas.keys())
+    if not datos_financieros:
+        raise RuntimeError("No se pudieron obtener datos financieros.")
+    
+    # Una línea compacta por empresa (precisión y unidades controladas); las
+    # empresas sin ninguna métrica sólo se nombran
+    with span("prompt.construir", empresas=len(datos_financieros)) as s:
+        filas = [{"ticker": t, "nombre": empresas[t], **datos_financieros[t]} for t in datos_financieros]
+        sin_datos = [f["ticker"] for f in filas if _sin_datos(f)]
+        filas = [f for f in filas if not _sin_datos(f)]
+        if not filas:
+            raise RuntimeError("No se pudieron obtener datos financieros.")
+        encabezado, lineas = codificar_filas(filas, COLUMNAS_PROMPT)
+        bloques = dict(zip((f["ticker"] for f in filas), lineas))
+        lotes = dividir_en_lotes(bloques, Config.FUNDAMENTAL_TOKENS_POR_LOTE)
+        s.agregar(lotes=len(lotes), sin_datos=len(sin_datos))
+    nota = f"\nSin datos disponibles: {', '.join(sin_datos)}." if sin_datos else ""
+
+    if len(lotes) == 1:
+        analysis_input = "\n".join([encabezado] + lineas) + nota
+        nombres = ", ".join(f["nombre"] for f in filas)
+        prompt = f"""Actúa como un analista financiero. Analiza los últimos informes anuales de {nombres}. Compara sus indicadores de rentabilidad (ROE), liquidez (Current Ratio) y crecimiento de ingresos. También incluye percepción del mercado según noticias recientes. Datos disponibles (una fila por empresa, '-' sin dato):
+{analysis_input}
+Genera un informe que destaque los puntos fuertes y débiles de cada una y un resumen de 300 palabras sobre cuál presenta una mejor oportunidad de inversión a largo plazo, justificando tu respuesta."""
+        reportar_tokens(prompt, "Análisis Fundamental")
+        return prompt
+
+    console.print(f"[cyan]{len(filas)} empresas divididas en {len(lotes)} lotes.[/cyan]")
+    with crear_progreso(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+    ) as progress:
+        task = progress.add_task("[cyan]Analizando lotes con Gemini...", total=len(lotes))
+        rankings, errores = ejecutar_concurrente(
+            range(len(lotes)),
+            lambda i: _generar(_prompt_lote("\n".join([encabezado] + list(lotes[i].values())), top_por_lote)).text,
+            max_workers=Config.GEMINI_MAX_CONCURRENCIA,
+            al_completar=lambda *_: progress.update(task, advance=1),
+        )
+    for i, e in errores.items():
+        console.print(f"[red]Error al analizar el lote {i + 1}: {e}[/red]")
+    if not rankings:
+        raise RuntimeError("Ningún lote pudo analizarse con Gemini.")
+
+    prompt = _prompt_final("\n".join(
+        f"--- Lote {i + 1} ---\n{rankings[i]}" for i in sorted(rankings)
+    ) + nota)
+    reportar_tokens(prompt, "Análisis Fundamental")
+    return prompt
+
+@ejecucion("fundamental")
+def analizar_inversion(gemini_api_key: str, empresas: dict = None, top_por_lote: int = 5):
+    """
+    Función principal para el análisis de inversión.
+
+    Ver `preparar_prompt_inversion` para el tratamiento de universos grandes.
+    """
     try:
         if not gemini_api_key:
             raise ValueError("La clave de API de Gemini no se proporcionó.")
         
         # Configura el modelo de Gemini con la clave proporcionada
-        configure(api_key=gemini_api_key)
+        configurar(gemini_api_key)
 
-        # Define los tickers de las empresas
-        empresas = {
-            "MSFT": "Microsoft",
-            "AAPL": "Apple",
-            "GOOG": "Google"
-        }
+        prompt = preparar_prompt_inversion(empresas, top_por_lote)
 
-        datos_financieros = obtener_datos_financieros(empresas.keys())
-        
-        # Construye el prompt con los datos obtenidos
-        analysis_input = "\n".join(
-            [f"--- {empresas[ticker]} ---\n{datos_financieros[ticker]}" for ticker in datos_financieros]
-        )
-        
-        prompt = f"""Actúa como un analista financiero. Analiza los últimos informes anuales de Microsoft, Apple y Google. Compara sus indicadores de rentabilidad (ROE), liquidez (Current Ratio) y crecimiento de ingresos. También incluye percepción del mercado según noticias recientes. Datos disponibles: {analysis_input}. Genera un informe que destaque los puntos fuertes y débiles de cada una y un resumen de 300 palabras sobre cuál presenta una mejor oportunidad de inversión a largo plazo, justificando tu respuesta."""
+        if Config.GEMINI_STREAMING:
+            mostrar_y_guardar_stream(
+                "Análisis Fundamental", prompt, generar_stream(prompt, opcion="fundamental"),
+                "--- INFORME DE ANÁLISIS FINANCIERO ---", opcion="fundamental", entidad=_entidad(empresas),
+            )
+            return
 
-        model = GenerativeModel("gemini-2.5-flash") # No se necesita api_key aquí si ya se usó `configure`
-        
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            transient=True,
-        ) as progress:
+        with crear_progreso() as progress:
             progress.add_task("[cyan]Generando análisis con Gemini...", total=1)
-            response = model.generate_content(
-                prompt,
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                }
-            )
+            response = _generar(prompt)
             
         console.print("\n[bold]--- INFORME DE ANÁLISIS FINANCIERO ---[/bold]")
         console.print(response.text)
         
-        guardar_conversacion("Análisis Fundamental", prompt, response.text)
+        guardar_conversacion(
+            "Análisis Fundamental", prompt, response.text, opcion="fundamental", entidad=_entidad(empresas),
+            modelo=nombre_modelo(opcion="fundamental"), response=response,
+        )
 
     except Exception as e:
         console.print(f"[bold red]Ocurrió un error:[/bold red] {e}")
 
 # Esto permite que el archivo se ejecute por sí mismo
 if __name__ == "__main__":
+    import sys
     gemini_api_key = os.getenv("GEMINI_API_KEY")
-    analizar_inversion(gemini_api_key)
\ No newline at end of file
+    # Opcionalmente: python opcion1_fundamental.py tickers.csv
+    empresas = cargar_universo(sys.argv[1]) if len(sys.argv) > 1 else None
+    analizar_inversion(gemini_api_key, empresas=empresas)
\ No newline at end of file
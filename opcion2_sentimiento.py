@@ -1,66 +1,114 @@
 import os
+import sys
+import csv
+import json
+import asyncio
 import requests
+from datetime import datetime
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from google.generativeai import GenerativeModel, configure
-from google.generativeai.types import HarmBlockThreshold, HarmCategory
-from newsapi import NewsApiClient
-from utils import guardar_conversacion
+from rich.progress import SpinnerColumn, TextColumn, BarColumn, MofNCompleteColumn
+from rich.table import Table
+from gemini_ai import configurar, generar, generar_stream, nombre_modelo
+from utils import guardar_conversacion, dividir_en_lotes, mostrar_y_guardar_stream, crear_progreso
+from concurrencia import ejecutar_concurrente
+from noticias_dedup import seleccionar_noticias
+from news_data import agregar_noticias, agregar_noticias_async, buscar_newsapi_top, buscar_gnews, PROVEEDORES_POR_DEFECTO, MAX_HILOS
+from historial import historial
 from config import Config
+from trazas import span, ejecucion
 
 # Configura la consola
 console = Console()
 
-def obtener_noticias_newsapi(empresa: str, newsapi_key: str):
+def _formatear(articulos: list) -> list:
+    """Convierte artículos normalizados en líneas 'título descripción'."""
+    return [f"{a['title']} {a['description']}" for a in articulos if a['title'] and a['description']]
+
+def obtener_noticias_newsapi(empresa: str, newsapi_key: str = None):
     """
     Obtiene las 5 noticias principales de una empresa desde NewsAPI.
     
     Args:
         empresa (str): El nombre de la empresa a buscar.
-        newsapi_key (str): La clave de API de NewsAPI.
+        newsapi_key (str): Se mantiene por compatibilidad; la clave se lee de Config.
         
     Returns:
         list: Una lista de títulos y descripciones de noticias.
     """
     console.print(f"Buscando 5 noticias de NewsAPI para: [bold]{empresa}[/bold]...")
-    noticias = []
-    newsapi = NewsApiClient(api_key=newsapi_key)
     try:
-        top_headlines = newsapi.get_top_headlines(q=empresa, language='en', page_size=5)
-        articles = top_headlines.get('articles', [])
-        noticias.extend([f"{articulo.get('title', '')} {articulo.get('description', '')}" for articulo in articles if articulo.get('title') and articulo.get('description')])
+        return _formatear(buscar_newsapi_top(empresa, limit=5))
     except Exception as e:
         console.print(f"[red]Error al obtener noticias de NewsAPI: {e}[/red]")
-    return noticias
+        return []
 
-def obtener_noticias_gnews(empresa: str, gnews_api_key: str):
+def obtener_noticias_gnews(empresa: str, gnews_api_key: str = None):
     """
     Obtiene las 5 noticias principales de una empresa desde GNews.
     
     Args:
         empresa (str): El nombre de la empresa a buscar.
-        gnews_api_key (str): La clave de API de GNews.
+        gnews_api_key (str): Se mantiene por compatibilidad; la clave se lee de Config.
         
     Returns:
         list: Una lista de títulos y descripciones de noticias.
     """
     console.print(f"Buscando 5 noticias de GNews para: [bold]{empresa}[/bold]...")
-    noticias = []
     try:
-        url_gnews = f'https://gnews.io/api/v4/search?q={empresa}&lang=en&token={gnews_api_key}&max=5'
-        response = requests.get(url_gnews)
-        if response.status_code == 200:
-            data = response.json()
-            articles = data.get('articles', [])
-            noticias.extend([f"{articulo.get('title', '')} {articulo.get('description', '')}" for articulo in articles if articulo.get('title') and articulo.get('description')])
-        elif response.status_code == 401:
+        return _formatear(buscar_gnews(empresa, limit=5))
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 401:
             console.print("[red]Error 401: Clave de API de GNews no válida. Revisa tu archivo .env.[/red]")
         else:
-            console.print(f"[red]Error en la API de GNews: Código {response.status_code}[/red]")
+            console.print(f"[red]Error en la API de GNews: {e}[/red]")
     except Exception as e:
         console.print(f"[red]Error al obtener noticias de GNews: {e}[/red]")
-    return noticias
+    return []
+
+def preparar_prompt_sentimiento(empresa: str):
+    """
+    Etapa de datos del análisis de sentimiento: busca, deduplica y selecciona
+    las noticias y construye el prompt. Devuelve None si no hay noticias.
+    """
+    # Consulta todos los proveedores en paralelo, con un límite de tiempo total
+    console.print(f"Buscando noticias en {', '.join(PROVEEDORES_POR_DEFECTO)} para: [bold]{empresa}[/bold]...")
+    with span("noticias.agregar", empresa=empresa):
+        por_proveedor, errores = agregar_noticias(empresa)
+    for proveedor, error in errores.items():
+        console.print(f"[red]Error al obtener noticias de {proveedor}: {error}[/red]")
+
+    articulos = [
+        a
+        for proveedor in PROVEEDORES_POR_DEFECTO
+        for a in por_proveedor.get(proveedor, [])
+        if a['title'] and a['description']
+    ]
+
+    # Elimina duplicados entre proveedores y conserva los más relevantes
+    with span("noticias.seleccionar", articulos=len(articulos)) as s:
+        seleccionados, informe = seleccionar_noticias(
+            articulos, empresa, top_k=Config.NEWS_TOP_K, max_tokens=Config.NEWS_MAX_TOKENS
+        )
+        s.agregar(seleccionados=len(seleccionados))
+    if articulos:
+        console.print(
+            f"[dim]Noticias: {informe['articulos']} recibidas, {informe['duplicados']} duplicadas, "
+            f"{informe['seleccionados']} enviadas (~{informe['tokens_ahorrados']} tokens ahorrados).[/dim]"
+        )
+    noticias = _formatear(seleccionados)
+    
+    if not noticias:
+        return None
+
+    noticias_str = "\n".join(noticias)
+    return f"""Analiza el sentimiento de las siguientes noticias sobre la empresa {empresa}.
+        Identifica el sentimiento predominante (positivo, negativo, neutral) y explica brevemente por qué.
+        Menciona cualquier riesgo o oportunidad potencial que puedas inferir del sentimiento de las noticias.
+        Noticias:
+        {noticias_str}
+        """
 
+@ejecucion("sentimiento")
 def analizar_sentimiento(empresa: str, gemini_api_key: str):
     """Función principal para el análisis de sentimiento."""
     try:
@@ -68,56 +116,201 @@ def analizar_sentimiento(empresa: str, gemini_api_key: str):
             raise ValueError("Las claves de API no se proporcionaron. Revisa tu archivo de configuración.")
 
         # Configura el modelo de Gemini con la clave de API
-        configure(api_key=gemini_api_key)
-
-        noticias_newsapi = obtener_noticias_newsapi(empresa, Config.NEWSAPI_API_KEY)
-        noticias_gnews = obtener_noticias_gnews(empresa, Config.GNEWS_API_KEY)
+        configurar(gemini_api_key)
 
-        noticias = noticias_newsapi + noticias_gnews
-        
-        if not noticias:
+        prompt = preparar_prompt_sentimiento(empresa)
+        if not prompt:
             console.print("[red]No se encontraron noticias para la empresa especificada.[/red]")
             return
 
-        noticias_str = "\n".join(noticias)
-        prompt = f"""Analiza el sentimiento de las siguientes noticias sobre la empresa {empresa}.
-        Identifica el sentimiento predominante (positivo, negativo, neutral) y explica brevemente por qué.
-        Menciona cualquier riesgo o oportunidad potencial que puedas inferir del sentimiento de las noticias.
-        Noticias:
-        {noticias_str}
-        """
+        if Config.GEMINI_STREAMING:
+            mostrar_y_guardar_stream(
+                f"Análisis Sentimiento {empresa}", prompt, generar_stream(prompt, opcion="sentimiento"),
+                "--- ANÁLISIS DE SENTIMIENTO ---", opcion="sentimiento", entidad=empresa,
+            )
+            return
 
-        model = GenerativeModel("gemini-1.5-flash-latest")
-        
-        with Progress(
+        with crear_progreso() as progress:
+            progress.add_task("[cyan]Analizando sentimiento con Gemini...", total=1)
+            response = generar(prompt, opcion="sentimiento")
+
+        console.print("\n[bold]--- ANÁLISIS DE SENTIMIENTO ---[/bold]")
+        console.print(response.text)
+
+        guardar_conversacion(
+            f"Análisis Sentimiento {empresa}", prompt, response.text,
+            opcion="sentimiento", entidad=empresa, response=response,
+        )
+
+    except Exception as e:
+        console.print(f"[bold red]Ocurrió un error:[/bold red] {e}")
+
+CONFIG_JSON = {"response_mime_type": "application/json"}
+
+COLUMNAS_LOTE = ["empresa", "sentimiento", "puntuacion", "noticias", "resumen", "riesgos", "oportunidades"]
+
+async def _noticias_lote_async(empresas: list):
+    """
+    Busca las noticias de todas las empresas en paralelo. Sólo se consultan a
+    la vez las empresas cuyas solicitudes caben en el pool de noticias, de modo
+    que el límite de tiempo de cada una empieza cuando sus consultas pueden correr.
+    """
+    semaforo = asyncio.Semaphore(max(1, MAX_HILOS // len(PROVEEDORES_POR_DEFECTO)))
+
+    async def buscar(empresa):
+        async with semaforo:
+            return await agregar_noticias_async(empresa)
+
+    resultados = await asyncio.gather(*(buscar(e) for e in empresas))
+    return dict(zip(empresas, resultados))
+
+def _prompt_lote(bloques: dict) -> str:
+    noticias = "\n\n".join(bloques.values())
+    return f"""Analiza el sentimiento de las noticias de cada una de las siguientes empresas.
+Responde SÓLO con un JSON: una lista con un objeto por empresa con las claves
+"empresa" (tal como aparece en el encabezado), "sentimiento" (positivo, negativo o neutral),
+"puntuacion" (número entre -1 y 1), "resumen" (máximo 40 palabras),
+"riesgos" y "oportunidades" (texto breve).
+
+{noticias}
+"""
+
+def _parsear_lote(texto: str) -> list:
+    """Interpreta la respuesta JSON de Gemini (lista u objeto con una lista)."""
+    datos = json.loads(texto)
+    if isinstance(datos, dict):
+        datos = next((v for v in datos.values() if isinstance(v, list)), [datos])
+    return [d for d in datos if isinstance(d, dict)]
+
+def guardar_tabla_sentimiento(filas: list) -> str:
+    """Guarda la tabla consolidada del análisis por lotes en un CSV dentro de 'outputs'."""
+    if not os.path.exists("outputs"):
+        os.makedirs("outputs")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    nombre_archivo = f"outputs/Sentimiento_Lote_{timestamp}.csv"
+    with open(nombre_archivo, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNAS_LOTE, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(filas)
+    return nombre_archivo
+
+def _registrar_lote(bloques: dict, resultados: list, response):
+    """
+    Registra en el historial una fila por empresa del lote, con su prompt
+    individual y su resultado; los tokens del lote se reparten entre ellas.
+    """
+    uso = getattr(response, "usage_metadata", None)
+    por_empresa = {str(r.get("empresa", "")).strip(): r for r in resultados}
+    with span("historial.guardar", empresas=len(bloques)):
+        for empresa, bloque in bloques.items():
+            if empresa not in por_empresa:
+                continue
+            try:
+                historial.guardar(
+                    "sentimiento", _prompt_lote({empresa: bloque}), json.dumps(por_empresa[empresa], ensure_ascii=False),
+                    entidad=empresa, modelo=nombre_modelo(opcion="sentimiento"),
+                    tokens_entrada=(getattr(uso, "prompt_token_count", 0) or 0) // len(bloques),
+                    tokens_salida=(getattr(uso, "candidates_token_count", 0) or 0) // len(bloques),
+                )
+            except Exception as e:
+                console.print(f"[red]Error al registrar {empresa} en el historial: {e}[/red]")
+
+@ejecucion("sentimiento_lote")
+def analizar_sentimiento_lote(empresas: list, gemini_api_key: str, max_tokens_por_lote: int = None):
+    """
+    Analiza el sentimiento de varias empresas en una sola ejecución.
+
+    Las noticias de todas las empresas se buscan en paralelo; después se agrupan
+    varias empresas por solicitud a Gemini (respuesta en JSON) según el
+    presupuesto de tokens, las solicitudes se envían en paralelo y el resultado
+    se guarda como una única tabla CSV (y una fila por empresa en el historial).
+
+    Returns:
+        list: Una fila (dict) por empresa.
+    """
+    try:
+        if not gemini_api_key or not Config.NEWSAPI_API_KEY or not Config.GNEWS_API_KEY:
+            raise ValueError("Las claves de API no se proporcionaron. Revisa tu archivo de configuración.")
+
+        configurar(gemini_api_key)
+        empresas = [e.strip() for e in empresas if e and e.strip()]
+        max_tokens_por_lote = max_tokens_por_lote or Config.SENTIMIENTO_TOKENS_POR_LOTE
+
+        console.print(f"Buscando noticias para {len(empresas)} empresas...")
+        with span("noticias.agregar", empresas=len(empresas)):
+            noticias_por_empresa = asyncio.run(_noticias_lote_async(empresas))
+
+        bloques, filas = {}, {}
+        for empresa, (por_proveedor, errores) in noticias_por_empresa.items():
+            articulos = [
+                a
+                for proveedor in PROVEEDORES_POR_DEFECTO
+                for a in por_proveedor.get(proveedor, [])
+                if a['title'] and a['description']
+            ]
+            seleccionados, _ = seleccionar_noticias(
+                articulos, empresa, top_k=Config.NEWS_TOP_K, max_tokens=Config.NEWS_MAX_TOKENS
+            )
+            filas[empresa] = {"empresa": empresa, "noticias": len(seleccionados)}
+            if seleccionados:
+                bloques[empresa] = f"### {empresa}\n" + "\n".join(_formatear(seleccionados))
+            else:
+                filas[empresa]["resumen"] = "Sin noticias"
+
+        lotes = dividir_en_lotes(bloques, max_tokens_por_lote)
+
+        with crear_progreso(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
-            transient=True,
+            BarColumn(),
+            MofNCompleteColumn(),
         ) as progress:
-            progress.add_task("[cyan]Analizando sentimiento con Gemini...", total=1)
-            response = model.generate_content(
-                prompt,
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                }
+            task = progress.add_task("[cyan]Analizando sentimiento con Gemini...", total=len(lotes))
+            respuestas, errores = ejecutar_concurrente(
+                range(len(lotes)),
+                lambda i: generar(_prompt_lote(lotes[i]), opcion="sentimiento", generation_config=CONFIG_JSON),
+                max_workers=Config.GEMINI_MAX_CONCURRENCIA,
+                al_completar=lambda *_: progress.update(task, advance=1),
             )
 
-        console.print("\n[bold]--- ANÁLISIS DE SENTIMIENTO ---[/bold]")
-        console.print(response.text)
+        for i, e in errores.items():
+            console.print(f"[red]Error en el lote {i + 1} ({', '.join(lotes[i])}): {e}[/red]")
+        for i, response in respuestas.items():
+            try:
+                resultados = _parsear_lote(response.text)
+            except ValueError as e:
+                console.print(f"[red]Respuesta no válida en el lote {i + 1}: {e}[/red]")
+                continue
+            for resultado in resultados:
+                empresa = str(resultado.get("empresa", "")).strip()
+                if empresa in filas:
+                    filas[empresa].update({k: resultado.get(k) for k in COLUMNAS_LOTE if k in resultado})
+                    filas[empresa]["empresa"] = empresa
+            _registrar_lote(lotes[i], resultados, response)
+
+        tabla = Table(title=f"Sentimiento de {len(filas)} empresas ({len(lotes)} solicitudes a Gemini)")
+        for columna in ("empresa", "sentimiento", "puntuacion", "noticias", "resumen"):
+            tabla.add_column(columna.capitalize())
+        for fila in filas.values():
+            tabla.add_row(*(str(fila.get(c, "")) for c in ("empresa", "sentimiento", "puntuacion", "noticias", "resumen")))
+        console.print(tabla)
 
-        guardar_conversacion(f"Análisis Sentimiento {empresa}", prompt, response.text)
+        nombre_archivo = guardar_tabla_sentimiento(list(filas.values()))
+        console.print(f"\n[green]Tabla guardada en:[/green] [bold]{nombre_archivo}[/bold]")
+        return list(filas.values())
 
     except Exception as e:
         console.print(f"[bold red]Ocurrió un error:[/bold red] {e}")
+        return []
 
 # Esto permite que el archivo se ejecute por sí mismo
 if __name__ == "__main__":
     if not Config.GEMINI_API_KEY or not Config.NEWSAPI_API_KEY or not Config.GNEWS_API_KEY:
         console.print("[bold red]ERROR: No se encontraron las claves de API necesarias en config.py.[/bold red]")
         console.print("Asegúrate de que tu archivo .env existe y contiene las claves correctas.")
+    elif len(sys.argv) > 1:
+        # Modo por lotes: python opcion2_sentimiento.py Apple Microsoft Nvidia
+        analizar_sentimiento_lote(sys.argv[1:], gemini_api_key=Config.GEMINI_API_KEY)
     else:
         empresa = console.input("Ingresa el nombre de la empresa (ej. Apple, Microsoft): ")
         analizar_sentimiento(
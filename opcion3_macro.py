@@ -1,66 +1,94 @@
 import pandas as pd
-import pandas_datareader.data as web
 import os
 from datetime import datetime, timedelta
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from google.generativeai import GenerativeModel, configure
-from google.generativeai.types import HarmBlockThreshold, HarmCategory
-from utils import guardar_conversacion
+from gemini_ai import configurar, generar, generar_stream
+from utils import guardar_conversacion, mostrar_y_guardar_stream, crear_progreso
+from fred_store import fred_store
+from alineacion_series import AlineadorSeries
 from config import Config
+from trazas import span, ejecucion
+from codificacion_prompt import tabla_compacta, reportar_tokens
 
 # Configura la consola
 console = Console()
 
-def get_fred_data(start_date, end_date, fred_api_key):
-    """Descarga datos macroeconómicos desde la API de FRED."""
-    indicators = {
-        'CPIAUCSL': 'inflacion',  # Consumer Price Index
-        'FEDFUNDS': 'tasa_fed',   # Federal Funds Rate
-        'NASDAQCOM': 'retorno_nasdaq', # NASDAQ Composite Index
-        'VIXCLS': 'vix', # CBOE Volatility Index
-        'UMCSENT': 'sentimiento_consumidor' # University of Michigan Consumer Sentiment
-    }
-    
-    data_df = pd.DataFrame()
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        transient=True,
-    ) as progress:
-        task = progress.add_task("[cyan]Descargando datos de FRED...", total=len(indicators))
-        for symbol, name in indicators.items():
-            try:
-                temp_df = web.DataReader(symbol, 'fred', start_date, end_date, api_key=fred_api_key)
-                temp_df.columns = [name]
-                if data_df.empty:
-                    data_df = temp_df
-                else:
-                    data_df = data_df.join(temp_df, how='outer')
-            except Exception as e:
-                console.print(f"[red]Error al descargar {symbol}: {e}[/red]")
-            progress.update(task, advance=1)
-    
-    return data_df.ffill().bfill() # Rellenar valores nulos
+# Series de FRED a descargar: símbolo -> nombre de columna.
+# Se puede ampliar agregando entradas o pasando `indicators` a `get_fred_data`.
+INDICADORES_FRED = {
+    'CPIAUCSL': 'inflacion',  # Consumer Price Index
+    'FEDFUNDS': 'tasa_fed',   # Federal Funds Rate
+    'NASDAQCOM': 'retorno_nasdaq', # NASDAQ Composite Index
+    'VIXCLS': 'vix', # CBOE Volatility Index
+    'UMCSENT': 'sentimiento_consumidor' # University of Michigan Consumer Sentiment
+}
 
-def build_prompt(yearly_averages: dict) -> str:
-    """Construye el prompt basado en promedios anuales."""
-    indicators = {
-        "inflacion": "Inflación",
-        "tasa_fed": "Tasa Fed",
-        "retorno_nasdaq": "Retorno Nasdaq (12 meses)",
-        "vix": "VIX (Índice de Volatilidad)",
-        "sentimiento_consumidor": "Sentimiento del Consumidor (UMich)",
-    }
+# Regla para resumir cada indicador por período (ver alineacion_series.REGLAS).
+# Los índices de nivel (CPI, NASDAQ) se expresan como variación porcentual.
+REGLAS_AGREGACION = {
+    'inflacion': 'pct_change',
+    'tasa_fed': 'mean',
+    'retorno_nasdaq': 'pct_change',
+    'vix': 'mean',
+    'sentimiento_consumidor': 'mean',
+}
+
+def get_fred_data(start_date, end_date, fred_api_key, indicators: dict = None):
+    """
+    Obtiene datos macroeconómicos de FRED a través del almacén local: sólo se
+    descargan las observaciones nuevas de cada serie, en paralelo. Devuelve un
+    DataFrame con una columna por indicador y sus fechas de observación originales.
+    """
+    indicators = indicators or INDICADORES_FRED
     
-    metrics_str = "=== DATOS PROMEDIO ANUALES (últimos 5 años) ===\n"
-    for year, data in yearly_averages.items():
-        metrics_str += f"\n--- {year} ---\n"
-        for key, name in indicators.items():
-            value = data.get(key)
-            if value is not None:
-                suffix = "%" if key not in ["vix", "sentimiento_consumidor"] else ""
-                metrics_str += f"{name}: {value:.2f}{suffix}\n"
+    with crear_progreso() as progress:
+        task = progress.add_task("[cyan]Actualizando datos de FRED...", total=len(indicators))
+        with span("fred.cargar", series=len(indicators)):
+            series, errores = fred_store.cargar(
+                indicators.keys(), start_date, end_date, fred_api_key,
+                al_completar=lambda *_: progress.update(task, advance=1),
+            )
+
+    for symbol, e in errores.items():
+        console.print(f"[red]Error al descargar {symbol}: {e}[/red]")
+
+    # Se reúnen todas las series y se concatenan una sola vez. No se rellenan
+    # huecos: cada serie conserva su propia frecuencia (ver AlineadorSeries).
+    columnas = {name: series[symbol].iloc[:, 0] for symbol, name in indicators.items() if symbol in series}
+    if not columnas:
+        return pd.DataFrame()
+    return pd.concat(columnas, axis=1)
+
+# Columnas de la tabla de datos del prompt: (clave, encabezado con unidad, formato)
+COLUMNAS_PROMPT = [
+    ("anio", "Año", "texto"),
+    ("inflacion", "Inflación CPI a/a %", "numero"),
+    ("tasa_fed", "Tasa Fed %", "numero"),
+    ("retorno_nasdaq", "Nasdaq 12m %", "numero"),
+    ("vix", "VIX", "numero"),
+    ("sentimiento_consumidor", "Sent. consumidor UMich", "numero"),
+]
+
+def _etiqueta_anios(omitidas: list) -> str:
+    anios = sorted(f["anio"] for f in omitidas)
+    return f"{anios[0]}-{anios[-1]} (media)" if len(anios) > 1 else f"{anios[0]}"
+
+def build_prompt(yearly_averages: dict, max_tokens: int = None) -> str:
+    """
+    Construye el prompt basado en promedios anuales, con los datos en una tabla
+    compacta (un año por fila). Si superan `max_tokens` (por defecto
+    `MACRO_MAX_TOKENS_DATOS`), los años más antiguos se resumen en una fila.
+    """
+    filas = [{"anio": year, **data} for year, data in yearly_averages.items()]
+    tabla, informe = tabla_compacta(
+        filas, COLUMNAS_PROMPT,
+        max_tokens=max_tokens or Config.MACRO_MAX_TOKENS_DATOS,
+        prioridad=lambda fila: fila["anio"],
+        etiqueta_resumen=_etiqueta_anios,
+    )
+    if informe["omitidas"]:
+        console.print(f"[dim]{informe['omitidas']} años antiguos resumidos para respetar el presupuesto de tokens.[/dim]")
+    metrics_str = f"=== DATOS PROMEDIO ANUALES (últimos {len(filas)} años, '-' sin dato) ===\n{tabla}\n"
 
     prompt = f"""
 Actúa como un economista senior en mercados financieros y genera un análisis basado SÓLO en los datos promedio anuales proporcionados.
@@ -81,49 +109,55 @@ Datos de la FED y Mercados:
     
     return prompt
 
+def preparar_prompt_macro(fred_api_key: str) -> str:
+    """Etapa de datos del análisis macroeconómico: descarga, alinea y construye el prompt."""
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=5 * 365) # Últimos 5 años
+    
+    # Se descarga un año más para calcular las variaciones del primer año
+    df = get_fred_data(start_date - timedelta(days=366), end_date, fred_api_key)
+    if df.empty:
+        raise ValueError("No se pudieron obtener datos de FRED.")
+    
+    # Calcular valores anuales con la regla de cada indicador
+    with span("series.alinear", filas=len(df)):
+        alineador = AlineadorSeries(df, REGLAS_AGREGACION)
+        yearly_averages = alineador.a_frecuencia('YE', desde=start_date).to_dict('index')
+    
+    # Formatear el diccionario para el prompt
+    formatted_yearly_averages = {year.year: values for year, values in yearly_averages.items()}
+    
+    with span("prompt.construir", anios=len(formatted_yearly_averages)) as s:
+        prompt = build_prompt(formatted_yearly_averages)
+        s.agregar(tokens=reportar_tokens(prompt, "Análisis Macroeconómico", Config.MACRO_MAX_TOKENS_DATOS))
+    return prompt
+
+@ejecucion("macro")
 def analizar_macro(fred_api_key: str, gemini_api_key: str):
     """Función principal para el análisis macroeconómico."""
     try:
         if not fred_api_key or not gemini_api_key:
             raise ValueError("Las claves de API para FRED o Gemini no se proporcionaron.")
             
-        configure(api_key=gemini_api_key)
-        
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=5 * 365) # Últimos 5 años
-        
-        df = get_fred_data(start_date, end_date, fred_api_key)
-        
-        # Calcular promedios anuales
-        yearly_averages = df.resample('YE').mean().to_dict('index')
+        configurar(gemini_api_key)
         
-        # Formatear el diccionario para el prompt
-        formatted_yearly_averages = {year.year: values for year, values in yearly_averages.items()}
+        prompt = preparar_prompt_macro(fred_api_key)
         
-        prompt = build_prompt(formatted_yearly_averages)
-        
-        model = GenerativeModel("gemini-1.5-flash")
-        
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            transient=True,
-        ) as progress:
-            progress.add_task("[cyan]Generando análisis con Gemini...", total=1)
-            response = model.generate_content(
-                prompt,
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                }
+        if Config.GEMINI_STREAMING:
+            mostrar_y_guardar_stream(
+                "Análisis Macroeconómico", prompt, generar_stream(prompt, opcion="macro"),
+                "--- ANÁLISIS MACROECONÓMICO ---", opcion="macro",
             )
+            return
+
+        with crear_progreso() as progress:
+            progress.add_task("[cyan]Generando análisis con Gemini...", total=1)
+            response = generar(prompt, opcion="macro")
         
         console.print("\n[bold]--- ANÁLISIS MACROECONÓMICO ---[/bold]")
         console.print(response.text)
         
-        guardar_conversacion("Análisis Macroeconómico", prompt, response.text)
+        guardar_conversacion("Análisis Macroeconómico", prompt, response.text, opcion="macro", response=response)
         
     except Exception as e:
         console.print(f"[bold red]Ocurrió un error:[/bold red] {e}")
@@ -1,28 +1,71 @@
 import requests
+import base64
 import json
+import threading
+import time
 from datetime import datetime
 import os
+from requests.adapters import HTTPAdapter
 from rich.console import Console
+from config import Config
+from cache_imagenes import cache_imagenes, clave_imagen
+from concurrencia import ejecutar_concurrente, reintentar
+from trazas import span, ejecucion
+from cuotas import planificador
 
 # Configura la consola para una visualización mejorada
 console = Console()
 
-def guardar_respuesta_txt(prompt, respuesta, filename):
-    """Guarda el prompt y el valor base64 de la respuesta en un archivo .txt con el formato deseado."""
-    try:
-        # Asegurarse de que el valor base64 exista
-        if "data" in respuesta and len(respuesta["data"]) > 0 and "base64" in respuesta["data"][0]:
-            base64_value = respuesta["data"][0]["base64"]
-            content_to_save = f'--- PROMPT ---\n{prompt}\n--- RESPUESTA ---\n"base64": "{base64_value}"'
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(content_to_save)
-            console.print(f"✅ Respuesta guardada en [bold green]{filename}[/bold green]")
-        else:
-            error_msg = "La respuesta de la API no contiene el valor base64 esperado."
-            console.print(f"❌ [bold red]{error_msg}[/bold red]")
-            guardar_log(error_msg)
-    except Exception as e:
-        guardar_log(f"Error al guardar respuesta: {e}")
+ENDPOINT = "/v1/ai/text-to-image"
+ASPECTO_POR_DEFECTO = "widescreen_16_9"
+CARPETA_IMAGENES = os.path.join("outputs", "imagenes")
+RUTA_INDICE = os.path.join(CARPETA_IMAGENES, "indice.jsonl")
+
+# Tamaño de cada bloque de base64 decodificado (múltiplo de 4) y de descarga
+TAMANO_BLOQUE = 64 * 1024
+
+# Estados de las tareas asíncronas de la API
+ESTADOS_FINALES = ("COMPLETED", "FAILED", "ERROR")
+
+_sesion = None
+_sesion_lock = threading.Lock()
+_indice_lock = threading.Lock()
+
+# Tareas asíncronas ya creadas (clave de la imagen -> task_id): un reintento
+# sigue consultando la misma tarea en lugar de pedir (y pagar) otra imagen
+_tareas_en_curso = {}
+
+class ErrorFreepik(RuntimeError):
+    """Respuesta de error de la API de Freepik (conserva el código HTTP)."""
+
+    def __init__(self, codigo: int, mensaje: str):
+        super().__init__(f"Error {codigo}: {mensaje}")
+        self.codigo = codigo
+
+class TareaPendiente(TimeoutError):
+    """La tarea asíncrona no terminó dentro del plazo, pero puede seguir consultándose."""
+
+    def __init__(self, task_id: str):
+        super().__init__(f"La tarea {task_id} no terminó en {Config.FREEPIK_POLL_TIMEOUT}s.")
+        self.task_id = task_id
+
+def _reintentable(error: Exception) -> bool:
+    """Sólo se reintentan los fallos transitorios: conexión, errores 5xx y tareas todavía en curso."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, TareaPendiente)):
+        return True
+    codigo = getattr(error, "codigo", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return codigo is not None and codigo >= 500
+
+def _sesion_http() -> requests.Session:
+    """Sesión HTTP compartida (keep-alive) para las solicitudes concurrentes."""
+    global _sesion
+    with _sesion_lock:
+        if _sesion is None:
+            _sesion = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, Config.FREEPIK_MAX_CONCURRENCIA))
+            _sesion.mount("https://", adaptador)
+            _sesion.mount("http://", adaptador)
+        return _sesion
 
 def guardar_log(mensaje, filename="error_freepik.log"):
     """Guarda mensajes de error en un log con fecha y hora."""
@@ -33,52 +76,265 @@ def guardar_log(mensaje, filename="error_freepik.log"):
     except Exception as e:
         console.print("❌ [bold red]Error crítico al guardar el log:[/bold red]", e)
 
-def generar_imagen_freepik(prompt, freepik_api_key):
+def _extension(cabecera: bytes) -> str:
+    """Extensión del archivo según los primeros bytes de la imagen."""
+    if cabecera.startswith(b"\x89PNG"):
+        return ".png"
+    if cabecera.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return ".webp"
+    return ".png"
+
+def _ruta_imagen(extension: str) -> str:
+    """Nombre único para una imagen nueva en 'outputs/imagenes'."""
+    if not os.path.exists(CARPETA_IMAGENES):
+        os.makedirs(CARPETA_IMAGENES)
+    base = os.path.join(CARPETA_IMAGENES, f"Imagen_FreepikAI_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    ruta, n = base + extension, 1
+    while os.path.exists(ruta):
+        n += 1
+        ruta = f"{base}_{n}{extension}"
+    return ruta
+
+def _escribir_por_bloques(bloques) -> str:
+    """Escribe un iterable de bloques binarios en un archivo nuevo cuyo formato se detecta con el primero."""
+    bloques = iter(bloques)
+    primero = next(bloques, b"")
+    if not primero:
+        raise ValueError("La imagen recibida está vacía.")
+    ruta = _ruta_imagen(_extension(primero))
+    with open(ruta, "wb") as f:
+        f.write(primero)
+        for bloque in bloques:
+            f.write(bloque)
+    return ruta
+
+def guardar_imagen_base64(valor_base64: str) -> str:
     """
-    Realiza una solicitud a la API de Freepik para generar una imagen.
-    
-    Args:
-        prompt (str): La descripción de la imagen a generar.
-        freepik_api_key (str): La clave de la API de Freepik.
+    Decodifica la imagen en base64 por bloques directamente al archivo, sin
+    construir una segunda copia completa de la imagen en memoria.
+
+    Returns:
+        str: Ruta del archivo PNG/JPEG generado.
     """
-    # Asegúrate de que el directorio 'outputs' exista
-    if not os.path.exists("outputs"):
-        os.makedirs("outputs")
+    if valor_base64.startswith("data:"):
+        valor_base64 = valor_base64.split(",", 1)[1]
+    return _escribir_por_bloques(
+        base64.b64decode(valor_base64[i:i + TAMANO_BLOQUE])
+        for i in range(0, len(valor_base64), TAMANO_BLOQUE)
+    )
 
-    # URL de la API de Freepik
-    url = "https://api.freepik.com/v1/ai/text-to-image"
+def descargar_imagen(url: str) -> str:
+    """Descarga una imagen generada (tareas asíncronas) por bloques."""
+    with _sesion_http().get(url, stream=True, timeout=Config.FREEPIK_TIMEOUT) as response:
+        response.raise_for_status()
+        return _escribir_por_bloques(response.iter_content(TAMANO_BLOQUE))
 
+def _guardar_generada(item) -> str:
+    """Guarda un elemento de la respuesta: base64, URL o diccionario con alguno de los dos."""
+    if isinstance(item, dict):
+        item = item.get("base64") or item.get("url")
+    if not item:
+        raise ValueError("La respuesta de la API no contiene una imagen.")
+    if item.startswith(("http://", "https://")):
+        return descargar_imagen(item)
+    return guardar_imagen_base64(item)
+
+def _esperar_tarea(task_id: str, headers: dict) -> dict:
+    """Consulta el estado de una tarea asíncrona hasta que termina o vence el plazo."""
+    url = f"{Config.FREEPIK_BASE_URL}{ENDPOINT}/{task_id}"
+    limite = time.monotonic() + Config.FREEPIK_POLL_TIMEOUT
+    while True:
+        response = planificador.ejecutar(
+            "freepik", lambda: _sesion_http().get(url, headers=headers, timeout=Config.FREEPIK_TIMEOUT)
+        )
+        response.raise_for_status()
+        data = response.json().get("data", {})
+        estado = (data.get("status") or "").upper()
+        if estado in ESTADOS_FINALES:
+            if estado != "COMPLETED":
+                raise RuntimeError(f"La tarea {task_id} terminó con estado {estado}.")
+            return data
+        if time.monotonic() > limite:
+            raise TareaPendiente(task_id)
+        time.sleep(Config.FREEPIK_POLL_INTERVALO)
+
+def _solicitar_imagen(prompt: str, freepik_api_key: str, aspect_ratio: str = ASPECTO_POR_DEFECTO,
+                      clave: str = None) -> str:
+    """
+    Envía la solicitud a la API y guarda la imagen. Admite respuestas con la
+    imagen en línea (`data[0].base64`) y respuestas por tarea (`data.task_id`),
+    que se consultan hasta completarse. Si ya hay una tarea en curso para
+    `clave` (un intento anterior venció el plazo), se retoma sin volver a
+    enviar el POST. Lanza excepción ante cualquier error.
+
+    Returns:
+        str: Ruta de la imagen guardada.
+    """
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json",
         "x-freepik-api-key": freepik_api_key
     }
+    data = {"prompt": prompt, "aspect_ratio": aspect_ratio}
+
+    task_id = _tareas_en_curso.get(clave) if clave else None
+    if task_id:
+        console.print(f"[dim]Retomando la tarea {task_id}...[/dim]")
+        resultado = {"task_id": task_id}
+    else:
+        with span("freepik.solicitud", aspect_ratio=aspect_ratio) as s:
+            # Un 429 no es un error: el planificador espera el Retry-After y reintenta
+            response = planificador.ejecutar("freepik", lambda: _sesion_http().post(
+                f"{Config.FREEPIK_BASE_URL}{ENDPOINT}", headers=headers, json=data, timeout=Config.FREEPIK_TIMEOUT
+            ))
+            s.agregar(estado=response.status_code, bytes=len(response.content))
+        if response.status_code != 200:
+            raise ErrorFreepik(response.status_code, response.text)
+        resultado = response.json().get("data")
 
-    # La solicitud de imagen
-    data = {
+    try:
+        if isinstance(resultado, dict) and resultado.get("task_id"):
+            tarea = resultado
+            if (tarea.get("status") or "").upper() != "COMPLETED":
+                if clave:
+                    _tareas_en_curso[clave] = tarea["task_id"]
+                with span("freepik.espera", task_id=tarea["task_id"]):
+                    tarea = _esperar_tarea(tarea["task_id"], headers)
+            generadas = tarea.get("generated") or []
+        else:
+            generadas = resultado or []
+        if not generadas:
+            raise ValueError("La respuesta de la API no contiene el valor base64 esperado.")
+        with span("freepik.guardar") as s:
+            ruta = _guardar_generada(generadas[0])
+            s.agregar(bytes=os.path.getsize(ruta))
+    except Exception as e:
+        # Ante un fallo transitorio la tarea se conserva para que el reintento la retome
+        if clave and not _reintentable(e):
+            _tareas_en_curso.pop(clave, None)
+        raise
+    if clave:
+        _tareas_en_curso.pop(clave, None)
+    return ruta
+
+def _registrar_indice(prompt: str, ruta: str, aspect_ratio: str, segundos: float):
+    """Agrega la imagen al índice de metadatos (y crea su miniatura si se pidió)."""
+    registro = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
         "prompt": prompt,
-        "aspect_ratio": "widescreen_16_9"
+        "aspect_ratio": aspect_ratio,
+        "archivo": ruta,
+        "bytes": os.path.getsize(ruta),
+        "segundos": round(segundos, 3),
     }
+    if Config.FREEPIK_MINIATURAS:
+        try:
+            from PIL import Image
 
-    # Genera el nombre del archivo con fecha y hora
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    nombre_opcion = 'Imagen_FreepikAI'
-    nombre_archivo = f"outputs/{nombre_opcion}_{timestamp}.txt"
-    
+            with Image.open(ruta) as imagen:
+                registro["ancho"], registro["alto"] = imagen.size
+                imagen.thumbnail((256, 256))
+                miniatura = os.path.splitext(ruta)[0] + "_mini.jpg"
+                imagen.convert("RGB").save(miniatura, "JPEG", quality=80)
+                registro["miniatura"] = miniatura
+        except ImportError:
+            console.print("[yellow]Para generar miniaturas instala Pillow (pip install pillow).[/yellow]")
+        except OSError as e:
+            guardar_log(f"No se pudo crear la miniatura de {ruta}: {e}")
+    with _indice_lock, open(RUTA_INDICE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+def _generar_y_registrar(prompt: str, freepik_api_key: str, aspect_ratio: str, usar_cache: bool = True) -> str:
+    """Devuelve la imagen cacheada para un prompt equivalente o genera una nueva."""
+    usar_cache = usar_cache and Config.FREEPIK_CACHE_ACTIVA
+    clave = clave_imagen(prompt, aspect_ratio, {"endpoint": ENDPOINT})
+    if usar_cache:
+        ruta = cache_imagenes.obtener(clave)
+        if ruta:
+            console.print(f"[dim]Imagen reutilizada de la caché: {ruta}[/dim]")
+            return ruta
+    inicio = time.perf_counter()
+    ruta = _solicitar_imagen(prompt, freepik_api_key, aspect_ratio, clave)
+    segundos = time.perf_counter() - inicio
+    _registrar_indice(prompt, ruta, aspect_ratio, segundos)
+    if usar_cache:
+        cache_imagenes.guardar(clave, prompt, ruta, segundos)
+    return ruta
+
+def _registrar_estadisticas_cache():
+    if not Config.FREEPIK_CACHE_ACTIVA:
+        return
+    try:
+        cache_imagenes.registrar_estadisticas()
+    except Exception as e:
+        console.print(f"[yellow]No se pudieron guardar las estadísticas de la caché de imágenes: {e}[/yellow]")
+
+@ejecucion("imagen")
+def generar_imagen_freepik(prompt, freepik_api_key, aspect_ratio=ASPECTO_POR_DEFECTO, usar_cache=True):
+    """
+    Realiza una solicitud a la API de Freepik para generar una imagen y la
+    guarda como archivo PNG/JPEG en 'outputs/imagenes'.
+
+    Args:
+        prompt (str): La descripción de la imagen a generar.
+        freepik_api_key (str): La clave de la API de Freepik.
+        aspect_ratio (str): Relación de aspecto solicitada.
+        usar_cache (bool): Si es False, genera una imagen nueva aunque exista una equivalente.
+
+    Returns:
+        str: Ruta de la imagen, o None si hubo un error (registrado en el log).
+    """
     console.print(f"\nGenerando imagen para el prompt: '[bold]{prompt}[/bold]'...")
 
     try:
-        # Realizar la solicitud POST a la API de Freepik
-        response = requests.post(url, headers=headers, json=data)
-        
-        if response.status_code == 200:
-            respuesta_json = response.json()
-            guardar_respuesta_txt(prompt, respuesta_json, nombre_archivo)
-        else:
-            error_msg = f"Error {response.status_code}: {response.text}"
-            console.print(f"❌ [bold red]{error_msg}[/bold red]")
-            guardar_log(error_msg)
+        ruta = reintentar(
+            lambda: _generar_y_registrar(prompt, freepik_api_key, aspect_ratio, usar_cache),
+            Config.FREEPIK_REINTENTOS, reintentable=_reintentable,
+        )
+        console.print(f"✅ Imagen guardada en [bold green]{ruta}[/bold green]")
+        return ruta
     except requests.exceptions.RequestException as e:
         error_msg = f"Excepción en la solicitud: {e}"
-        console.print(f"❌ [bold red]{error_msg}[/bold red]")
-        guardar_log(error_msg)
+    except Exception as e:
+        error_msg = str(e)
+    finally:
+        _registrar_estadisticas_cache()
+    console.print(f"❌ [bold red]{error_msg}[/bold red]")
+    guardar_log(error_msg)
+    return None
+
+@ejecucion("imagen_lote")
+def generar_imagenes_lote(prompts, freepik_api_key, aspect_ratio=ASPECTO_POR_DEFECTO, max_workers=None,
+                          usar_cache=True) -> dict:
+    """
+    Genera varias imágenes en paralelo con un pool acotado y reintentos.
+
+    Returns:
+        dict: {prompt: ruta de la imagen} de las que se generaron correctamente.
+    """
+    prompts = [p.strip() for p in prompts if p and p.strip()]
+    console.print(f"\nGenerando {len(prompts)} imágenes con Freepik AI...")
+
+    def al_completar(prompt, ruta, error):
+        if error is None:
+            console.print(f"✅ [green]{prompt}[/green] → [bold]{ruta}[/bold]")
+        else:
+            console.print(f"❌ [bold red]{prompt}: {error}[/bold red]")
+            guardar_log(f"Error en el prompt '{prompt}': {error}")
+
+    resultados, errores = ejecutar_concurrente(
+        prompts, lambda p: _generar_y_registrar(p, freepik_api_key, aspect_ratio, usar_cache),
+        max_workers=max_workers or Config.FREEPIK_MAX_CONCURRENCIA,
+        intentos=Config.FREEPIK_REINTENTOS, al_completar=al_completar, reintentable=_reintentable,
+    )
+    console.print(f"\n[cyan]{len(resultados)} imágenes generadas, {len(errores)} con error.[/cyan]")
+    if Config.FREEPIK_CACHE_ACTIVA:
+        stats = cache_imagenes.estadisticas()
+        console.print(
+            f"[dim]Caché de imágenes: {stats['hits']} aciertos ({stats['tasa_aciertos']:.0%}), "
+            f"{stats['bytes_ahorrados'] / 1024:.0f} KB y {stats['solicitudes_ahorradas']} solicitudes ahorradas.[/dim]"
+        )
+    _registrar_estadisticas_cache()
+    return resultados
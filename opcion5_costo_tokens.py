@@ -1,9 +1,230 @@
-import google.generativeai as genai
+from gemini_ai import obtener_modelo, nombre_modelo
 from rich.console import Console
+from rich.table import Table
+from concurrencia import ejecutar_concurrente
+from config import Config
+from historial import historial
+from trazas import span, ejecucion
+import glob
+import hashlib
+import json
 import os
+import random
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
 
 console = Console()
 
+# Precios en USD por millón de tokens (entrada, salida) de cada modelo
+PRECIOS_POR_MODELO = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+
+# Caracteres por token usados por el estimador local si no hay calibración
+CARACTERES_POR_TOKEN = 4.0
+
+# Prefijo del archivo en 'outputs' -> clave de la opción, para los archivos
+# que no tienen fila en el historial (anteriores a él o con GUARDAR_TXT solo)
+PREFIJOS_OPCION = (
+    ("Análisis Fundamental", "fundamental"),
+    ("Análisis Sentimiento", "sentimiento"),
+    ("Análisis Macroeconómico", "macro"),
+    ("Informe Completo", "informe"),
+)
+
+# Sólo las conversaciones con Gemini tienen costo de tokens (las de imágenes usan "--- RESPUESTA ---")
+SEPARADOR_GEMINI = "--- RESPUESTA DE GEMINI ---"
+
+RUTA_CALIBRACION = os.path.join(Config.CACHE_DIR, "calibracion_tokens.json")
+RUTA_CACHE_ARCHIVOS = os.path.join(Config.CACHE_DIR, "costos_archivos.json")
+
+def calcular_costo(tokens_entrada: int, tokens_salida: int, modelo: str) -> tuple:
+    """Devuelve (costo de entrada, costo de salida) en USD para el modelo indicado."""
+    if modelo not in PRECIOS_POR_MODELO:
+        console.print(f"[yellow]Sin precios para '{modelo}'; se usan los de {Config.GEMINI_MODELO}.[/yellow]")
+    precio_entrada, precio_salida = PRECIOS_POR_MODELO.get(modelo, PRECIOS_POR_MODELO.get(Config.GEMINI_MODELO, (0.30, 2.50)))
+    return (tokens_entrada / 1_000_000) * precio_entrada, (tokens_salida / 1_000_000) * precio_salida
+
+def separar_prompt_respuesta(contenido: str):
+    """Devuelve (prompt, respuesta) de un archivo de conversación, o None si no tiene el formato esperado."""
+    for separador in ("--- RESPUESTA DE GEMINI ---", "--- RESPUESTA ---"):
+        if separador in contenido:
+            partes = contenido.split(separador)
+            if len(partes) != 2:
+                return None
+            return partes[0].replace("--- PROMPT ---", "").strip(), partes[1].strip()
+    return None
+
+class EstimadorTokens:
+    """
+    Estimador local de tokens (caracteres / factor) que no requiere red.
+    El factor puede calibrarse contra `count_tokens` de Gemini con una muestra
+    de archivos y se guarda para las siguientes ejecuciones.
+    """
+
+    def __init__(self, caracteres_por_token: float = None):
+        self.caracteres_por_token = caracteres_por_token or self._cargar_calibracion() or CARACTERES_POR_TOKEN
+
+    @staticmethod
+    def _cargar_calibracion():
+        if not os.path.exists(RUTA_CALIBRACION):
+            return None
+        with open(RUTA_CALIBRACION, "r", encoding="utf-8") as f:
+            return json.load(f).get("caracteres_por_token")
+
+    def estimar(self, texto: str) -> int:
+        return round(len(texto) / self.caracteres_por_token) if texto else 0
+
+    def calibrar(self, textos: list, tamano_muestra: int = 5) -> float:
+        """Ajusta el factor con `count_tokens` sobre una muestra de textos y lo guarda."""
+        muestra = random.sample(textos, min(tamano_muestra, len(textos)))
+        modelo = obtener_modelo(opcion="costo_tokens")
+        caracteres = sum(len(t) for t in muestra)
+        tokens = sum(modelo.count_tokens(t).total_tokens for t in muestra)
+        if tokens:
+            self.caracteres_por_token = caracteres / tokens
+            carpeta = os.path.dirname(RUTA_CALIBRACION)
+            if carpeta and not os.path.exists(carpeta):
+                os.makedirs(carpeta)
+            with open(RUTA_CALIBRACION, "w", encoding="utf-8") as f:
+                json.dump({"caracteres_por_token": self.caracteres_por_token, "muestras": len(muestra)}, f)
+        return self.caracteres_por_token
+
+def _opcion_por_prefijo(prefijo: str) -> str:
+    """Clave de la opción a partir del prefijo del archivo ('Análisis Sentimiento Apple' -> 'sentimiento')."""
+    for inicio, opcion in PREFIJOS_OPCION:
+        if prefijo.startswith(inicio):
+            return opcion
+    return prefijo
+
+def _metadatos_archivo(ruta: str) -> tuple:
+    """(opción, día) a partir del nombre '<prefijo>_<YYYYmmdd>_<HHMMSS>.txt' o de la fecha del archivo."""
+    nombre = os.path.basename(ruta)
+    coincidencia = re.match(r"^(.*)_(\d{8})_\d{6}(?:_\d+)?\.txt$", nombre)
+    if coincidencia:
+        dia = datetime.strptime(coincidencia.group(2), "%Y%m%d").strftime("%Y-%m-%d")
+        return _opcion_por_prefijo(coincidencia.group(1)), dia
+    prefijo = os.path.splitext(nombre)[0]
+    return _opcion_por_prefijo(prefijo), datetime.fromtimestamp(os.path.getmtime(ruta)).strftime("%Y-%m-%d")
+
+def _registrados_en_historial() -> dict:
+    """{ruta: (opción, modelo)} según el historial; vacío si no se puede leer."""
+    try:
+        return historial.por_archivo()
+    except sqlite3.Error as e:
+        console.print(f"[yellow]No se pudo leer el historial ({e}); la opción se deduce del nombre del archivo.[/yellow]")
+        return {}
+
+@ejecucion("costo_tokens")
+def analizar_costos_masivo(patron: str = "outputs/*.txt", calibrar: bool = False, modelo: str = None,
+                           max_workers: int = 8) -> dict:
+    """
+    Estima tokens y costos de todas las conversaciones que coinciden con `patron`
+    sin llamadas a la red (salvo la calibración opcional). Los resultados por
+    archivo se guardan según su hash, de modo que sólo se procesan los nuevos.
+
+    La opción y el modelo de cada archivo se toman del historial; si no está
+    registrado, la opción se deduce del nombre y se asume `modelo`. Los
+    archivos que no son conversaciones con Gemini (imágenes) se omiten.
+
+    Returns:
+        dict: Totales agregados por opción, por día y por modelo.
+    """
+    archivos = sorted(glob.glob(patron))
+    if not archivos:
+        console.print(f"[red]No se encontraron archivos para '{patron}'.[/red]")
+        return {}
+
+    modelo = modelo or nombre_modelo(opcion="costo_tokens")
+    registrados = _registrados_en_historial()
+    estimador = EstimadorTokens()
+    cache = {}
+    if os.path.exists(RUTA_CACHE_ARCHIVOS):
+        with open(RUTA_CACHE_ARCHIVOS, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    lock = threading.Lock()
+
+    def leer(ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            return f.read()
+
+    if calibrar:
+        textos = [t for r in random.sample(archivos, min(5, len(archivos))) for t in (separar_prompt_respuesta(leer(r)) or ())]
+        if textos:
+            with span("tokens.calibrar", textos=len(textos)):
+                factor = estimador.calibrar(textos)
+            console.print(f"[cyan]Estimador calibrado: {factor:.2f} caracteres por token.[/cyan]")
+
+    def procesar(ruta):
+        contenido = leer(ruta)
+        if SEPARADOR_GEMINI not in contenido:
+            return None
+        clave = hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+        with lock:
+            previo = cache.get(clave)
+        if previo and previo.get("caracteres_por_token") == estimador.caracteres_por_token:
+            return previo
+        partes = separar_prompt_respuesta(contenido)
+        if partes is None:
+            raise ValueError("formato no reconocido")
+        resultado = {
+            "tokens_entrada": estimador.estimar(partes[0]),
+            "tokens_salida": estimador.estimar(partes[1]),
+            "caracteres_por_token": estimador.caracteres_por_token,
+        }
+        with lock:
+            cache[clave] = resultado
+        return resultado
+
+    with span("archivos.procesar", archivos=len(archivos)) as s:
+        resultados, errores = ejecutar_concurrente(archivos, procesar, max_workers=max_workers, intentos=1)
+        s.agregar(errores=len(errores))
+    no_gemini = [ruta for ruta, r in resultados.items() if r is None]
+    for ruta in no_gemini:
+        del resultados[ruta]
+
+    carpeta = os.path.dirname(RUTA_CACHE_ARCHIVOS)
+    if carpeta and not os.path.exists(carpeta):
+        os.makedirs(carpeta)
+    with open(RUTA_CACHE_ARCHIVOS, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+    agregados = {"opcion": defaultdict(lambda: [0, 0, 0, 0.0]), "dia": defaultdict(lambda: [0, 0, 0, 0.0]),
+                 "modelo": defaultdict(lambda: [0, 0, 0, 0.0])}
+    for ruta, r in resultados.items():
+        opcion, dia = _metadatos_archivo(ruta)
+        opcion_registrada, modelo_archivo = registrados.get(os.path.normpath(ruta), (None, None))
+        opcion, modelo_archivo = opcion_registrada or opcion, modelo_archivo or modelo
+        costo = sum(calcular_costo(r["tokens_entrada"], r["tokens_salida"], modelo_archivo))
+        for dimension, clave in (("opcion", opcion), ("dia", dia), ("modelo", modelo_archivo)):
+            fila = agregados[dimension][clave]
+            fila[0] += 1
+            fila[1] += r["tokens_entrada"]
+            fila[2] += r["tokens_salida"]
+            fila[3] += costo
+
+    for dimension, titulo in (("opcion", "Opción"), ("dia", "Día"), ("modelo", "Modelo")):
+        tabla = Table(title=f"Costo estimado por {titulo.lower()}")
+        for columna in (titulo, "Archivos", "Tokens entrada", "Tokens salida", "Costo (USD)"):
+            tabla.add_column(columna)
+        for clave, (n, entrada, salida, costo) in sorted(agregados[dimension].items()):
+            tabla.add_row(clave, str(n), str(entrada), str(salida), f"${costo:.6f}")
+        console.print(tabla)
+
+    if no_gemini:
+        console.print(f"[dim]{len(no_gemini)} archivos omitidos por no ser conversaciones con Gemini.[/dim]")
+    if errores:
+        console.print(f"[yellow]{len(errores)} archivos omitidos (formato no reconocido o ilegibles).[/yellow]")
+    console.print(f"[dim]Estimación local: {estimador.caracteres_por_token:.2f} caracteres por token.[/dim]")
+    return {dimension: {k: list(v) for k, v in filas.items()} for dimension, filas in agregados.items()}
+
 def analizar_costo_tokens():
     """
     Lee un archivo de texto, calcula los tokens de entrada y salida,
@@ -11,7 +232,24 @@ def analizar_costo_tokens():
     """
     try:
         # 1. Solicitar el nombre del archivo al usuario
-        nombre_archivo = console.input("[bold yellow]Ingrese el nombre del archivo .txt a analizar:[/bold yellow] ")
+        nombre_archivo = console.input(
+            "[bold yellow]Ingrese el nombre del archivo .txt a analizar "
+            "(Enter para todo 'outputs', un patrón como outputs/*2025*.txt, "
+            "o 'metricas' para el registro exacto de llamadas):[/bold yellow] "
+        ).strip()
+
+        # Resumen exacto a partir de las métricas registradas en cada llamada
+        if nombre_archivo.lower() == "metricas":
+            from metricas import mostrar_resumen
+            agrupar_por = console.input("Agrupar por (opcion/modelo/dia/modo) [opcion]: ").strip().lower() or "opcion"
+            mostrar_resumen(agrupar_por)
+            return
+
+        # Modo masivo: sin archivo o con comodines
+        if not nombre_archivo or any(c in nombre_archivo for c in "*?["):
+            calibrar = console.input("¿Calibrar el estimador con count_tokens de Gemini? (s/N): ").strip().lower() == "s"
+            analizar_costos_masivo(nombre_archivo or "outputs/*.txt", calibrar=calibrar)
+            return
 
         # 2. Intentar leer desde 'outputs', si no existe usar carpeta actual
         if os.path.exists(os.path.join("outputs", nombre_archivo)):
@@ -42,17 +280,13 @@ def analizar_costo_tokens():
         respuesta_gemini = partes[1].strip()
 
         # 5. Inicializar modelo para contar tokens
-        modelo = genai.GenerativeModel("gemini-2.5-flash")
+        modelo = obtener_modelo(opcion="costo_tokens")
 
         tokens_entrada = modelo.count_tokens(prompt_enviado).total_tokens
         tokens_salida = modelo.count_tokens(respuesta_gemini).total_tokens
 
-        # 6. Precios por millón de tokens
-        PRECIO_ENTRADA_POR_MILLON = 0.30
-        PRECIO_SALIDA_POR_MILLON = 2.50
-
-        costo_entrada = (tokens_entrada / 1_000_000) * PRECIO_ENTRADA_POR_MILLON
-        costo_salida = (tokens_salida / 1_000_000) * PRECIO_SALIDA_POR_MILLON
+        # 6. Precios por millón de tokens según el modelo
+        costo_entrada, costo_salida = calcular_costo(tokens_entrada, tokens_salida, nombre_modelo(opcion="costo_tokens"))
         costo_total = costo_entrada + costo_salida
 
         # 7. Mostrar resultados
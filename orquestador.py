@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from config import Config
+from gemini_ai import configurar, generar_async
+from opcion1_fundamental import preparar_prompt_inversion, cargar_universo
+from opcion2_sentimiento import preparar_prompt_sentimiento
+from opcion3_macro import preparar_prompt_macro
+from utils import guardar_conversacion, activar_progreso
+from trazas import span, ejecucion, con_contexto
+
+console = Console()
+
+# Secciones del informe completo: clave -> (título, opción del cliente Gemini)
+SECCIONES = {
+    "fundamental": ("Análisis Fundamental", "fundamental"),
+    "sentimiento": ("Análisis de Sentimiento", "sentimiento"),
+    "macro": ("Análisis Macroeconómico", "macro"),
+}
+
+def _etapas_de_datos(empresa: str, empresas: dict = None) -> dict:
+    """Funciones que preparan el prompt de cada sección."""
+    return {
+        "fundamental": lambda: preparar_prompt_inversion(empresas),
+        "sentimiento": lambda: preparar_prompt_sentimiento(empresa),
+        "macro": lambda: preparar_prompt_macro(Config.FRED_API_KEY),
+    }
+
+async def informe_completo_async(empresa: str, empresas: dict = None, secciones=None) -> dict:
+    """
+    Ejecuta en paralelo las etapas de datos de las opciones 1, 2 y 3 y luego,
+    también en paralelo, sus llamadas a Gemini.
+
+    Returns:
+        dict: {sección: {"prompt", "respuesta", "error", "segundos_datos", "segundos_gemini"}}
+    """
+    secciones = list(secciones or SECCIONES)
+    etapas = _etapas_de_datos(empresa, empresas)
+    resultados = {s: {"prompt": None, "respuesta": None, "error": None} for s in secciones}
+    loop = asyncio.get_running_loop()
+
+    async def cronometrar(seccion, campo, corrutina):
+        inicio = time.perf_counter()
+        try:
+            return await corrutina
+        finally:
+            resultados[seccion][campo] = time.perf_counter() - inicio
+
+    def etapa_trazada(seccion):
+        # Cada etapa corre en otro hilo; se le pasa el contexto para anidar sus spans
+        def ejecutar():
+            with span(f"datos.{seccion}"):
+                return etapas[seccion]()
+        return con_contexto(ejecutar)
+
+    # Etapa 1: datos (Yahoo, noticias, FRED) en paralelo
+    with ThreadPoolExecutor(max_workers=len(secciones) or 1, thread_name_prefix="informe") as pool:
+        prompts = await asyncio.gather(
+            *(cronometrar(s, "segundos_datos", loop.run_in_executor(pool, etapa_trazada(s))) for s in secciones),
+            return_exceptions=True,
+        )
+    for seccion, prompt in zip(secciones, prompts):
+        if isinstance(prompt, Exception):
+            resultados[seccion]["error"] = str(prompt)
+        elif not prompt:
+            resultados[seccion]["error"] = "Sin datos para construir el prompt."
+        else:
+            resultados[seccion]["prompt"] = prompt
+
+    # Etapa 2: llamadas a Gemini en paralelo
+    listas = [s for s in secciones if resultados[s]["prompt"]]
+    respuestas = await asyncio.gather(
+        *(cronometrar(s, "segundos_gemini", generar_async(resultados[s]["prompt"], opcion=SECCIONES[s][1]))
+          for s in listas),
+        return_exceptions=True,
+    )
+    for seccion, respuesta in zip(listas, respuestas):
+        if isinstance(respuesta, Exception):
+            resultados[seccion]["error"] = str(respuesta)
+        else:
+            resultados[seccion]["respuesta"] = respuesta.text
+    return resultados
+
+def armar_informe(resultados: dict) -> tuple:
+    """Une las secciones en un único informe. Devuelve (prompt combinado, informe)."""
+    prompts, partes = [], []
+    for seccion, r in resultados.items():
+        titulo = SECCIONES[seccion][0]
+        if r["prompt"]:
+            prompts.append(f"=== {titulo} ===\n{r['prompt']}")
+        cuerpo = r["respuesta"] if r["respuesta"] else f"(No disponible: {r['error']})"
+        partes.append(f"=== {titulo.upper()} ===\n{cuerpo}")
+    return "\n\n".join(prompts), "\n\n".join(partes)
+
+@ejecucion("informe")
+def generar_informe_completo(empresa: str, gemini_api_key: str, empresas: dict = None, secciones=None) -> str:
+    """
+    Genera el informe combinado de las opciones 1, 2 y 3. El tiempo total se
+    acerca al de la sección más lenta en lugar de la suma de todas.
+    """
+    try:
+        if not gemini_api_key:
+            raise ValueError("La clave de API de Gemini no se proporcionó.")
+        configurar(gemini_api_key)
+
+        inicio = time.perf_counter()
+        activar_progreso(False)
+        try:
+            with console.status("[cyan]Generando informe completo (datos y Gemini en paralelo)..."):
+                resultados = asyncio.run(informe_completo_async(empresa, empresas, secciones))
+        finally:
+            activar_progreso(True)
+        total = time.perf_counter() - inicio
+
+        prompt, informe = armar_informe(resultados)
+        console.print("\n[bold]--- INFORME COMPLETO ---[/bold]")
+        console.print(informe)
+        for seccion, r in resultados.items():
+            console.print(
+                f"[dim]{SECCIONES[seccion][0]}: datos {r.get('segundos_datos', 0):.1f}s, "
+                f"Gemini {r.get('segundos_gemini', 0):.1f}s[/dim]"
+            )
+        console.print(f"[dim]Tiempo total: {total:.1f}s[/dim]")
+
+        guardar_conversacion("Informe Completo", prompt, informe, opcion="informe", entidad=empresa)
+        return informe
+
+    except Exception as e:
+        console.print(f"[bold red]Ocurrió un error:[/bold red] {e}")
+        return ""
+
+def main(argv=None):
+    """Punto de entrada no interactivo: python orquestador.py --empresa Apple."""
+    parser = argparse.ArgumentParser(description="Informe completo: fundamental, sentimiento y macro en paralelo.")
+    parser.add_argument("--empresa", default="Apple", help="Empresa para el análisis de sentimiento.")
+    parser.add_argument("--tickers", help="Archivo .txt/.csv con el universo del análisis fundamental.")
+    parser.add_argument(
+        "--secciones", default=",".join(SECCIONES),
+        help="Secciones a incluir, separadas por comas (fundamental,sentimiento,macro).",
+    )
+    args = parser.parse_args(argv)
+
+    secciones = [s.strip() for s in args.secciones.split(",") if s.strip()]
+    invalidas = [s for s in secciones if s not in SECCIONES]
+    if invalidas:
+        parser.error(f"Secciones no válidas: {', '.join(invalidas)}")
+    empresas = cargar_universo(args.tickers) if args.tickers else None
+    informe = generar_informe_completo(args.empresa, Config.GEMINI_API_KEY, empresas, secciones)
+    return 0 if informe else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+import contextvars
+import cProfile
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+from config import Config
+
+console = Console()
+
+# Span abierto en el contexto actual (hilo o tarea de asyncio)
+_actual = contextvars.ContextVar("span_actual", default=None)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+
+class Span:
+    """Intervalo medido de una etapa, con atributos (ticker, proveedor, bytes, tokens...)."""
+
+    __slots__ = ("id", "nombre", "padre", "raiz", "inicio", "fin", "hilo", "atributos", "registro")
+
+    def __init__(self, nombre: str, padre=None, atributos: dict = None):
+        self.id = next(_ids)
+        self.nombre = nombre
+        self.padre = padre
+        self.raiz = padre.raiz if padre is not None else self
+        self.inicio = time.perf_counter()
+        self.fin = None
+        self.hilo = threading.current_thread()
+        self.atributos = dict(atributos or {})
+        self.registro = [] if padre is None else None
+
+    def agregar(self, **atributos):
+        """Agrega atributos al span (por ejemplo, tokens al terminar la llamada)."""
+        self.atributos.update(atributos)
+
+    @property
+    def duracion(self) -> float:
+        return (self.fin or time.perf_counter()) - self.inicio
+
+
+class _SpanNulo:
+    """Span sin efecto usado cuando las trazas están desactivadas o no hay ejecución en curso."""
+
+    def agregar(self, **atributos):
+        pass
+
+
+_NULO = _SpanNulo()
+
+
+def _cerrar(span: Span):
+    span.fin = time.perf_counter()
+    with _lock:
+        span.raiz.registro.append(span)
+
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """
+    Mide una etapa anidada dentro de la ejecución en curso:
+
+        with span("yahoo.estado", ticker=ticker) as s:
+            ...
+            s.agregar(bytes=len(datos))
+
+    Fuera de una `ejecucion` (o con las trazas desactivadas) no hace nada.
+    """
+    padre = _actual.get()
+    if padre is None:
+        yield _NULO
+        return
+    actual = Span(nombre, padre, atributos)
+    token = _actual.set(actual)
+    try:
+        yield actual
+    except BaseException as e:
+        actual.atributos["error"] = type(e).__name__
+        raise
+    finally:
+        _actual.reset(token)
+        _cerrar(actual)
+
+
+def registrar_span(nombre: str, inicio: float, fin: float = None, **atributos):
+    """Registra un span ya medido (útil en generadores, donde no conviene un `with`)."""
+    padre = _actual.get()
+    if padre is None:
+        return
+    registrado = Span(nombre, padre, atributos)
+    registrado.inicio = inicio
+    _cerrar(registrado)
+    registrado.fin = fin or registrado.fin
+
+
+def con_contexto(func):
+    """
+    Envuelve `func` para que se ejecute con una copia del contexto actual, de
+    modo que los spans creados en otro hilo queden anidados en el span actual.
+    """
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.run(func, *args, **kwargs)
+
+
+def _ruta_salida(nombre: str, extension: str) -> str:
+    carpeta = os.path.join(Config.CACHE_DIR, "trazas")
+    if not os.path.exists(carpeta):
+        os.makedirs(carpeta)
+    return os.path.join(carpeta, f"{nombre}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+
+
+def exportar_chrome(raiz: Span, ruta: str) -> str:
+    """Escribe los spans de una ejecución en formato Chrome Trace (chrome://tracing, Perfetto)."""
+    pid = os.getpid()
+    eventos, hilos = [], {}
+    for s in sorted(raiz.registro, key=lambda s: s.inicio):
+        hilos[s.hilo.ident] = s.hilo.name
+        eventos.append({
+            "name": s.nombre,
+            "ph": "X",
+            "ts": round((s.inicio - raiz.inicio) * 1e6, 1),
+            "dur": round(s.duracion * 1e6, 1),
+            "pid": pid,
+            "tid": s.hilo.ident,
+            "args": {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v)
+                     for k, v in s.atributos.items()},
+        })
+    eventos += [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": nombre}}
+        for tid, nombre in hilos.items()
+    ]
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return ruta
+
+
+def resumen(raiz: Span) -> list:
+    """Tiempo por etapa: llamadas, total, media, máximo y % del tiempo total de la ejecución."""
+    grupos = defaultdict(list)
+    for s in raiz.registro:
+        grupos[s.nombre].append(s.duracion)
+    total = raiz.duracion or 1e-9
+    filas = [
+        {
+            "etapa": nombre,
+            "llamadas": len(duraciones),
+            "total": sum(duraciones),
+            "media": sum(duraciones) / len(duraciones),
+            "maximo": max(duraciones),
+            "porcentaje": 100 * sum(duraciones) / total,
+        }
+        for nombre, duraciones in grupos.items()
+    ]
+    return sorted(filas, key=lambda f: f["total"], reverse=True)
+
+
+def mostrar_resumen(raiz: Span):
+    tabla = Table(title=f"Tiempo por etapa: {raiz.nombre} ({raiz.duracion:.2f}s)")
+    for columna in ("Etapa", "Llamadas", "Total (s)", "Media (s)", "Máx. (s)", "% del total"):
+        tabla.add_column(columna)
+    for f in resumen(raiz):
+        tabla.add_row(
+            f["etapa"], str(f["llamadas"]), f"{f['total']:.3f}", f"{f['media']:.3f}",
+            f"{f['maximo']:.3f}", f"{f['porcentaje']:.0f}%",
+        )
+    console.print(tabla)
+    console.print("[dim]Las etapas que corren en paralelo pueden sumar más del 100 %.[/dim]")
+
+
+@contextmanager
+def ejecucion(nombre: str, **atributos):
+    """
+    Delimita una ejecución completa de una opción (también sirve como decorador).
+
+    Con `TRAZAS=1` registra los spans anidados, los exporta en formato Chrome
+    Trace a `.cache/trazas/` y muestra el desglose por etapa. Con `PERFILAR=1`
+    además perfila el hilo principal con cProfile y guarda el `.prof` junto a
+    la traza (se abre con `python -m pstats` o snakeviz).
+
+    Dentro de otra ejecución (p. ej. el informe completo) se comporta como un span.
+    """
+    if _actual.get() is not None:
+        with span(nombre, **atributos) as anidado:
+            yield anidado
+        return
+    if not Config.TRAZAS and not Config.PERFILAR:
+        yield _NULO
+        return
+
+    perfil = cProfile.Profile() if Config.PERFILAR else None
+    raiz = Span(nombre, atributos=atributos) if Config.TRAZAS else None
+    token = _actual.set(raiz) if raiz else None
+    if perfil:
+        perfil.enable()
+    try:
+        yield raiz or _NULO
+    finally:
+        if perfil:
+            perfil.disable()
+            ruta = _ruta_salida(nombre, "prof")
+            perfil.dump_stats(ruta)
+            console.print(f"[dim]Perfil de cProfile guardado en {ruta}[/dim]")
+        if raiz:
+            _actual.reset(token)
+            raiz.fin = time.perf_counter()
+            raiz.registro.append(raiz)
+            ruta = exportar_chrome(raiz, _ruta_salida(nombre, "json"))
+            mostrar_resumen(raiz)
+            console.print(f"[dim]Traza guardada en {ruta} (ábrela en chrome://tracing o ui.perfetto.dev)[/dim]")
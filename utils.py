@@ -1,28 +1,169 @@
 import os
 from datetime import datetime
 from rich.console import Console
+from rich.live import Live
+from rich.text import Text
+from rich.progress import Progress, SpinnerColumn, TextColumn
+from config import Config
+from historial import historial
+from trazas import span
 
 console = Console()
 
-def guardar_conversacion(nombre_opcion: str, prompt: str, respuesta: str):
-    """Guarda el prompt y la respuesta en un archivo de texto."""
+# Las barras de progreso se desactivan cuando varias etapas corren en paralelo
+# (Rich sólo admite una visualización en vivo a la vez).
+_progreso_activo = True
+
+def activar_progreso(activo: bool):
+    """Activa o desactiva las barras de progreso creadas con `crear_progreso`."""
+    global _progreso_activo
+    _progreso_activo = activo
+
+def crear_progreso(*columnas, transient: bool = True) -> Progress:
+    """Crea una barra de progreso (spinner + descripción por defecto) que respeta `activar_progreso`."""
+    columnas = columnas or (SpinnerColumn(), TextColumn("[progress.description]{task.description}"))
+    return Progress(*columnas, transient=transient, disable=not _progreso_activo)
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación local y rápida de tokens (~4 caracteres por token)."""
+    return max(1, len(texto) // 4) if texto else 0
+
+def dividir_en_lotes(bloques: dict, max_tokens: int) -> list:
+    """
+    Agrupa los bloques de texto ({clave: texto}) en lotes cuyo tamaño estimado no
+    supere `max_tokens`. Un bloque que por sí solo excede el límite va solo.
+    """
+    lotes, actual, tokens_actual = [], {}, 0
+    for clave, texto in bloques.items():
+        tokens = estimar_tokens(texto)
+        if actual and tokens_actual + tokens > max_tokens:
+            lotes.append(actual)
+            actual, tokens_actual = {}, 0
+        actual[clave] = texto
+        tokens_actual += tokens
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+def _ruta_conversacion(nombre_opcion: str) -> str:
+    """
+    Crea la carpeta 'outputs' si no existe y reserva un archivo vacío con fecha
+    y hora. Si ya existe uno en el mismo segundo se agrega un sufijo; la
+    creación exclusiva evita que dos hilos obtengan el mismo nombre.
+    """
+    if not os.path.exists("outputs"):
+        os.makedirs("outputs", exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ruta, n = f"outputs/{nombre_opcion}_{timestamp}.txt", 1
+    while True:
+        try:
+            with open(ruta, "x", encoding="utf-8"):
+                return ruta
+        except FileExistsError:
+            n += 1
+            ruta = f"outputs/{nombre_opcion}_{timestamp}_{n}.txt"
+
+def _registrar_en_historial(nombre_opcion: str, prompt: str, respuesta: str, opcion: str, entidad: str,
+                            modelo: str, uso, archivo: str):
+    """Agrega la conversación al historial estructurado (ver `historial.py`)."""
+    try:
+        historial.guardar(
+            opcion or nombre_opcion, prompt, respuesta, entidad=entidad, modelo=modelo or Config.GEMINI_MODELO,
+            tokens_entrada=getattr(uso, "prompt_token_count", 0) or 0,
+            tokens_salida=getattr(uso, "candidates_token_count", 0) or 0,
+            archivo=archivo,
+        )
+    except Exception as e:
+        console.print(f"[red]Error al registrar el análisis en el historial: {e}[/red]")
+
+def guardar_conversacion(nombre_opcion: str, prompt: str, respuesta: str, opcion: str = None,
+                         entidad: str = None, modelo: str = None, response=None):
+    """
+    Guarda el prompt y la respuesta en el historial estructurado y, si
+    `GUARDAR_TXT` está activo, también en un archivo de texto.
+
+    Args:
+        nombre_opcion (str): Prefijo del archivo en 'outputs'.
+        opcion (str): Clave de la opción para el historial (por defecto `nombre_opcion`).
+        entidad (str): Empresa o entidad analizada.
+        modelo (str): Modelo de Gemini usado.
+        response: Respuesta de Gemini de la que se toman los tokens (`usage_metadata`).
+    """
+    with span("guardar", opcion=opcion or nombre_opcion, bytes=len(prompt) + len(respuesta or "")):
+        nombre_archivo = None
+        try:
+            if Config.GUARDAR_TXT:
+                nombre_archivo = _ruta_conversacion(nombre_opcion)
+
+                # Escribe el contenido en el archivo
+                with open(nombre_archivo, "w", encoding="utf-8") as f:
+                    f.write("--- PROMPT ---\n")
+                    f.write(prompt)
+                    f.write("\n\n--- RESPUESTA DE GEMINI ---\n")
+                    f.write(respuesta)
+
+                console.print(f"\n[green]Conversación guardada en:[/green] [bold]{nombre_archivo}[/bold]")
+
+        except Exception as e:
+            console.print(f"[red]Error al guardar la conversación: {e}[/red]")
+
+        _registrar_en_historial(nombre_opcion, prompt, respuesta, opcion, entidad, modelo,
+                                getattr(response, "usage_metadata", None), nombre_archivo)
+
+def mostrar_y_guardar_stream(nombre_opcion: str, prompt: str, stream, titulo: str, opcion: str = None,
+                             entidad: str = None) -> str:
+    """
+    Muestra en consola una respuesta de Gemini en streaming a medida que llegan
+    los fragmentos y los va agregando a un archivo temporal que solo toma el
+    nombre definitivo si el stream termina bien (una respuesta cortada no queda
+    en 'outputs'). Al terminar la registra en el historial estructurado.
+
+    Args:
+        nombre_opcion (str): Prefijo del archivo en 'outputs'.
+        prompt (str): Prompt enviado.
+        stream: Iterable de fragmentos de texto (p. ej. `gemini_ai.generar_stream`).
+        titulo (str): Encabezado mostrado antes de la respuesta.
+        opcion (str): Clave de la opción para el historial.
+        entidad (str): Empresa o entidad analizada.
+
+    Returns:
+        str: El texto completo de la respuesta.
+    """
+    nombre_archivo = _ruta_conversacion(nombre_opcion) if Config.GUARDAR_TXT else None
+    partes = []
+    console.print(f"\n[bold]{titulo}[/bold]")
+    temporal = f"{nombre_archivo}.parcial" if nombre_archivo else None
+    f = open(temporal, "w", encoding="utf-8") if temporal else None
     try:
-        # Crea la carpeta 'outputs' si no existe
-        if not os.path.exists("outputs"):
-            os.makedirs("outputs")
-            
-        # Genera el nombre del archivo con fecha y hora
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        nombre_archivo = f"outputs/{nombre_opcion}_{timestamp}.txt"
-        
-        # Escribe el contenido en el archivo
-        with open(nombre_archivo, "w", encoding="utf-8") as f:
+        if f:
             f.write("--- PROMPT ---\n")
             f.write(prompt)
             f.write("\n\n--- RESPUESTA DE GEMINI ---\n")
-            f.write(respuesta)
-            
-        console.print(f"\n[green]Conversación guardada en:[/green] [bold]{nombre_archivo}[/bold]")
+            f.flush()
+        with Live(Text(""), console=console, vertical_overflow="visible", refresh_per_second=12) as live:
+            for fragmento in stream:
+                partes.append(fragmento)
+                if f:
+                    f.write(fragmento)
+                    f.flush()
+                live.update(Text("".join(partes)))
+    except BaseException:
+        if f:
+            f.close()
+            os.remove(temporal)
+            os.remove(nombre_archivo)
+        raise
+    if f:
+        f.close()
+        os.replace(temporal, nombre_archivo)
 
-    except Exception as e:
-        console.print(f"[red]Error al guardar la conversación: {e}[/red]")
\ No newline at end of file
+    ttft = getattr(stream, "ttft", None)
+    if ttft is not None:
+        origen = " (caché)" if getattr(stream, "desde_cache", False) else ""
+        console.print(f"[dim]Tiempo hasta el primer fragmento: {ttft:.2f}s{origen}[/dim]")
+    if nombre_archivo:
+        console.print(f"\n[green]Conversación guardada en:[/green] [bold]{nombre_archivo}[/bold]")
+    respuesta = "".join(partes)
+    _registrar_en_historial(nombre_opcion, prompt, respuesta, opcion, entidad, getattr(stream, "modelo", None),
+                            getattr(stream, "usage_metadata", None), nombre_archivo)
+    return respuesta
@@ -1,5 +1,14 @@
+import threading
 import yfinance as yf
 import pandas as pd
+from rich.console import Console
+from cache_yahoo import cache_yahoo
+from concurrencia import ejecutar_concurrente
+from cuotas import planificador
+from config import Config
+from trazas import span
+
+console = Console()
 
 # Función auxiliar para buscar columnas con nombres distintos
 def find_col(df, candidates):
@@ -8,17 +17,64 @@ def find_col(df, candidates):
             return df[col]
     return pd.Series(dtype="float64")
 
-def get_financials_yahoo(ticker: str, years: int = 5):
+def descargar_estado(ticker: str, tipo: str, forzar_refresco: bool = False):
+    """
+    Devuelve un atributo de `yf.Ticker` ('financials', 'balance_sheet',
+    'quarterly_financials', 'info') leyendo a través de la caché local.
+    """
+    with span("yahoo.estado", ticker=ticker, tipo=tipo):
+        return cache_yahoo.obtener(
+            ticker, tipo, lambda: _descargar_estado_red(ticker, tipo), forzar=forzar_refresco
+        )
+
+def _descargar_estado_red(ticker: str, tipo: str):
+    """Descarga el estado desde Yahoo a través del planificador de cuotas."""
+    with span("yahoo.descarga", ticker=ticker, tipo=tipo):
+        return planificador.ejecutar("yahoo", lambda: getattr(yf.Ticker(ticker), tipo))
+
+class TickerSnapshot:
+    """
+    Estados de un ticker descargados como mucho una vez cada uno.
+
+    Cada estado ('financials', 'balance_sheet', 'quarterly_financials', 'info')
+    se carga (a través de la caché local) la primera vez que se accede como
+    atributo y se reutiliza en los siguientes accesos.
+    """
+
+    ESTADOS = ("financials", "balance_sheet", "quarterly_financials", "info")
+
+    def __init__(self, ticker: str, forzar_refresco: bool = False):
+        self.ticker = ticker
+        self.forzar_refresco = forzar_refresco
+        self._estados = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, nombre):
+        if nombre not in TickerSnapshot.ESTADOS:
+            raise AttributeError(nombre)
+        with self._lock:
+            if nombre not in self._estados:
+                self._estados[nombre] = descargar_estado(self.ticker, nombre, self.forzar_refresco)
+            return self._estados[nombre]
+
+    def __repr__(self):
+        return f"TickerSnapshot({self.ticker!r}, cargados={sorted(self._estados)})"
+
+def _snapshot(ticker: str, forzar_refresco: bool = False, snapshot: TickerSnapshot = None) -> TickerSnapshot:
+    """Devuelve el snapshot recibido o crea uno nuevo para el ticker."""
+    return snapshot if snapshot is not None else TickerSnapshot(ticker, forzar_refresco)
+
+def get_financials_yahoo(ticker: str, years: int = 5, forzar_refresco: bool = False, snapshot: TickerSnapshot = None):
     """
     Devuelve un DataFrame con Revenues, NetIncome, Assets, Liabilities, Equity,
     más los ratios ROE y CurrentRatio, para los últimos N años disponibles.
     """
-    stock = yf.Ticker(ticker)
+    stock = _snapshot(ticker, forzar_refresco, snapshot)
 
     # Income statement (Revenues, Net Income)
-    financials = stock.financials.T  
+    financials = stock.financials.T
     # Balance sheet (Assets, Liabilities, Equity)
-    balance = stock.balance_sheet.T  
+    balance = stock.balance_sheet.T
 
     # Buscar columnas (a veces cambian los nombres)
     revenues = financials.get("Total Revenue")
@@ -64,24 +120,122 @@ def get_financials_yahoo(ticker: str, years: int = 5):
 
     return df
 
-def get_yfinance_revenue_growth(ticker: str):
+# Métricas del panel y nombres alternativos de cada una en Yahoo
+PANEL_INCOME_COLUMNS = {
+    "Revenues": ["Total Revenue"],
+    "NetIncome": ["Net Income"],
+}
+PANEL_BALANCE_COLUMNS = {
+    "Assets": ["Total Assets"],
+    "Liabilities": [
+        "Total Liab",
+        "Total Liabilities Net Minority Interest",
+        "Total Non Current Liabilities Net Minority Interest"
+    ],
+    "Equity": [
+        "Total Stockholder Equity",
+        "Common Stock Equity"
+    ],
+}
+PANEL_BASE_METRICS = list(PANEL_INCOME_COLUMNS) + list(PANEL_BALANCE_COLUMNS)
+
+def _concat_statements(tickers, tipo: str, forzar_refresco: bool = False, max_concurrencia: int = None, snapshots: dict = None):
+    """
+    Descarga un estado para varios tickers en paralelo y los apila en un único
+    DataFrame con índice (Ticker, FiscalYear) y una columna por partida. Los
+    tickers que fallan se informan en consola y en `resultado.attrs["errores"]`.
+    """
+    snapshots = snapshots or {}
+    estados, errores = ejecutar_concurrente(
+        tickers,
+        lambda ticker: getattr(_snapshot(ticker, forzar_refresco, snapshots.get(ticker)), tipo),
+        max_workers=max_concurrencia or Config.YAHOO_MAX_CONCURRENCIA,
+        intentos=Config.YAHOO_REINTENTOS,
+    )
+    for ticker, e in errores.items():
+        console.print(f"[red]Error al obtener {tipo} de {ticker}: {e}[/red]")
+    frames = {t: df.T for t, df in estados.items() if df is not None and not df.empty}
+    if frames:
+        resultado = pd.concat(frames, names=["Ticker", "FiscalYear"])
+    else:
+        resultado = pd.DataFrame(index=pd.MultiIndex.from_tuples([], names=["Ticker", "FiscalYear"]))
+    resultado.attrs["errores"] = {t: str(e) for t, e in errores.items()}
+    return resultado
+
+def _coalesce(df, candidates):
+    """Versión vectorizada de `find_col`: primer valor no nulo entre las columnas candidatas."""
+    cols = [col for col in candidates if col in df.columns]
+    if not cols:
+        return pd.Series(float("nan"), index=df.index, dtype="float64")
+    return df[cols].apply(pd.to_numeric, errors="coerce").bfill(axis=1).iloc[:, 0]
+
+def get_fundamentals_panel(tickers, years: int = 5, forzar_refresco: bool = False, max_concurrencia: int = None, snapshots: dict = None):
+    """
+    Devuelve un panel con índice (Ticker, FiscalYear) para varios tickers a la vez,
+    con Revenues, NetIncome, Assets, Liabilities, Equity, los ratios ROE y
+    CurrentRatio, RevenueGrowth y la variación interanual (`<métrica>_YoY`) de
+    cada métrica base. Todos los cálculos se hacen sobre el panel completo.
+    `panel.stack()` da la forma larga (ticker × año × métrica).
+    `snapshots` ({ticker: TickerSnapshot}) permite reutilizar estados ya cargados.
+    Los errores de descarga por ticker quedan en `panel.attrs["errores"]`.
+    """
+    tickers = list(tickers)
+    financials = _concat_statements(tickers, "financials", forzar_refresco, max_concurrencia, snapshots)
+    balance = _concat_statements(tickers, "balance_sheet", forzar_refresco, max_concurrencia, snapshots)
+
+    columnas = {name: _coalesce(financials, cands) for name, cands in PANEL_INCOME_COLUMNS.items()}
+    columnas.update({name: _coalesce(balance, cands) for name, cands in PANEL_BALANCE_COLUMNS.items()})
+    panel = pd.concat(columnas, axis=1)
+    panel.index.names = ["Ticker", "FiscalYear"]
+
+    # Ordenar cronológicamente, eliminar años vacíos y limitar a los últimos N por ticker
+    panel = panel.sort_index().dropna(how="all")
+    panel = panel.groupby(level="Ticker", group_keys=False).tail(years)
+
+    # Ratios
+    panel["ROE"] = (panel["NetIncome"] / panel["Equity"]).round(4)
+    panel["CurrentRatio"] = (panel["Assets"] / panel["Liabilities"]).round(4)
+
+    # Crecimiento y variaciones interanuales por ticker
+    por_ticker = panel.groupby(level="Ticker")
+    panel["RevenueGrowth"] = por_ticker["Revenues"].pct_change(fill_method=None).round(4)
+    yoy = por_ticker[PANEL_BASE_METRICS].pct_change(fill_method=None).round(4)
+    panel[[f"{col}_YoY" for col in PANEL_BASE_METRICS]] = yoy.to_numpy()
+
+    panel.attrs["errores"] = {**financials.attrs.get("errores", {}), **balance.attrs.get("errores", {})}
+    return panel
+
+def revenue_growth_from_panel(panel, tickers=None, forzar_refresco: bool = False, snapshots: dict = None):
+    """
+    Devuelve una Serie {ticker: RevenueGrowth} con el crecimiento del año más
+    reciente del panel; para los tickers sin ese dato (p. ej. un año parcial sin
+    ingresos) usa quarterly_financials.
+    """
+    tickers = list(tickers) if tickers is not None else list(panel.index.unique(level="Ticker"))
+    # tail(1) toma la fila del último año aunque sea NaN (last() saltaría a un año anterior)
+    growth = panel["RevenueGrowth"].groupby(level="Ticker").tail(1).droplevel("FiscalYear").reindex(tickers)
+
+    # Fallback con trimestral, sólo para los tickers que lo necesitan
+    missing = growth[growth.isna()].index.tolist()
+    if missing:
+        quarterly = _concat_statements(missing, "quarterly_financials", forzar_refresco, snapshots=snapshots)
+        qrev = _coalesce(quarterly, ["Total Revenue"]).sort_index()
+        qgrowth = qrev.groupby(level="Ticker").pct_change(fill_method=None).groupby(level="Ticker").tail(1)
+        qgrowth = qgrowth.droplevel("FiscalYear")
+        growth = growth.fillna(qgrowth)
+
+    return growth.round(4)
+
+def get_yfinance_revenue_growth(ticker: str, forzar_refresco: bool = False, panel=None, snapshot: TickerSnapshot = None):
     """
     Devuelve {'RevenueGrowth': float | None} calculado a partir de financials (anual),
-    con fallback a quarterly_financials si falta.
+    con fallback a quarterly_financials si falta. Si se pasa `panel` (de
+    `get_fundamentals_panel`) se reutiliza en lugar de volver a descargar; si se
+    pasa `snapshot`, los estados se leen de él.
     """
-    stock = yf.Ticker(ticker)
-    revenue_growth = None
-
-    # Intento con anual
-    if stock.financials is not None and not stock.financials.empty and "Total Revenue" in stock.financials.index:
-        fin = stock.financials.loc["Total Revenue"].sort_index()
-        if len(fin) >= 2:
-            revenue_growth = float((fin.iloc[-1] - fin.iloc[-2]) / fin.iloc[-2])
-
-    # Fallback con trimestral
-    if revenue_growth is None and stock.quarterly_financials is not None and not stock.quarterly_financials.empty and "Total Revenue" in stock.quarterly_financials.index:
-        qfin = stock.quarterly_financials.loc["Total Revenue"].sort_index()
-        if len(qfin) >= 2:
-            revenue_growth = float((qfin.iloc[-1] - qfin.iloc[-2]) / qfin.iloc[-2])
-
-    return {"RevenueGrowth": None if revenue_growth is None else round(revenue_growth, 4)}
+    snapshots = {ticker: _snapshot(ticker, forzar_refresco, snapshot)}
+    if panel is None:
+        panel = get_fundamentals_panel([ticker], forzar_refresco=forzar_refresco, snapshots=snapshots)
+    revenue_growth = revenue_growth_from_panel(panel, [ticker], forzar_refresco, snapshots).get(ticker)
+
+    return {"RevenueGrowth": None if revenue_growth is None or pd.isna(revenue_growth) else float(revenue_growth)}